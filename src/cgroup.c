@@ -0,0 +1,204 @@
+#define _GNU_SOURCE
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/stat.h>
+
+#include "cgroup.h"
+
+static unsigned int cgroup_counter = 0;
+
+
+// the base is opened once, before the judger chroots itself
+int cgroup_open(const char *path) {
+    return open(path, O_RDONLY | O_DIRECTORY | O_CLOEXEC);
+}
+
+
+static int write_file(int dir_fd, const char *name, const char *value) {
+    int fd = openat(dir_fd, name, O_WRONLY | O_CLOEXEC);
+    ssize_t length = (ssize_t) strlen(value), written;
+    if (fd < 0) {
+        return -1;
+    }
+    written = write(fd, value, (size_t) length);
+    close(fd);
+    return written == length ? 0 : -1;
+}
+
+
+static int write_number(int dir_fd, const char *name, long value) {
+    char buffer[32];
+    snprintf(buffer, sizeof(buffer), "%ld", value);
+    return write_file(dir_fd, name, buffer);
+}
+
+
+// reads "key value" lines as found in cpu.stat and memory.events, -1 when the key is missing
+static long long read_key(int fd, const char *key) {
+    char buffer[1024], *line;
+    size_t key_length = strlen(key);
+    ssize_t length = pread(fd, buffer, sizeof(buffer) - 1, 0);
+    if (length <= 0) {
+        return -1;
+    }
+    buffer[length] = '\0';
+    line = buffer;
+    while (line != NULL) {
+        if (strncmp(line, key, key_length) == 0 && line[key_length] == ' ') {
+            return strtoll(line + key_length + 1, NULL, 10);
+        }
+        line = strchr(line, '\n');
+        if (line != NULL) {
+            line++;
+        }
+    }
+    return -1;
+}
+
+
+static long long read_single(int dir_fd, const char *name) {
+    char buffer[32];
+    ssize_t length;
+    int fd = openat(dir_fd, name, O_RDONLY | O_CLOEXEC);
+    if (fd < 0) {
+        return -1;
+    }
+    length = read(fd, buffer, sizeof(buffer) - 1);
+    close(fd);
+    if (length <= 0) {
+        return -1;
+    }
+    buffer[length] = '\0';
+    return strtoll(buffer, NULL, 10);
+}
+
+
+int cgroup_create(struct cgroup *_cgroup, int base_fd, const struct config *_config) {
+    int i;
+
+    _cgroup->base_fd = base_fd;
+    _cgroup->fd = _cgroup->procs_fd = _cgroup->cpu_stat_fd = _cgroup->memory_current_fd = -1;
+
+    // best effort, the controllers may already be enabled by whoever delegated the base
+    write_file(base_fd, "cgroup.subtree_control", "+memory +pids");
+
+    // runs of one judger process (several threads of the extension) or of several judgers share the base
+    for (i = 0; i < 16; i++) {
+        snprintf(_cgroup->name, sizeof(_cgroup->name), "judger-%d-%u", (int) getpid(),
+                 __sync_fetch_and_add(&cgroup_counter, 1));
+        if (mkdirat(base_fd, _cgroup->name, 0755) == 0) {
+            break;
+        }
+        if (errno != EEXIST) {
+            return -1;
+        }
+    }
+    if (i == 16) {
+        return -1;
+    }
+
+    _cgroup->fd = openat(base_fd, _cgroup->name, O_RDONLY | O_DIRECTORY | O_CLOEXEC);
+    if (_cgroup->fd < 0) {
+        goto failed;
+    }
+    // memory_limit_check_only only compares memory.peak with the limit afterwards
+    if (_config->max_memory != UNLIMITED && _config->memory_limit_check_only == 0) {
+        if (write_number(_cgroup->fd, "memory.max", _config->max_memory) != 0) {
+            goto failed;
+        }
+        // swapping out would make the limit meaningless, not every kernel has swap accounting
+        write_file(_cgroup->fd, "memory.swap.max", "0");
+    }
+    if (_config->max_process_number != UNLIMITED &&
+        write_number(_cgroup->fd, "pids.max", _config->max_process_number) != 0) {
+        goto failed;
+    }
+    _cgroup->procs_fd = openat(_cgroup->fd, "cgroup.procs", O_WRONLY | O_CLOEXEC);
+    _cgroup->cpu_stat_fd = openat(_cgroup->fd, "cpu.stat", O_RDONLY | O_CLOEXEC);
+    _cgroup->memory_current_fd = openat(_cgroup->fd, "memory.current", O_RDONLY | O_CLOEXEC);
+    if (_cgroup->procs_fd < 0 || _cgroup->cpu_stat_fd < 0) {
+        goto failed;
+    }
+    return 0;
+
+    failed:
+    cgroup_destroy(_cgroup);
+    return -1;
+}
+
+
+// user + system time of every process that ever ran in the cgroup (us), -1 on errors
+long long cgroup_cpu_time(int cpu_stat_fd) {
+    return read_key(cpu_stat_fd, "usage_usec");
+}
+
+
+// memory of every process in the cgroup now (bytes), -1 on errors
+long long cgroup_memory(int memory_current_fd) {
+    char buffer[32];
+    ssize_t length = pread(memory_current_fd, buffer, sizeof(buffer) - 1, 0);
+    if (length <= 0) {
+        return -1;
+    }
+    buffer[length] = '\0';
+    return strtoll(buffer, NULL, 10);
+}
+
+
+// cpu time (ms) and peak memory (bytes) of the whole process tree, instead of the rusage of the child alone.
+// memory is -1 before linux 5.19, which has no memory.peak
+int cgroup_read_usage(struct cgroup *_cgroup, int *cpu_time, long *memory, int *oom_killed) {
+    long long usage = cgroup_cpu_time(_cgroup->cpu_stat_fd), oom_kill_count = -1;
+    int fd;
+
+    if (usage < 0) {
+        return -1;
+    }
+    *cpu_time = (int) (usage / 1000);
+    *memory = (long) read_single(_cgroup->fd, "memory.peak");
+
+    fd = openat(_cgroup->fd, "memory.events", O_RDONLY | O_CLOEXEC);
+    if (fd >= 0) {
+        oom_kill_count = read_key(fd, "oom_kill");
+        close(fd);
+    }
+    *oom_killed = oom_kill_count > 0;
+    return 0;
+}
+
+
+void cgroup_destroy(struct cgroup *_cgroup) {
+    int waited;
+    struct timespec interval = {0, 1000000};
+
+    if (_cgroup->procs_fd >= 0) {
+        close(_cgroup->procs_fd);
+    }
+    if (_cgroup->cpu_stat_fd >= 0) {
+        close(_cgroup->cpu_stat_fd);
+    }
+    if (_cgroup->memory_current_fd >= 0) {
+        close(_cgroup->memory_current_fd);
+    }
+    _cgroup->procs_fd = _cgroup->cpu_stat_fd = _cgroup->memory_current_fd = -1;
+    if (_cgroup->fd < 0 && _cgroup->name[0] == '\0') {
+        return;
+    }
+
+    // processes left behind by the child (linux 5.14+), rmdir fails until they are gone
+    if (_cgroup->fd >= 0) {
+        write_file(_cgroup->fd, "cgroup.kill", "1");
+        close(_cgroup->fd);
+        _cgroup->fd = -1;
+    }
+    for (waited = 0; unlinkat(_cgroup->base_fd, _cgroup->name, AT_REMOVEDIR) != 0 &&
+                     errno == EBUSY && waited < CGROUP_REMOVE_TIMEOUT; waited++) {
+        nanosleep(&interval, NULL);
+    }
+    _cgroup->name[0] = '\0';
+}
@@ -0,0 +1,34 @@
+#ifndef JUDGER_CGROUP_H
+#define JUDGER_CGROUP_H
+
+#include "definitions.h"
+
+// how long to wait for the processes of a run to go away before its cgroup is removed (ms)
+#define CGROUP_REMOVE_TIMEOUT 1000
+
+// the cgroup v2 of one run, created under the delegated cgroup given by --cgroup_path
+struct cgroup {
+    int base_fd;
+    int fd;
+    // the child moves itself here before execve
+    int procs_fd;
+    int cpu_stat_fd;
+    // -1 when the memory controller is not enabled
+    int memory_current_fd;
+    char name[64];
+};
+
+
+int cgroup_open(const char *path);
+
+int cgroup_create(struct cgroup *_cgroup, int base_fd, const struct config *_config);
+
+long long cgroup_cpu_time(int cpu_stat_fd);
+
+long long cgroup_memory(int memory_current_fd);
+
+int cgroup_read_usage(struct cgroup *_cgroup, int *cpu_time, long *memory, int *oom_killed);
+
+void cgroup_destroy(struct cgroup *_cgroup);
+
+#endif //JUDGER_CGROUP_H
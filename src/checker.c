@@ -0,0 +1,185 @@
+#define _GNU_SOURCE
+
+#include <stdio.h>
+#include <string.h>
+#include <errno.h>
+#include <unistd.h>
+#include <limits.h>
+
+#include <sys/socket.h>
+#include <sys/wait.h>
+#include <sys/resource.h>
+
+#include "checker.h"
+#include "comparator.h"
+#include "killer.h"
+#include "logger.h"
+
+
+// the run of the checker, in the sandbox of the program but with none of its files
+static void init_checker_config(const struct config *_config, struct config *checker_config) {
+    *checker_config = *_config;
+    checker_config->exe_path = checker_config->args[0] = _config->checker_path;
+    checker_config->args[1] = NULL;
+    checker_config->input_path = checker_config->output_path = checker_config->error_path = "/dev/null";
+    checker_config->input_fd = checker_config->output_fd = -1;
+    checker_config->answer_path = NULL;
+    checker_config->output_pipe = 0;
+    checker_config->zygote = 0;
+    checker_config->source_fd = -1;
+    checker_config->sample_interval = 0;
+    checker_config->checker_path = NULL;
+    checker_config->checker_persistent = 0;
+    checker_config->checker = NULL;
+    checker_config->interactor_path = NULL;
+}
+
+
+int checker_status(int exit_code) {
+    if (exit_code == CHECKER_ACCEPTED) {
+        return COMPARE_ACCEPTED;
+    }
+    if (exit_code == CHECKER_WRONG_ANSWER || exit_code == CHECKER_PRESENTATION_ERROR) {
+        return COMPARE_MISMATCH;
+    }
+    return COMPARE_CHECKER_FAILED;
+}
+
+
+static int send_all(int fd, const char *buffer, size_t length) {
+    ssize_t count;
+    while (length > 0) {
+        // a checker that is gone makes it fail with EPIPE, not kill the judger with SIGPIPE
+        count = send(fd, buffer, length, MSG_NOSIGNAL);
+        if (count < 0 && errno == EINTR) {
+            continue;
+        }
+        if (count <= 0) {
+            return -1;
+        }
+        buffer += count;
+        length -= count;
+    }
+    return 0;
+}
+
+
+static int checker_check(struct checker *_checker, const struct config *_config) {
+    struct logger *log_fp = _checker->process.log_fp;
+    char request[PATH_MAX * 3 + 4], line[CHECKER_LINE_MAX];
+    size_t length;
+    ssize_t count;
+    int exit_code;
+
+    if (_checker->failed) {
+        return COMPARE_CHECKER_FAILED;
+    }
+    length = snprintf(request, sizeof(request), "%s\n%s\n%s\n",
+                      _config->input_path != NULL ? _config->input_path : "/dev/null", _config->output_path,
+                      _config->answer_path != NULL ? _config->answer_path : "/dev/null");
+    // max_real_time is for every case, the time between them does not count
+    watchdog_restart(&_checker->process.watchdog);
+    if (length < sizeof(request) && send_all(_checker->input_fd, request, length) == 0) {
+        for (length = 0; length < sizeof(line) - 1; length++) {
+            if (watchdog_wait_fd(&_checker->process.watchdog, _checker->process.output_fd) <= 0) {
+                break;
+            }
+            while ((count = read(_checker->process.output_fd, line + length, 1)) < 0 && errno == EINTR);
+            if (count <= 0) {
+                break;
+            }
+            if (line[length] == '\n') {
+                line[length] = '\0';
+                if (sscanf(line, "%d", &exit_code) != 1) {
+                    break;
+                }
+                return checker_status(exit_code);
+            }
+        }
+    }
+    LOG_WARNING(log_fp, "Checker %s did not answer for %s", _checker->config.exe_path, _config->output_path);
+    _checker->failed = 1;
+    return COMPARE_CHECKER_FAILED;
+}
+
+
+int check_output(struct logger *log_fp, const struct config *_config) {
+    struct config checker_config;
+    struct result checker_result;
+
+    if (_config->checker != NULL) {
+        return checker_check(_config->checker, _config);
+    }
+    init_checker_config(_config, &checker_config);
+    checker_config.args[1] = _config->input_path != NULL ? _config->input_path : "/dev/null";
+    checker_config.args[2] = _config->output_path;
+    checker_config.args[3] = _config->answer_path != NULL ? _config->answer_path : "/dev/null";
+    checker_config.args[4] = NULL;
+
+    init_result(&checker_result);
+    run_process(log_fp, &checker_config, &checker_result);
+    if (checker_result.error == SUCCESS && checker_result.result == SUCCESS) {
+        return COMPARE_ACCEPTED;
+    }
+    if (checker_result.error == SUCCESS && checker_result.result == RUNTIME_ERROR && checker_result.signal == 0 &&
+        checker_status(checker_result.exit_code) == COMPARE_MISMATCH) {
+        return COMPARE_MISMATCH;
+    }
+    LOG_WARNING(log_fp, "Checker %s failed, error %d, result %d, exit code %d, signal %d", _config->checker_path,
+                checker_result.error, checker_result.result, checker_result.exit_code, checker_result.signal);
+    return COMPARE_CHECKER_FAILED;
+}
+
+
+int checker_start(struct checker *_checker, struct logger *log_fp, const struct config *_config) {
+    int sockets[2];
+
+    init_checker_config(_config, &_checker->config);
+    // the answers come back through the output pipe, the cases go through a socket
+    _checker->config.output_pipe = 1;
+    _checker->config.max_cpu_time = UNLIMITED;
+    _checker->input_fd = -1;
+    _checker->failed = 0;
+    if (socketpair(AF_UNIX, SOCK_STREAM | SOCK_CLOEXEC, 0, sockets) != 0) {
+        return -1;
+    }
+    _checker->config.input_fd = sockets[1];
+
+    init_result(&_checker->result);
+    if (process_start(&_checker->process, log_fp, &_checker->config, &_checker->result) != 0) {
+        close(sockets[0]);
+        close(sockets[1]);
+        return -1;
+    }
+    close(sockets[1]);
+    _checker->input_fd = sockets[0];
+
+    // ready once it is executed, a checker that never gets there fails every case
+    process_wait_executed(&_checker->process);
+    _checker->failed = _checker->process.phase_ends[PHASE_EXECVE] == 0;
+    return 0;
+}
+
+
+void checker_stop(struct checker *_checker) {
+    struct rusage resource_usage;
+    int status = 0, wait_status;
+
+    // the end of its stdin tells it to exit
+    close(_checker->input_fd);
+    _checker->input_fd = -1;
+    close(_checker->process.output_fd);
+    _checker->process.output_fd = -1;
+
+    watchdog_restart(&_checker->process.watchdog);
+    wait_status = watchdog_wait(&_checker->process.watchdog);
+    if (wait_status == 0) {
+        wait_status = wait4(_checker->process.pid, &status, WSTOPPED, &resource_usage);
+    }
+    process_finish(&_checker->process, wait_status, status, &resource_usage);
+    if (_checker->result.error != SUCCESS || _checker->result.result != SUCCESS) {
+        LOG_WARNING(_checker->process.log_fp, "Checker %s exited with error %d, result %d, exit code %d, signal %d",
+                    _checker->config.exe_path, _checker->result.error, _checker->result.result,
+                    _checker->result.exit_code, _checker->result.signal);
+    }
+}
@@ -0,0 +1,40 @@
+#ifndef JUDGER_CHECKER_H
+#define JUDGER_CHECKER_H
+
+#include "runner.h"
+
+// the exit codes of a checker, the ones of testlib; any other one, or a checker that did not exit, is SPJ_ERROR
+enum {
+    CHECKER_ACCEPTED = 0,
+    CHECKER_WRONG_ANSWER = 1,
+    CHECKER_PRESENTATION_ERROR = 2
+};
+
+#define CHECKER_LINE_MAX 32
+
+// a checker started once for all the cases of a batch. For every case it reads the input, output and answer
+// paths from stdin, one per line, and writes a line holding the exit code it would have had to stdout.
+// It gets max_real_time for each case instead of for the whole batch, max_cpu_time does not apply
+struct checker {
+    struct process process;
+    struct config config;
+    struct result result;
+    // the write end of the stdin of the checker, -1 once it is closed
+    int input_fd;
+    // it did not answer a case, the remaining ones are not sent
+    int failed;
+};
+
+// the COMPARE_* status of a CHECKER_* exit code
+int checker_status(int exit_code);
+
+// "<checker_path> <input_path> <output_path> <answer_path>" in the sandbox of the run, for its exit code.
+// Returns COMPARE_ACCEPTED, COMPARE_MISMATCH or COMPARE_CHECKER_FAILED, through _config->checker if it is set
+int check_output(struct logger *log_fp, const struct config *_config);
+
+// -1 if the checker of _config could not be started
+int checker_start(struct checker *, struct logger *log_fp, const struct config *);
+
+void checker_stop(struct checker *);
+
+#endif //JUDGER_CHECKER_H
@@ -10,11 +10,14 @@
 #include <grp.h>
 #include <dlfcn.h>
 #include <errno.h>
+#include <fcntl.h>
 #include <sched.h>
 #include <sys/resource.h>
 #include <sys/types.h>
 #include <sys/time.h>
 #include <sys/mount.h>
+#include <sys/prctl.h>
+#include <linux/seccomp.h>
 
 #include "child.h"
 #include "logger.h"
@@ -28,8 +31,36 @@ void close_file(FILE *fp) {
     }
 }
 
-void child_process(FILE *log_fp, struct config *_config) {
+void child_process(struct logger *log_fp, struct config *_config, const struct child_args *_args) {
     FILE *input_file = NULL, *output_file = NULL, *error_file = NULL;
+    pid_t parent_pid = getppid();
+    long long phase_ends[PHASE_NUMBER];
+    phase_ends[PHASE_FORK] = monotonic_ns();
+    log_forked(log_fp);
+
+    // the judger may be embedded in a process that ignores or blocks signals (python ignores
+    // SIGPIPE and SIGXFSZ), give the submission the default dispositions back
+    sigset_t empty_set;
+    sigemptyset(&empty_set);
+    sigprocmask(SIG_SETMASK, &empty_set, NULL);
+    signal(SIGPIPE, SIG_DFL);
+    signal(SIGXFSZ, SIG_DFL);
+
+    // join the cgroup of the run first, so everything from here on is accounted and limited
+    if (_args->cgroup_procs_fd != -1) {
+        if (write(_args->cgroup_procs_fd, "0", 1) != 1) {
+            CHILD_ERROR_EXIT(CGROUP_FAILED);
+        }
+        close(_args->cgroup_procs_fd);
+    }
+
+    // jail only the child when the judger itself is not chrooted, e.g. the python extension
+    if (_config->chroot_path != NULL) {
+        if (chdir(_config->chroot_path) != 0 || chroot(_config->chroot_path) != 0) {
+            CHILD_ERROR_EXIT(CHROOT_FAILED);
+        }
+    }
+    phase_ends[PHASE_JAIL] = monotonic_ns();
 
     if (_config->max_stack != UNLIMITED) {
         struct rlimit max_stack;
@@ -41,7 +72,8 @@ void child_process(FILE *log_fp, struct config *_config) {
 
     // set memory limit
     // if memory_limit_check_only == 0, we only check memory usage number, because setrlimit(maxrss) will cause some crash issues
-    if (_config->memory_limit_check_only == 0) {
+    // a cgroup limits memory.max instead, address space reserved by the runtime does not count there
+    if (_config->memory_limit_check_only == 0 && _args->cgroup_procs_fd == -1) {
         if (_config->max_memory != UNLIMITED) {
             struct rlimit max_memory;
             max_memory.rlim_cur = max_memory.rlim_max = (rlim_t) (_config->max_memory) * 2;
@@ -51,7 +83,8 @@ void child_process(FILE *log_fp, struct config *_config) {
         }
     }
 
-    // set cpu time limit (in seconds), we ceil to the seconds because strlimit cpu only takes seconds
+    // the judger kills the process at max_cpu_time, this is only a backstop in case it can not (in seconds),
+    // we ceil to the seconds because strlimit cpu only takes seconds
     if (_config->max_cpu_time != UNLIMITED) {
         struct rlimit max_cpu_time;
         max_cpu_time.rlim_cur = max_cpu_time.rlim_max = (rlim_t) ((_config->max_cpu_time + 1000) / 1000);
@@ -60,8 +93,8 @@ void child_process(FILE *log_fp, struct config *_config) {
         }
     }
 
-    // set max process number limit
-    if (_config->max_process_number != UNLIMITED) {
+    // set max process number limit, per user unless the cgroup limits pids.max of this run alone
+    if (_config->max_process_number != UNLIMITED && _args->cgroup_procs_fd == -1) {
         struct rlimit max_process_number;
         max_process_number.rlim_cur = max_process_number.rlim_max = (rlim_t) _config->max_process_number;
         if (setrlimit(RLIMIT_NPROC, &max_process_number) != 0) {
@@ -78,7 +111,27 @@ void child_process(FILE *log_fp, struct config *_config) {
         }
     }
 
-    if (_config->input_path != NULL) {
+    // a core of its own keeps concurrent runs from disturbing each other's timing
+    if (_config->cpu_core != UNLIMITED) {
+        cpu_set_t cpu_set;
+        CPU_ZERO(&cpu_set);
+        CPU_SET(_config->cpu_core, &cpu_set);
+        if (sched_setaffinity(0, sizeof(cpu_set), &cpu_set) != 0) {
+            CHILD_ERROR_EXIT(SETAFFINITY_FAILED);
+        }
+    }
+    phase_ends[PHASE_SETRLIMIT] = monotonic_ns();
+
+    if (_config->input_fd >= 0) {
+        // opened by the caller, it may be outside the chroot or not readable by uid
+        if (_config->input_fd != fileno(stdin)) {
+            if (dup2(_config->input_fd, fileno(stdin)) == -1) {
+                CHILD_ERROR_EXIT(DUP2_FAILED);
+            }
+            close(_config->input_fd);
+        }
+    }
+    else if (_config->input_path != NULL) {
         input_file = fopen(_config->input_path, "r");
         if (input_file == NULL) {
             CHILD_ERROR_EXIT(DUP2_FAILED);
@@ -94,7 +147,21 @@ void child_process(FILE *log_fp, struct config *_config) {
         }
     }
 
-    if (_config->output_path != NULL) {
+    // the "-c" stub of add_source reads the source from it after execve
+    if (_config->source_fd >= 0 && fcntl(_config->source_fd, F_SETFD, 0) != 0) {
+        CHILD_ERROR_EXIT(DUP2_FAILED);
+    }
+
+    if (_args->output_fd != -1) {
+        // stdout is a pipe read by the judger, output_path is not used
+        if (_args->output_fd != fileno(stdout)) {
+            if (dup2(_args->output_fd, fileno(stdout)) == -1) {
+                CHILD_ERROR_EXIT(DUP2_FAILED);
+            }
+            close(_args->output_fd);
+        }
+    }
+    else if (_config->output_path != NULL) {
         output_file = fopen(_config->output_path, "w");
         if (output_file == NULL) {
             CHILD_ERROR_EXIT(DUP2_FAILED);
@@ -107,7 +174,7 @@ void child_process(FILE *log_fp, struct config *_config) {
 
     if (_config->error_path != NULL) {
         // if outfile and error_file is the same path, we use the same file pointer
-        if (_config->output_path != NULL && strcmp(_config->output_path, _config->error_path) == 0) {
+        if (output_file != NULL && strcmp(_config->output_path, _config->error_path) == 0) {
             error_file = output_file;
         }
         else {
@@ -123,6 +190,7 @@ void child_process(FILE *log_fp, struct config *_config) {
             CHILD_ERROR_EXIT(DUP2_FAILED);
         }
     }
+    phase_ends[PHASE_OPEN_FILES] = monotonic_ns();
 
     // set gid
     gid_t group_list[] = {_config->gid};
@@ -135,30 +203,35 @@ void child_process(FILE *log_fp, struct config *_config) {
         CHILD_ERROR_EXIT(SETUID_FAILED);
     }
 
-    // load seccomp
-    if (_config->seccomp_rule_name != NULL) {
-        if (strcmp("c_cpp", _config->seccomp_rule_name) == 0) {
-            if (c_cpp_seccomp_rules(_config) != SUCCESS) {
-                CHILD_ERROR_EXIT(LOAD_SECCOMP_FAILED);
-            }
-        }
-        else if (strcmp("c_cpp_file_io", _config->seccomp_rule_name) == 0) {
-            if (c_cpp_file_io_seccomp_rules(_config) != SUCCESS) {
-                CHILD_ERROR_EXIT(LOAD_SECCOMP_FAILED);
-            }
-        }
-        else if (strcmp("general", _config->seccomp_rule_name) == 0) {
-            if (general_seccomp_rules(_config) != SUCCESS) {
-                CHILD_ERROR_EXIT(LOAD_SECCOMP_FAILED);
-            }
-        }
-        else if (strcmp("python", _config->seccomp_rule_name) == 0) {
-            if (python_seccomp_rules(_config) != SUCCESS) {
-                CHILD_ERROR_EXIT(LOAD_SECCOMP_FAILED);
-            }
+    // die together with the judger, e.g. when an asyncio caller cancels a run by killing it.
+    // changing credentials resets this, so it must come after setuid
+    if (prctl(PR_SET_PDEATHSIG, SIGKILL) != 0) {
+        CHILD_ERROR_EXIT(SETUID_FAILED);
+    }
+    if (getppid() != parent_pid) {
+        // the judger is already gone
+        CHILD_ERROR_EXIT(FORK_FAILED);
+    }
+    phase_ends[PHASE_SETUID] = monotonic_ns();
+
+    // the seccomp rule may not allow write, so the timestamps are sent before it is loaded.
+    // a single write below PIPE_BUF is atomic, the judger gets all of them or none
+    if (_args->phases_fd != -1) {
+        if (write(_args->phases_fd, phase_ends + PHASE_FORK, sizeof(long long) * (PHASE_EXECVE - PHASE_FORK)) < 0) {
+            LOG_WARNING(log_fp, "Couldn't send the phase timestamps: %s", strerror(errno));
         }
-        else {
-            // rule does not exist
+    }
+
+    // load seccomp, the filter was compiled by the judger and only has to be installed
+    if (_args->seccomp_filter != NULL) {
+        // the execve rule compares against the address of seccomp_exe_path
+        if (strlen(_config->exe_path) >= sizeof(seccomp_exe_path)) {
+            CHILD_ERROR_EXIT(EXECVE_FAILED);
+        }
+        strcpy(seccomp_exe_path, _config->exe_path);
+        _config->exe_path = seccomp_exe_path;
+        if (prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0) != 0 ||
+            prctl(PR_SET_SECCOMP, SECCOMP_MODE_FILTER, _args->seccomp_filter) != 0) {
             CHILD_ERROR_EXIT(LOAD_SECCOMP_FAILED);
         }
     }
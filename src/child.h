@@ -2,7 +2,9 @@
 #define JUDGER_CHILD_H
 
 #include <string.h>
+#include <linux/filter.h>
 #include "definitions.h"
+#include "logger.h"
 
 #define CHILD_ERROR_EXIT(error_code)\
     {\
@@ -19,6 +21,19 @@
     }
 
 
-void child_process(FILE *log_fp, struct config *_config);
+// what the judger prepared for the child before fork
+struct child_args {
+    // stdout goes here instead of output_path, -1 for none
+    int output_fd;
+    // cgroup.procs of the cgroup of the run, -1 for none
+    int cgroup_procs_fd;
+    // the compiled seccomp_rule_name, NULL for none
+    const struct sock_fprog *seccomp_filter;
+    // close on exec pipe, the end times of PHASE_FORK to PHASE_SETUID are written to it before execve; -1 for none
+    int phases_fd;
+};
+
+
+void child_process(struct logger *log_fp, struct config *_config, const struct child_args *_args);
 
 #endif //JUDGER_CHILD_H
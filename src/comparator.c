@@ -0,0 +1,340 @@
+#define _POSIX_C_SOURCE 200809L
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <limits.h>
+#include <math.h>
+#include <unistd.h>
+
+#include "comparator.h"
+
+#define IS_BLANK(c) ((c) == ' ' || (c) == '\t' || (c) == '\r')
+#define IS_SPACE(c) (IS_BLANK(c) || (c) == '\n' || (c) == '\v' || (c) == '\f')
+#define IS_LINE_END(c) ((c) == '\n' || (c) == EOF)
+
+
+struct token {
+    char *data;
+    size_t length;
+    size_t capacity;
+};
+
+
+int compare_mode_from_name(const char *name) {
+    if (name == NULL || strcmp(name, "exact") == 0) {
+        return COMPARE_EXACT;
+    }
+    if (strcmp(name, "lines") == 0) {
+        return COMPARE_LINES;
+    }
+    if (strcmp(name, "tokens") == 0) {
+        return COMPARE_TOKENS;
+    }
+    if (strcmp(name, "floats") == 0) {
+        return COMPARE_FLOATS;
+    }
+    return -1;
+}
+
+
+void stream_init(struct stream *stream, int fd) {
+    stream->fd = fd;
+    stream->position = stream->length = 0;
+    stream->total_length = 0;
+    stream->max_length = UNLIMITED;
+    stream->eof = stream->error = stream->overflow = 0;
+    stream->watchdog = NULL;
+}
+
+
+static int stream_fill(struct stream *stream) {
+    ssize_t count;
+    size_t size = STREAM_BUFFER_SIZE;
+    if (stream->eof) {
+        return 0;
+    }
+    // one byte past the limit is enough to tell that it was passed
+    if (stream->max_length != UNLIMITED && (size_t) (stream->max_length - stream->total_length) < size) {
+        size = (size_t) (stream->max_length - stream->total_length) + 1;
+    }
+    if (stream->watchdog != NULL) {
+        // the writer was killed at its deadline, what it wrote so far is all there is
+        count = watchdog_wait_fd(stream->watchdog, stream->fd);
+        if (count <= 0) {
+            stream->error = count < 0;
+            stream->eof = 1;
+            return 0;
+        }
+    }
+    do {
+        count = read(stream->fd, stream->buffer, size);
+    } while (count < 0 && errno == EINTR);
+    if (count <= 0) {
+        stream->error = count < 0;
+        stream->eof = 1;
+        return 0;
+    }
+    stream->total_length += count;
+    if (stream->max_length != UNLIMITED && stream->total_length > stream->max_length) {
+        stream->overflow = stream->eof = 1;
+        return 0;
+    }
+    stream->position = 0;
+    stream->length = (size_t) count;
+    return 1;
+}
+
+
+static inline int stream_peek(struct stream *stream) {
+    if (stream->position == stream->length && !stream_fill(stream)) {
+        return EOF;
+    }
+    return (unsigned char) stream->buffer[stream->position];
+}
+
+
+static inline void stream_skip(struct stream *stream) {
+    stream->position++;
+}
+
+
+static int compare_exact(struct stream *output, struct stream *answer) {
+    while (1) {
+        int output_more = output->position < output->length || stream_fill(output);
+        int answer_more = answer->position < answer->length || stream_fill(answer);
+        if (!output_more || !answer_more) {
+            return output_more == answer_more ? COMPARE_ACCEPTED : COMPARE_MISMATCH;
+        }
+        size_t count = output->length - output->position;
+        if (answer->length - answer->position < count) {
+            count = answer->length - answer->position;
+        }
+        if (memcmp(output->buffer + output->position, answer->buffer + answer->position, count) != 0) {
+            return COMPARE_MISMATCH;
+        }
+        output->position += count;
+        answer->position += count;
+    }
+}
+
+
+static int only_space_left(struct stream *stream) {
+    int c;
+    while ((c = stream_peek(stream)) != EOF) {
+        if (!IS_SPACE(c)) {
+            return 0;
+        }
+        stream_skip(stream);
+    }
+    return 1;
+}
+
+
+static int compare_lines(struct stream *output, struct stream *answer) {
+    while (1) {
+        int a = stream_peek(output), b = stream_peek(answer);
+
+        if (IS_BLANK(a) || IS_BLANK(b)) {
+            // blanks must match unless both runs of them end their lines
+            int same = 1;
+            while (IS_BLANK(a) && IS_BLANK(b)) {
+                same &= a == b;
+                stream_skip(output);
+                stream_skip(answer);
+                a = stream_peek(output);
+                b = stream_peek(answer);
+            }
+            same &= IS_BLANK(a) == IS_BLANK(b);
+            for (; IS_BLANK(a); a = stream_peek(output)) {
+                stream_skip(output);
+            }
+            for (; IS_BLANK(b); b = stream_peek(answer)) {
+                stream_skip(answer);
+            }
+            if (!same && !(IS_LINE_END(a) && IS_LINE_END(b))) {
+                return COMPARE_MISMATCH;
+            }
+        }
+
+        if (a == b) {
+            if (a == EOF) {
+                return COMPARE_ACCEPTED;
+            }
+            stream_skip(output);
+            stream_skip(answer);
+        }
+        // one side ended, the other one may only have blank lines left
+        else if (IS_LINE_END(a) && IS_LINE_END(b)) {
+            return only_space_left(a == EOF ? answer : output) ? COMPARE_ACCEPTED : COMPARE_MISMATCH;
+        }
+        else {
+            return COMPARE_MISMATCH;
+        }
+    }
+}
+
+
+static int skip_space(struct stream *stream) {
+    int c;
+    while (IS_SPACE(c = stream_peek(stream))) {
+        stream_skip(stream);
+    }
+    return c;
+}
+
+
+static int compare_tokens(struct stream *output, struct stream *answer) {
+    while (1) {
+        int a = skip_space(output), b = skip_space(answer);
+        if (a == EOF || b == EOF) {
+            return a == b ? COMPARE_ACCEPTED : COMPARE_MISMATCH;
+        }
+        while (a == b && a != EOF && !IS_SPACE(a)) {
+            stream_skip(output);
+            stream_skip(answer);
+            a = stream_peek(output);
+            b = stream_peek(answer);
+        }
+        // both tokens must end here
+        if (!(a == EOF || IS_SPACE(a)) || !(b == EOF || IS_SPACE(b))) {
+            return COMPARE_MISMATCH;
+        }
+    }
+}
+
+
+static int read_token(struct stream *stream, struct token *token) {
+    int c = skip_space(stream);
+    token->length = 0;
+    for (; c != EOF && !IS_SPACE(c); c = stream_peek(stream)) {
+        if (token->length + 1 >= token->capacity) {
+            size_t capacity = token->capacity == 0 ? 64 : token->capacity * 2;
+            char *data = realloc(token->data, capacity);
+            if (data == NULL) {
+                return -1;
+            }
+            token->data = data;
+            token->capacity = capacity;
+        }
+        token->data[token->length++] = (char) c;
+        stream_skip(stream);
+    }
+    if (token->data != NULL) {
+        token->data[token->length] = '\0';
+    }
+    return 0;
+}
+
+
+static int parse_float(const struct token *token, double *value) {
+    char *end;
+    *value = strtod(token->data, &end);
+    return *end == '\0' && isfinite(*value);
+}
+
+
+static int compare_floats(struct stream *output, struct stream *answer, double float_tolerance) {
+    struct token output_token = {NULL, 0, 0}, answer_token = {NULL, 0, 0};
+    int status = COMPARE_ACCEPTED;
+
+    while (1) {
+        double x, y;
+        if (read_token(output, &output_token) != 0 || read_token(answer, &answer_token) != 0) {
+            status = COMPARE_IO_ERROR;
+            break;
+        }
+        if (output_token.length == 0 || answer_token.length == 0) {
+            status = output_token.length == answer_token.length ? COMPARE_ACCEPTED : COMPARE_MISMATCH;
+            break;
+        }
+        if (parse_float(&output_token, &x) && parse_float(&answer_token, &y)) {
+            if (fabs(x - y) > float_tolerance && fabs(x - y) > float_tolerance * fabs(y)) {
+                status = COMPARE_MISMATCH;
+                break;
+            }
+        }
+        else if (strcmp(output_token.data, answer_token.data) != 0) {
+            status = COMPARE_MISMATCH;
+            break;
+        }
+    }
+    free(output_token.data);
+    free(answer_token.data);
+    return status;
+}
+
+
+int compare_streams(struct stream *output, struct stream *answer, int mode, double float_tolerance) {
+    int status;
+    switch (mode) {
+        case COMPARE_LINES:
+            status = compare_lines(output, answer);
+            break;
+        case COMPARE_TOKENS:
+            status = compare_tokens(output, answer);
+            break;
+        case COMPARE_FLOATS:
+            status = compare_floats(output, answer, float_tolerance);
+            break;
+        default:
+            status = compare_exact(output, answer);
+            break;
+    }
+    // a read error is not a verdict
+    if (output->error || answer->error) {
+        return COMPARE_IO_ERROR;
+    }
+    if (output->overflow || answer->overflow) {
+        return COMPARE_TOO_LONG;
+    }
+    return status;
+}
+
+
+static int open_in_jail(const struct config *_config, const char *path) {
+    char jailed_path[PATH_MAX];
+    // the child was jailed, but the judger itself was not
+    if (_config->chroot_path != NULL) {
+        if (snprintf(jailed_path, sizeof(jailed_path), "%s/%s", _config->chroot_path, path) >= (int) sizeof(jailed_path)) {
+            return -1;
+        }
+        path = jailed_path;
+    }
+    return open(path, O_RDONLY | O_CLOEXEC);
+}
+
+
+int compare_output(const struct config *_config) {
+    int output_fd = open_in_jail(_config, _config->output_path);
+    int status = COMPARE_IO_ERROR;
+
+    if (output_fd >= 0) {
+        // the size of a file is already limited by RLIMIT_FSIZE
+        status = compare_output_fd(_config, output_fd, UNLIMITED, NULL);
+        close(output_fd);
+    }
+    return status;
+}
+
+
+int compare_output_fd(const struct config *_config, int output_fd, long max_length, struct watchdog *_watchdog) {
+    // two 64k buffers, keep them off the stack
+    struct stream *streams = malloc(sizeof(struct stream) * 2);
+    int answer_fd = open_in_jail(_config, _config->answer_path);
+    int status = COMPARE_IO_ERROR;
+
+    if (streams != NULL && answer_fd >= 0) {
+        stream_init(&streams[0], output_fd);
+        stream_init(&streams[1], answer_fd);
+        streams[0].max_length = max_length;
+        streams[0].watchdog = _watchdog;
+        status = compare_streams(&streams[0], &streams[1], _config->compare_mode, _config->float_tolerance);
+    }
+    if (answer_fd >= 0) {
+        close(answer_fd);
+    }
+    free(streams);
+    return status;
+}
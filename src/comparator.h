@@ -0,0 +1,58 @@
+#ifndef JUDGER_COMPARATOR_H
+#define JUDGER_COMPARATOR_H
+
+#include <stddef.h>
+#include "definitions.h"
+#include "killer.h"
+
+#define STREAM_BUFFER_SIZE (64 * 1024)
+
+enum {
+    COMPARE_EXACT = 0,
+    // lines must match, except for blanks at their end and blank lines at the end of the output
+    COMPARE_LINES = 1,
+    // whitespace separated tokens must match
+    COMPARE_TOKENS = 2,
+    // like COMPARE_TOKENS, numbers may differ by float_tolerance (absolute or relative)
+    COMPARE_FLOATS = 3
+};
+
+
+enum {
+    COMPARE_ACCEPTED = 0,
+    COMPARE_MISMATCH = 1,
+    COMPARE_IO_ERROR = 2,
+    // the output went past the limit of its stream
+    COMPARE_TOO_LONG = 3,
+    // the checker crashed, was killed or exited with a code that is not a verdict
+    COMPARE_CHECKER_FAILED = 4
+};
+
+
+struct stream {
+    int fd;
+    char buffer[STREAM_BUFFER_SIZE];
+    size_t position;
+    size_t length;
+    // bytes read so far, and how many may be read before the stream overflows (UNLIMITED for no limit)
+    long total_length;
+    long max_length;
+    int eof;
+    int error;
+    int overflow;
+    // reads of a pipe stop at the deadline of the writer, NULL for files
+    struct watchdog *watchdog;
+};
+
+
+int compare_mode_from_name(const char *name);
+
+void stream_init(struct stream *stream, int fd);
+
+int compare_streams(struct stream *output, struct stream *answer, int mode, double float_tolerance);
+
+int compare_output(const struct config *_config);
+
+int compare_output_fd(const struct config *_config, int output_fd, long max_length, struct watchdog *_watchdog);
+
+#endif //JUDGER_COMPARATOR_H
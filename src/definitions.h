@@ -2,6 +2,7 @@
 #define JUDGER_DEFINITIONS_H
 
 #include <sys/types.h>
+#include <sys/resource.h>
 
 // (ver >> 16) & 0xff, (ver >> 8) & 0xff, ver & 0xff  -> real version
 #define VERSION 0x020101
@@ -18,8 +19,19 @@
         return; \
     }
 
+// same as ERROR_EXIT, for the code that runs with a log opened by its caller
+#define PROCESS_ERROR_EXIT(error_code)\
+    {\
+        LOG_ERROR(error_code);  \
+        _result->error = error_code; \
+        return; \
+    }
+
 #define ARGS_MAX_NUMBER 256
 #define ENV_MAX_NUMBER 256
+#define CASES_MAX_NUMBER 1024
+// a longer run keeps every other sample at twice the interval
+#define SAMPLES_MAX_NUMBER 128
 
 
 enum {
@@ -35,10 +47,16 @@ enum {
     SETUID_FAILED = -9,
     EXECVE_FAILED = -10,
     SPJ_ERROR = -11,
-    CHROOT_FAILED = -12
+    CHROOT_FAILED = -12,
+    COMPARE_FAILED = -13,
+    CGROUP_FAILED = -14,
+    SETAFFINITY_FAILED = -15
 };
 
 
+// the persistent checker of a batch, see checker.h
+struct checker;
+
 struct config {
     int max_cpu_time;
     int max_real_time;
@@ -49,15 +67,58 @@ struct config {
     int memory_limit_check_only;
     char *exe_path;
     char *input_path;
+    // an open file dup2'd onto stdin instead of opening input_path, -1 for input_path. It shares its offset
+    // with the caller, so every run needs an open file of its own
+    int input_fd;
     char *output_path;
+    // the same for stdout, only set by the judger itself; -1 for output_path
+    int output_fd;
     char *error_path;
     char *args[ARGS_MAX_NUMBER];
     char *env[ENV_MAX_NUMBER];
     char *log_path;
+    // LOG_LEVEL_* and LOG_FORMAT_* of logger.h, the log is rotated at log_max_size bytes (UNLIMITED for never)
+    int log_level;
+    int log_format;
+    long log_max_size;
     char *seccomp_rule_name;
     char *chroot_path;
     uid_t uid;
     gid_t gid;
+    char *answer_path;
+    int compare_mode;
+    double float_tolerance;
+    int output_pipe;
+    // run in a cgroup v2 created under this one, opened as cgroup_fd (-1 until opened)
+    char *cgroup_path;
+    int cgroup_fd;
+    // pin the program to this cpu core, UNLIMITED to let it run anywhere
+    int cpu_core;
+    // "exe_path -c <source> args..." is forked from a warm interpreter instead of started, see zygote.h
+    int zygote;
+    // the source of a python submission, run as "exe_path -c <source> args..." by a stub that reads it from this fd
+    // (or sent to the zygote), so its size is not limited by argv; -1 when it is in args
+    int source_fd;
+    // record the cpu time and memory of the program every sample_interval ms, 0 for no samples
+    int sample_interval;
+    // "checker_path <input_path> <output_path> <answer_path>" decides on the output by its exit code,
+    // instead of comparing it with answer_path; NULL to compare
+    char *checker_path;
+    // the cases of a batch are all checked by one checker process, started as checker
+    int checker_persistent;
+    struct checker *checker;
+    // "interactor_path <input_path> <output_path> <answer_path>" runs next to the program, the stdout of each one
+    // is the stdin of the other; NULL for none. Its limits, the real time limit is the one of the program
+    char *interactor_path;
+    int interactor_max_cpu_time;
+    long interactor_max_memory;
+};
+
+
+struct test_case {
+    char *input_path;
+    char *output_path;
+    char *answer_path;
 };
 
 
@@ -71,6 +132,50 @@ enum {
 };
 
 
+// the steps of a run, in order, their durations are reported with the result
+enum {
+    // looking up the seccomp rule, creating the cgroup, the pipes and the zygote
+    PHASE_SETUP = 0,
+    // from fork until the child runs
+    PHASE_FORK,
+    // joining the cgroup and chroot
+    PHASE_JAIL,
+    // the rlimits and the cpu affinity
+    PHASE_SETRLIMIT,
+    // opening and redirecting stdin, stdout and stderr
+    PHASE_OPEN_FILES,
+    // setgid, setgroups and setuid
+    PHASE_SETUID,
+    // loading the seccomp filter and execve, until the judger sees the pipe of the child close
+    PHASE_EXECVE,
+    // from execve until wait4 returned
+    PHASE_RUN,
+    // stopping the watchdog, reading and removing the cgroup
+    PHASE_TEARDOWN,
+    // checking the output against answer_path, or running the checker, once the program exited
+    PHASE_COMPARE,
+    PHASE_NUMBER
+};
+
+
+// the program at time ms after its execve, -1 for what could not be read
+struct sample {
+    int time;
+    int cpu_time;
+    long memory;
+};
+
+
+// how the interactor of an interactive run did, all 0 when there was none
+struct interactor_result {
+    int cpu_time;
+    int real_time;
+    long memory;
+    int signal;
+    int exit_code;
+};
+
+
 struct result {
     int cpu_time;
     int real_time;
@@ -79,6 +184,14 @@ struct result {
     int exit_code;
     int error;
     int result;
+    int cpu_core;
+    // nanoseconds spent in each PHASE_*, 0 for the phases that did not happen
+    long long phases[PHASE_NUMBER];
+    // all of the rusage of the child, cpu_time and memory above may come from the cgroup instead
+    struct rusage resource_usage;
+    int sample_count;
+    struct sample samples[SAMPLES_MAX_NUMBER];
+    struct interactor_result interactor;
 };
 
 
@@ -0,0 +1,171 @@
+#define _GNU_SOURCE
+
+#include <stdio.h>
+#include <string.h>
+#include <unistd.h>
+#include <fcntl.h>
+
+#include <sys/wait.h>
+#include <sys/resource.h>
+
+#include "interactor.h"
+#include "checker.h"
+#include "comparator.h"
+#include "killer.h"
+#include "logger.h"
+
+enum {
+    PROGRAM = 0,
+    INTERACTOR = 1
+};
+
+
+static void close_pipe(int pipe_fds[2]) {
+    int i;
+    for (i = 0; i < 2; i++) {
+        if (pipe_fds[i] >= 0) {
+            close(pipe_fds[i]);
+            pipe_fds[i] = -1;
+        }
+    }
+}
+
+
+// the interactor runs like the program, without its files, its zygote or its checker. It is trusted and writes
+// output_path, so the seccomp rule of the program, which may only allow reading files, is not loaded for it
+static void init_interactor_config(const struct config *_config, struct config *interactor_config) {
+    *interactor_config = *_config;
+    interactor_config->exe_path = interactor_config->args[0] = _config->interactor_path;
+    interactor_config->args[1] = _config->input_path != NULL ? _config->input_path : "/dev/null";
+    interactor_config->args[2] = _config->output_path != NULL ? _config->output_path : "/dev/null";
+    interactor_config->args[3] = _config->answer_path != NULL ? _config->answer_path : "/dev/null";
+    interactor_config->args[4] = NULL;
+    interactor_config->error_path = "/dev/null";
+    interactor_config->max_cpu_time = _config->interactor_max_cpu_time;
+    interactor_config->max_memory = _config->interactor_max_memory;
+    interactor_config->answer_path = NULL;
+    interactor_config->seccomp_rule_name = NULL;
+    interactor_config->zygote = 0;
+    interactor_config->source_fd = -1;
+    interactor_config->sample_interval = 0;
+    interactor_config->checker_path = NULL;
+    interactor_config->checker = NULL;
+    interactor_config->interactor_path = NULL;
+}
+
+
+// the verdict of the interactor, a COMPARE_* status
+static int interactor_status(const struct result *interactor_result) {
+    if (interactor_result->error != SUCCESS || interactor_result->signal != 0 ||
+        (interactor_result->result != SUCCESS && interactor_result->result != RUNTIME_ERROR)) {
+        return COMPARE_CHECKER_FAILED;
+    }
+    return checker_status(interactor_result->exit_code);
+}
+
+
+void run_interactive(struct logger *log_fp, struct config *_config, struct result *_result) {
+    struct config configs[2];
+    struct result interactor_result;
+    struct result *results[2] = {_result, &interactor_result};
+    struct process processes[2];
+    struct watchdog *watchdogs[2];
+    struct rusage resource_usages[2];
+    int to_program[2] = {-1, -1}, from_program[2] = {-1, -1};
+    int statuses[2] = {0, 0}, wait_statuses[2] = {-1, -1}, started[2] = {0, 0}, running[2] = {0, 0}, indexes[2];
+    int i, count, ready, status;
+
+    init_result(&interactor_result);
+    if (pipe2(to_program, O_CLOEXEC) != 0 || pipe2(from_program, O_CLOEXEC) != 0) {
+        close_pipe(to_program);
+        close_pipe(from_program);
+        PROCESS_ERROR_EXIT(DUP2_FAILED);
+    }
+
+    configs[PROGRAM] = *_config;
+    configs[PROGRAM].input_fd = to_program[0];
+    configs[PROGRAM].output_fd = from_program[1];
+    configs[PROGRAM].interactor_path = NULL;
+    configs[PROGRAM].zygote = 0;
+    // output_path is the interactor's
+    if (_config->error_path != NULL && _config->output_path != NULL &&
+        strcmp(_config->error_path, _config->output_path) == 0) {
+        configs[PROGRAM].error_path = "/dev/null";
+    }
+    // compared by the interactor, or by the checker with what the interactor wrote
+    if (_config->checker_path == NULL) {
+        configs[PROGRAM].answer_path = NULL;
+    }
+    init_interactor_config(_config, &configs[INTERACTOR]);
+    configs[INTERACTOR].input_fd = from_program[0];
+    configs[INTERACTOR].output_fd = to_program[1];
+
+    // the interactor first, when the program can not start it is left with nothing to read
+    for (i = INTERACTOR; i >= PROGRAM; i--) {
+        if (process_start(&processes[i], log_fp, &configs[i], results[i]) != 0) {
+            break;
+        }
+        started[i] = running[i] = 1;
+    }
+    // from now on each end is only open in the process it belongs to, so an exit is the end of the other's input
+    close_pipe(to_program);
+    close_pipe(from_program);
+    for (i = PROGRAM; i <= INTERACTOR; i++) {
+        if (started[i]) {
+            process_wait_executed(&processes[i]);
+        }
+    }
+
+    while (running[PROGRAM] || running[INTERACTOR]) {
+        for (i = PROGRAM, count = 0; i <= INTERACTOR; i++) {
+            if (running[i]) {
+                indexes[count] = i;
+                watchdogs[count++] = &processes[i].watchdog;
+            }
+        }
+        // process_finish() kills and reaps the ones left with a failed wait
+        if ((ready = watchdog_wait_any(watchdogs, count)) < 0) {
+            break;
+        }
+        i = indexes[ready];
+        wait_statuses[i] = wait4(processes[i].pid, &statuses[i], WSTOPPED, &resource_usages[i]);
+        running[i] = 0;
+    }
+
+    // the interactor first, the checker of the program reads what it wrote
+    for (i = INTERACTOR; i >= PROGRAM; i--) {
+        if (started[i]) {
+            process_finish(&processes[i], wait_statuses[i], statuses[i], &resource_usages[i]);
+        }
+    }
+    _result->interactor.cpu_time = interactor_result.cpu_time;
+    _result->interactor.real_time = interactor_result.real_time;
+    _result->interactor.memory = interactor_result.memory;
+    _result->interactor.signal = interactor_result.signal;
+    _result->interactor.exit_code = interactor_result.exit_code;
+
+    if (!started[INTERACTOR]) {
+        _result->result = SYSTEM_ERROR;
+        _result->error = interactor_result.error;
+        return;
+    }
+    if (!started[PROGRAM] || _result->error != SUCCESS) {
+        return;
+    }
+    // the limits of the program come first, then the interactor even if the program died of it
+    // (usually of SIGPIPE, writing to an interactor that already exited)
+    status = interactor_status(&interactor_result);
+    if (_result->result != SUCCESS && _result->result != RUNTIME_ERROR) {
+        return;
+    }
+    if (status == COMPARE_MISMATCH) {
+        _result->result = WRONG_ANSWER;
+    }
+    else if (status == COMPARE_CHECKER_FAILED) {
+        LOG_WARNING(log_fp, "Interactor %s failed, error %d, result %d, exit code %d, signal %d",
+                    _config->interactor_path, interactor_result.error, interactor_result.result,
+                    interactor_result.exit_code, interactor_result.signal);
+        _result->result = SYSTEM_ERROR;
+        PROCESS_ERROR_EXIT(SPJ_ERROR);
+    }
+}
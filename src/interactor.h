@@ -0,0 +1,12 @@
+#ifndef JUDGER_INTERACTOR_H
+#define JUDGER_INTERACTOR_H
+
+#include "runner.h"
+
+// the program and "<interactor_path> <input_path> <output_path> <answer_path>", each one forked into a sandbox of
+// its own, with the stdout of each one piped into the stdin of the other. The interactor decides with its exit
+// code like a checker, the limits of the program are still checked first; its usage goes to _result->interactor.
+// With a checker_path, the checker runs on what the interactor wrote to output_path
+void run_interactive(struct logger *log_fp, struct config *_config, struct result *_result);
+
+#endif //JUDGER_INTERACTOR_H
@@ -0,0 +1,349 @@
+#define _POSIX_SOURCE
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <ctype.h>
+
+#include "json.h"
+
+// max nesting of arrays and objects, configs are flat so this is plenty
+#define JSON_MAX_DEPTH 32
+
+
+struct json_parser {
+    const char *cursor;
+    int depth;
+};
+
+
+static int parse_value(struct json_parser *parser, struct json_value *value);
+
+
+static void skip_whitespace(struct json_parser *parser) {
+    while (*parser->cursor == ' ' || *parser->cursor == '\t' ||
+           *parser->cursor == '\n' || *parser->cursor == '\r') {
+        parser->cursor++;
+    }
+}
+
+
+static void free_value(struct json_value *value) {
+    int i;
+    if (value->type == JSON_STRING) {
+        free(value->string);
+    }
+    else if (value->type == JSON_ARRAY || value->type == JSON_OBJECT) {
+        for (i = 0; i < value->length; i++) {
+            if (value->keys != NULL) {
+                free(value->keys[i]);
+            }
+            free_value(&value->items[i]);
+        }
+        free(value->keys);
+        free(value->items);
+    }
+    value->type = JSON_NULL;
+}
+
+
+static int append_utf8(char *output, unsigned int code_point) {
+    if (code_point < 0x80) {
+        output[0] = (char) code_point;
+        return 1;
+    }
+    if (code_point < 0x800) {
+        output[0] = (char) (0xc0 | (code_point >> 6));
+        output[1] = (char) (0x80 | (code_point & 0x3f));
+        return 2;
+    }
+    if (code_point < 0x10000) {
+        output[0] = (char) (0xe0 | (code_point >> 12));
+        output[1] = (char) (0x80 | ((code_point >> 6) & 0x3f));
+        output[2] = (char) (0x80 | (code_point & 0x3f));
+        return 3;
+    }
+    output[0] = (char) (0xf0 | (code_point >> 18));
+    output[1] = (char) (0x80 | ((code_point >> 12) & 0x3f));
+    output[2] = (char) (0x80 | ((code_point >> 6) & 0x3f));
+    output[3] = (char) (0x80 | (code_point & 0x3f));
+    return 4;
+}
+
+
+static int parse_hex4(const char *cursor, unsigned int *code_point) {
+    int i;
+    *code_point = 0;
+    for (i = 0; i < 4; i++) {
+        char c = cursor[i];
+        *code_point <<= 4;
+        if (c >= '0' && c <= '9') {
+            *code_point |= (unsigned int) (c - '0');
+        }
+        else if (c >= 'a' && c <= 'f') {
+            *code_point |= (unsigned int) (c - 'a' + 10);
+        }
+        else if (c >= 'A' && c <= 'F') {
+            *code_point |= (unsigned int) (c - 'A' + 10);
+        }
+        else {
+            return -1;
+        }
+    }
+    return 0;
+}
+
+
+static char *parse_string(struct json_parser *parser) {
+    const char *end = parser->cursor + 1;
+    // the decoded string is never longer than the encoded one
+    while (*end != '"') {
+        if (*end == '\0') {
+            return NULL;
+        }
+        if (*end == '\\' && *(end + 1) != '\0') {
+            end++;
+        }
+        end++;
+    }
+    char *string = malloc((size_t) (end - parser->cursor));
+    if (string == NULL) {
+        return NULL;
+    }
+
+    char *output = string;
+    const char *cursor = parser->cursor + 1;
+    while (cursor < end) {
+        if (*cursor != '\\') {
+            if ((unsigned char) *cursor < 0x20) {
+                goto error;
+            }
+            *output++ = *cursor++;
+            continue;
+        }
+        cursor++;
+        switch (*cursor) {
+            case '"': *output++ = '"'; break;
+            case '\\': *output++ = '\\'; break;
+            case '/': *output++ = '/'; break;
+            case 'b': *output++ = '\b'; break;
+            case 'f': *output++ = '\f'; break;
+            case 'n': *output++ = '\n'; break;
+            case 'r': *output++ = '\r'; break;
+            case 't': *output++ = '\t'; break;
+            case 'u': {
+                unsigned int code_point, low;
+                if (end - cursor < 5 || parse_hex4(cursor + 1, &code_point) != 0) {
+                    goto error;
+                }
+                cursor += 4;
+                // surrogate pair
+                if (code_point >= 0xd800 && code_point <= 0xdbff) {
+                    if (end - cursor < 7 || cursor[1] != '\\' || cursor[2] != 'u' ||
+                        parse_hex4(cursor + 3, &low) != 0 || low < 0xdc00 || low > 0xdfff) {
+                        goto error;
+                    }
+                    code_point = 0x10000 + ((code_point - 0xd800) << 10) + (low - 0xdc00);
+                    cursor += 6;
+                }
+                // \u0000 would silently truncate the string, reject it
+                if (code_point == 0) {
+                    goto error;
+                }
+                output += append_utf8(output, code_point);
+                break;
+            }
+            default:
+                goto error;
+        }
+        cursor++;
+    }
+    *output = '\0';
+    parser->cursor = end + 1;
+    return string;
+
+    error:
+    free(string);
+    return NULL;
+}
+
+
+static int append_item(struct json_value *container, struct json_value *item, char *key) {
+    struct json_value *items = realloc(container->items, sizeof(struct json_value) * (container->length + 1));
+    if (items == NULL) {
+        return -1;
+    }
+    container->items = items;
+    if (container->type == JSON_OBJECT) {
+        char **keys = realloc(container->keys, sizeof(char *) * (container->length + 1));
+        if (keys == NULL) {
+            return -1;
+        }
+        container->keys = keys;
+        container->keys[container->length] = key;
+    }
+    container->items[container->length++] = *item;
+    return 0;
+}
+
+
+static int parse_container(struct json_parser *parser, struct json_value *value, char close) {
+    value->type = close == '}' ? JSON_OBJECT : JSON_ARRAY;
+    if (++parser->depth > JSON_MAX_DEPTH) {
+        return -1;
+    }
+    parser->cursor++;
+    skip_whitespace(parser);
+    if (*parser->cursor == close) {
+        parser->cursor++;
+        parser->depth--;
+        return 0;
+    }
+    while (1) {
+        char *key = NULL;
+        struct json_value item = {JSON_NULL, 0, NULL, NULL, NULL, 0};
+
+        skip_whitespace(parser);
+        if (value->type == JSON_OBJECT) {
+            if (*parser->cursor != '"' || (key = parse_string(parser)) == NULL) {
+                return -1;
+            }
+            skip_whitespace(parser);
+            if (*parser->cursor != ':') {
+                free(key);
+                return -1;
+            }
+            parser->cursor++;
+        }
+        if (parse_value(parser, &item) != 0 || append_item(value, &item, key) != 0) {
+            free(key);
+            free_value(&item);
+            return -1;
+        }
+        skip_whitespace(parser);
+        if (*parser->cursor == ',') {
+            parser->cursor++;
+        }
+        else if (*parser->cursor == close) {
+            parser->cursor++;
+            parser->depth--;
+            return 0;
+        }
+        else {
+            return -1;
+        }
+    }
+}
+
+
+static int parse_value(struct json_parser *parser, struct json_value *value) {
+    skip_whitespace(parser);
+    switch (*parser->cursor) {
+        case '{':
+            return parse_container(parser, value, '}');
+        case '[':
+            return parse_container(parser, value, ']');
+        case '"':
+            value->string = parse_string(parser);
+            if (value->string == NULL) {
+                return -1;
+            }
+            value->type = JSON_STRING;
+            return 0;
+        case 't':
+            if (strncmp(parser->cursor, "true", 4) != 0) {
+                return -1;
+            }
+            parser->cursor += 4;
+            value->type = JSON_BOOL;
+            value->number = 1;
+            return 0;
+        case 'f':
+            if (strncmp(parser->cursor, "false", 5) != 0) {
+                return -1;
+            }
+            parser->cursor += 5;
+            value->type = JSON_BOOL;
+            value->number = 0;
+            return 0;
+        case 'n':
+            if (strncmp(parser->cursor, "null", 4) != 0) {
+                return -1;
+            }
+            parser->cursor += 4;
+            value->type = JSON_NULL;
+            return 0;
+        default: {
+            char *end;
+            if (*parser->cursor != '-' && !isdigit((unsigned char) *parser->cursor)) {
+                return -1;
+            }
+            value->number = strtod(parser->cursor, &end);
+            if (end == parser->cursor) {
+                return -1;
+            }
+            parser->cursor = end;
+            value->type = JSON_NUMBER;
+            return 0;
+        }
+    }
+}
+
+
+struct json_value *json_parse(const char *text) {
+    struct json_parser parser = {text, 0};
+    struct json_value *value = calloc(1, sizeof(struct json_value));
+    if (value == NULL) {
+        return NULL;
+    }
+    if (parse_value(&parser, value) != 0) {
+        json_free(value);
+        return NULL;
+    }
+    skip_whitespace(&parser);
+    // trailing garbage
+    if (*parser.cursor != '\0') {
+        json_free(value);
+        return NULL;
+    }
+    return value;
+}
+
+
+void json_free(struct json_value *value) {
+    if (value != NULL) {
+        free_value(value);
+        free(value);
+    }
+}
+
+
+struct json_value *json_object_get(const struct json_value *object, const char *key) {
+    int i;
+    if (object == NULL || object->type != JSON_OBJECT) {
+        return NULL;
+    }
+    for (i = 0; i < object->length; i++) {
+        if (strcmp(object->keys[i], key) == 0) {
+            return &object->items[i];
+        }
+    }
+    return NULL;
+}
+
+
+void json_print_string(FILE *fp, const char *string) {
+    const unsigned char *c;
+    fputc('"', fp);
+    for (c = (const unsigned char *) string; *c != '\0'; c++) {
+        if (*c == '"' || *c == '\\') {
+            fprintf(fp, "\\%c", *c);
+        }
+        else if (*c < 0x20) {
+            fprintf(fp, "\\u%04x", *c);
+        }
+        else {
+            fputc(*c, fp);
+        }
+    }
+    fputc('"', fp);
+}
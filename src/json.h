@@ -0,0 +1,37 @@
+#ifndef JUDGER_JSON_H
+#define JUDGER_JSON_H
+
+#include <stdio.h>
+
+enum json_type {
+    JSON_NULL = 0,
+    JSON_BOOL,
+    JSON_NUMBER,
+    JSON_STRING,
+    JSON_ARRAY,
+    JSON_OBJECT
+};
+
+
+struct json_value {
+    enum json_type type;
+    // JSON_BOOL and JSON_NUMBER
+    double number;
+    // JSON_STRING
+    char *string;
+    // JSON_ARRAY and JSON_OBJECT, keys is only used by objects
+    char **keys;
+    struct json_value *items;
+    int length;
+};
+
+
+struct json_value *json_parse(const char *text);
+
+void json_free(struct json_value *value);
+
+struct json_value *json_object_get(const struct json_value *object, const char *key);
+
+void json_print_string(FILE *fp, const char *string);
+
+#endif //JUDGER_JSON_H
@@ -1,9 +1,20 @@
-#define _POSIX_SOURCE
-#include <pthread.h>
-#include <unistd.h>
+#define _GNU_SOURCE
+#include <errno.h>
+#include <fcntl.h>
+#include <poll.h>
+#include <stdio.h>
 #include <signal.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/syscall.h>
+#include <sys/wait.h>
 
 #include "killer.h"
+#include "definitions.h"
+#include "cgroup.h"
+
+// a process that exits without a pidfd is noticed within this many milliseconds
+#define WATCHDOG_POLL_INTERVAL 1
 
 
 int kill_pid(pid_t pid) {
@@ -11,23 +22,299 @@ int kill_pid(pid_t pid) {
 }
 
 
-void *timeout_killer(void *timeout_killer_args) {
-    // this is a new thread, kill the process if timeout
-    pid_t pid = ((struct timeout_killer_args *)timeout_killer_args)->pid;
-    int timeout = ((struct timeout_killer_args *)timeout_killer_args)->timeout;
-    // On success, pthread_detach() returns 0; on error, it returns an error number.
-    if (pthread_detach(pthread_self()) != 0) {
-        kill_pid(pid);
-        return NULL;
+long long monotonic_ns(void) {
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return (long long) now.tv_sec * 1000000000LL + now.tv_nsec;
+}
+
+
+void watchdog_init(struct watchdog *_watchdog, pid_t pid, int timeout, int cpu_timeout) {
+    _watchdog->pid = pid;
+    _watchdog->timeout = timeout;
+    _watchdog->cpu_timeout = cpu_timeout;
+    _watchdog->timed_out = _watchdog->cpu_timed_out = 0;
+    // user + system time of all the threads, in nanoseconds, without needing /proc in the jail
+    _watchdog->has_cpu_clock = cpu_timeout != UNLIMITED && clock_getcpuclockid(pid, &_watchdog->cpu_clock) == 0;
+    _watchdog->cpu_stat_fd = -1;
+    _watchdog->sample_interval = 0;
+    _watchdog->memory_current_fd = _watchdog->statm_fd = -1;
+    _watchdog->sample_result = NULL;
+#ifdef SYS_pidfd_open
+    _watchdog->pidfd = (int) syscall(SYS_pidfd_open, pid, 0);
+#else
+    _watchdog->pidfd = -1;
+#endif
+    watchdog_restart(_watchdog);
+}
+
+
+// the real time limit counts from now on, e.g. once the program is executed
+void watchdog_restart(struct watchdog *_watchdog) {
+    watchdog_restart_at(_watchdog, monotonic_ns());
+}
+
+
+// the real time limit counts from start, a monotonic_ns() time that may be in the past
+void watchdog_restart_at(struct watchdog *_watchdog, long long start) {
+    if (_watchdog->timeout != UNLIMITED) {
+        start += (long long) _watchdog->timeout * 1000000;
+    }
+    _watchdog->deadline.tv_sec = (time_t) (start / 1000000000);
+    _watchdog->deadline.tv_nsec = (long) (start % 1000000000);
+}
+
+
+int watchdog_killed(const struct watchdog *_watchdog) {
+    return _watchdog->timed_out || _watchdog->cpu_timed_out;
+}
+
+
+// user + system time of the process (or of its cgroup) in nanoseconds, -1 when it can not be read
+static long long watchdog_cpu_time(struct watchdog *_watchdog) {
+    struct timespec now;
+    long long cpu_time = -1;
+
+    if (_watchdog->cpu_stat_fd >= 0) {
+        cpu_time = cgroup_cpu_time(_watchdog->cpu_stat_fd);
+        cpu_time = cpu_time < 0 ? -1 : cpu_time * 1000;
+    }
+    // a process that already exited has no clock any more, its rusage tells the rest
+    else if (_watchdog->has_cpu_clock && clock_gettime(_watchdog->cpu_clock, &now) == 0) {
+        cpu_time = (long long) now.tv_sec * 1000000000LL + now.tv_nsec;
+    }
+    return cpu_time;
+}
+
+
+// resident memory of the process (or memory of its cgroup) in bytes, -1 when it can not be read
+static long watchdog_memory(struct watchdog *_watchdog) {
+    char buffer[128];
+    long size, resident;
+    ssize_t length;
+
+    if (_watchdog->memory_current_fd >= 0) {
+        return (long) cgroup_memory(_watchdog->memory_current_fd);
+    }
+    if (_watchdog->statm_fd < 0 || (length = pread(_watchdog->statm_fd, buffer, sizeof(buffer) - 1, 0)) <= 0) {
+        return -1;
+    }
+    buffer[length] = '\0';
+    // an exited process that is not reaped yet has no memory left to show
+    if (sscanf(buffer, "%ld %ld", &size, &resident) != 2 || size == 0) {
+        return -1;
+    }
+    return resident * sysconf(_SC_PAGESIZE);
+}
+
+
+// from now on the cpu time and memory of the process are added to the samples of _result every sample_interval ms
+void watchdog_sample(struct watchdog *_watchdog, int sample_interval, struct result *_result) {
+    char path[64];
+
+    _watchdog->sample_interval = sample_interval;
+    _watchdog->sample_result = _result;
+    _watchdog->sample_start = _watchdog->next_sample = monotonic_ns();
+    if (!_watchdog->has_cpu_clock) {
+        _watchdog->has_cpu_clock = clock_getcpuclockid(_watchdog->pid, &_watchdog->cpu_clock) == 0;
+    }
+    // the judger may be jailed without /proc, then only a cgroup tells the memory
+    if (_watchdog->memory_current_fd < 0) {
+        snprintf(path, sizeof(path), "/proc/%d/statm", (int) _watchdog->pid);
+        _watchdog->statm_fd = open(path, O_RDONLY | O_CLOEXEC);
+    }
+}
+
+
+// takes the samples that are due, returns how many milliseconds until the next one
+static int watchdog_take_samples(struct watchdog *_watchdog) {
+    struct result *_result = _watchdog->sample_result;
+    struct sample *_sample;
+    long long now = monotonic_ns(), cpu_time;
+    int i;
+
+    if (now >= _watchdog->next_sample) {
+        // keep every other sample at twice the interval, so the series covers the whole run
+        if (_result->sample_count == SAMPLES_MAX_NUMBER) {
+            for (i = 0; i < SAMPLES_MAX_NUMBER / 2; i++) {
+                _result->samples[i] = _result->samples[i * 2];
+            }
+            _result->sample_count = SAMPLES_MAX_NUMBER / 2;
+            _watchdog->sample_interval *= 2;
+        }
+        _sample = &_result->samples[_result->sample_count++];
+        _sample->time = (int) ((now - _watchdog->sample_start) / 1000000);
+        cpu_time = watchdog_cpu_time(_watchdog);
+        _sample->cpu_time = cpu_time < 0 ? -1 : (int) (cpu_time / 1000000);
+        _sample->memory = watchdog_memory(_watchdog);
+
+        _watchdog->next_sample += (long long) _watchdog->sample_interval * 1000000LL;
+        if (_watchdog->next_sample <= now) {
+            _watchdog->next_sample = now + (long long) _watchdog->sample_interval * 1000000LL;
+        }
+    }
+    return (int) ((_watchdog->next_sample - now + 999999) / 1000000);
+}
+
+
+// kills the process when it is over a limit, returns how many milliseconds to wait before the next check;
+// UNLIMITED when there is nothing to check (any more)
+static int watchdog_check_limits(struct watchdog *_watchdog) {
+    struct timespec now;
+    long long remaining, cpu_time;
+    int wait_time = UNLIMITED;
+
+    if (watchdog_killed(_watchdog)) {
+        return UNLIMITED;
+    }
+    if (_watchdog->timeout != UNLIMITED) {
+        clock_gettime(CLOCK_MONOTONIC, &now);
+        remaining = (long long) (_watchdog->deadline.tv_sec - now.tv_sec) * 1000000000LL +
+                    (_watchdog->deadline.tv_nsec - now.tv_nsec);
+        if (remaining <= 0) {
+            // kill once, the caller goes on waiting for the exit without a deadline
+            _watchdog->timed_out = 1;
+            kill_pid(_watchdog->pid);
+            return 0;
+        }
+        wait_time = (int) ((remaining + 999999) / 1000000);
     }
-    // usleep can't be used, for time args must < 1000ms
-    // this may sleep longer that expected, but we will have a check at the end
-    if (sleep((unsigned int)((timeout + 1000) / 1000)) != 0) {
-        kill_pid(pid);
-        return NULL;
+    if (_watchdog->cpu_timeout == UNLIMITED) {
+        return wait_time;
     }
-    if (kill_pid(pid) != 0) {
-        return NULL;
+    if ((cpu_time = watchdog_cpu_time(_watchdog)) >= 0) {
+        remaining = (long long) _watchdog->cpu_timeout * 1000000LL - cpu_time;
+        if (remaining <= 0) {
+            _watchdog->cpu_timed_out = 1;
+            kill_pid(_watchdog->pid);
+            return 0;
+        }
+        // several threads use cpu time faster than the clock on the wall goes
+        remaining = (remaining + 999999) / 1000000;
+        if (remaining > WATCHDOG_CPU_INTERVAL) {
+            remaining = WATCHDOG_CPU_INTERVAL;
+        }
+        if (wait_time == UNLIMITED || remaining < wait_time) {
+            wait_time = (int) remaining;
+        }
     }
-    return NULL;
-}
\ No newline at end of file
+    return wait_time;
+}
+
+
+// watchdog_check_limits(), and the samples that are due
+int watchdog_check(struct watchdog *_watchdog) {
+    int wait_time = watchdog_check_limits(_watchdog), sample_time;
+    if (_watchdog->sample_interval <= 0 || watchdog_killed(_watchdog)) {
+        return wait_time;
+    }
+    sample_time = watchdog_take_samples(_watchdog);
+    return wait_time == UNLIMITED || sample_time < wait_time ? sample_time : wait_time;
+}
+
+
+// returns once the process has exited (it is not reaped), killing it when it is over a limit
+int watchdog_wait(struct watchdog *_watchdog) {
+    while (1) {
+        int remaining = watchdog_check(_watchdog);
+        if (_watchdog->pidfd >= 0) {
+            struct pollfd pidfd = {_watchdog->pidfd, POLLIN, 0};
+            int count = poll(&pidfd, 1, remaining);
+            if (count > 0) {
+                return 0;
+            }
+            if (count < 0 && errno != EINTR) {
+                return -1;
+            }
+        }
+        else {
+            siginfo_t info;
+            struct timespec interval = {0, WATCHDOG_POLL_INTERVAL * 1000000};
+            info.si_pid = 0;
+            if (waitid(P_PID, _watchdog->pid, &info, WEXITED | WNOHANG | WNOWAIT) != 0) {
+                return -1;
+            }
+            if (info.si_pid != 0) {
+                return 0;
+            }
+            nanosleep(&interval, NULL);
+        }
+    }
+}
+
+
+// watchdog_wait() for several processes at once, returns the index of one that has exited (it is not reaped), -1 on error
+int watchdog_wait_any(struct watchdog **watchdogs, int count) {
+    struct pollfd pidfds[count];
+    siginfo_t info;
+    int i, remaining, wait_time, ready;
+
+    while (1) {
+        wait_time = UNLIMITED;
+        for (i = 0; i < count; i++) {
+            remaining = watchdog_check(watchdogs[i]);
+            if (remaining != UNLIMITED && (wait_time == UNLIMITED || remaining < wait_time)) {
+                wait_time = remaining;
+            }
+            // poll() skips a negative fd, such a process is polled with waitid instead
+            pidfds[i].fd = watchdogs[i]->pidfd;
+            pidfds[i].events = POLLIN;
+            pidfds[i].revents = 0;
+            if (watchdogs[i]->pidfd < 0) {
+                info.si_pid = 0;
+                if (waitid(P_PID, watchdogs[i]->pid, &info, WEXITED | WNOHANG | WNOWAIT) != 0) {
+                    return -1;
+                }
+                if (info.si_pid != 0) {
+                    return i;
+                }
+                if (wait_time == UNLIMITED || wait_time > WATCHDOG_POLL_INTERVAL) {
+                    wait_time = WATCHDOG_POLL_INTERVAL;
+                }
+            }
+        }
+        ready = poll(pidfds, count, wait_time);
+        if (ready < 0 && errno != EINTR) {
+            return -1;
+        }
+        for (i = 0; i < count && ready > 0; i++) {
+            if (pidfds[i].revents != 0) {
+                return i;
+            }
+        }
+    }
+}
+
+
+// waits for fd to become readable, returns 0 when the process was killed for a limit instead
+int watchdog_wait_fd(struct watchdog *_watchdog, int fd) {
+    if (watchdog_killed(_watchdog)) {
+        return 0;
+    }
+    while (1) {
+        struct pollfd readable = {fd, POLLIN, 0};
+        int remaining = watchdog_check(_watchdog);
+        if (watchdog_killed(_watchdog)) {
+            return 0;
+        }
+        int count = poll(&readable, 1, remaining);
+        if (count > 0) {
+            return 1;
+        }
+        if (count < 0 && errno != EINTR) {
+            return -1;
+        }
+    }
+}
+
+
+void watchdog_close(struct watchdog *_watchdog) {
+    if (_watchdog->pidfd >= 0) {
+        close(_watchdog->pidfd);
+        _watchdog->pidfd = -1;
+    }
+    if (_watchdog->statm_fd >= 0) {
+        close(_watchdog->statm_fd);
+        _watchdog->statm_fd = -1;
+    }
+}
@@ -1,13 +1,61 @@
 #ifndef JUDGER_KILLER_H
 #define JUDGER_KILLER_H
 
-struct timeout_killer_args {
-    int pid;
+#include <sys/types.h>
+#include <time.h>
+#include "definitions.h"
+
+// the cpu time of a process is sampled this often (in milliseconds) while it runs
+#define WATCHDOG_CPU_INTERVAL 10
+
+// kills a process once it has run longer than timeout, or used more than cpu_timeout, milliseconds
+struct watchdog {
+    pid_t pid;
+    // -1 when the kernel has no pidfd_open, the exit is polled instead
+    int pidfd;
+    // UNLIMITED when there is no limit
     int timeout;
+    int cpu_timeout;
+    struct timespec deadline;
+    clockid_t cpu_clock;
+    int has_cpu_clock;
+    // cpu.stat of the cgroup of the run, it counts the whole process tree; -1 to use cpu_clock
+    int cpu_stat_fd;
+    int timed_out;
+    int cpu_timed_out;
+    // 0 unless watchdog_sample() was called, doubled each time the samples of the result are thinned out
+    int sample_interval;
+    // memory.current of the cgroup of the run, -1 to read /proc/<pid>/statm
+    int memory_current_fd;
+    int statm_fd;
+    long long sample_start;
+    long long next_sample;
+    struct result *sample_result;
 };
 
 int kill_pid(pid_t pid);
 
-void *timeout_killer(void *timeout_killer_args);
+// CLOCK_MONOTONIC in nanoseconds, the same clock in the judger and in its children
+long long monotonic_ns(void);
+
+void watchdog_init(struct watchdog *_watchdog, pid_t pid, int timeout, int cpu_timeout);
+
+void watchdog_restart(struct watchdog *_watchdog);
+
+void watchdog_restart_at(struct watchdog *_watchdog, long long start);
+
+void watchdog_sample(struct watchdog *_watchdog, int sample_interval, struct result *_result);
+
+int watchdog_check(struct watchdog *_watchdog);
+
+int watchdog_killed(const struct watchdog *_watchdog);
+
+int watchdog_wait(struct watchdog *_watchdog);
+
+int watchdog_wait_any(struct watchdog **watchdogs, int count);
+
+int watchdog_wait_fd(struct watchdog *_watchdog, int fd);
+
+void watchdog_close(struct watchdog *_watchdog);
 
 #endif //JUDGER_KILLER_H
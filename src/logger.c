@@ -1,66 +1,200 @@
-#define _POSIX_SOURCE
+#define _GNU_SOURCE
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
 #include <time.h>
 #include <stdarg.h>
+#include <fcntl.h>
 #include <unistd.h>
 #include <sys/file.h>
+#include <sys/stat.h>
 
 #include "logger.h"
 
-#define log_buffer_size 8192
+#define LOG_LINE_SIZE 4096
 
+static const char *LOG_LEVEL_NOTE[] = {"FATAL", "WARNING", "INFO", "DEBUG"};
 
-FILE *log_open(const char *filename) {
-    FILE *log_fp = fopen(filename, "a");
-    if (log_fp == NULL) {
-        fprintf(stderr, "can not open log file %s", filename);
+
+// NULL is the default level, -1 for unknown names
+int log_level_from_name(const char *name) {
+    int level;
+    if (name == NULL) {
+        return LOG_LEVEL_WARNING;
+    }
+    for (level = LOG_LEVEL_FATAL; level <= LOG_LEVEL_DEBUG; level++) {
+        if (strcasecmp(name, LOG_LEVEL_NOTE[level]) == 0) {
+            return level;
+        }
+    }
+    return -1;
+}
+
+
+int log_format_from_name(const char *name) {
+    if (name == NULL || strcmp(name, "text") == 0) {
+        return LOG_FORMAT_TEXT;
+    }
+    if (strcmp(name, "json") == 0) {
+        return LOG_FORMAT_JSON;
     }
+    return -1;
+}
+
+
+static int open_file(const char *path) {
+    return open(path, O_WRONLY | O_APPEND | O_CREAT | O_CLOEXEC, 0644);
+}
+
+
+struct logger *log_open(const struct config *_config) {
+    struct logger *log_fp = malloc(sizeof(struct logger));
+    if (log_fp == NULL || strlen(_config->log_path) >= sizeof(log_fp->path) ||
+        (log_fp->fd = open_file(_config->log_path)) < 0) {
+        fprintf(stderr, "can not open log file %s", _config->log_path);
+        free(log_fp);
+        return NULL;
+    }
+    strcpy(log_fp->path, _config->log_path);
+    log_fp->level = _config->log_level;
+    log_fp->format = _config->log_format;
+    log_fp->max_size = _config->log_max_size;
+    log_fp->unbuffered = 0;
+    log_fp->datetime_second = -1;
+    log_fp->length = 0;
     return log_fp;
 }
 
 
-void log_close(FILE *log_fp) {
+// workers write their logs independently, only renaming the files is done under flock
+static void log_rotate(struct logger *log_fp) {
+    struct stat opened, current;
+    char from[PATH_MAX + 16], to[PATH_MAX + 16];
+    int i, fd;
+
+    if (flock(log_fp->fd, LOCK_EX) != 0) {
+        return;
+    }
+    // another process may have rotated it meanwhile, then the path is a new file already
+    if (fstat(log_fp->fd, &opened) == 0 && stat(log_fp->path, &current) == 0 &&
+        opened.st_dev == current.st_dev && opened.st_ino == current.st_ino && opened.st_size >= log_fp->max_size) {
+        for (i = LOG_ROTATE_COUNT - 1; i > 0; i--) {
+            snprintf(from, sizeof(from), "%s.%d", log_fp->path, i);
+            snprintf(to, sizeof(to), "%s.%d", log_fp->path, i + 1);
+            rename(from, to);
+        }
+        snprintf(to, sizeof(to), "%s.1", log_fp->path);
+        rename(log_fp->path, to);
+    }
+    flock(log_fp->fd, LOCK_UN);
+
+    if ((fd = open_file(log_fp->path)) >= 0) {
+        close(log_fp->fd);
+        log_fp->fd = fd;
+    }
+}
+
+
+// one write of everything buffered, O_APPEND keeps the lines of concurrent runs apart.
+// the child writes to the same file, so the size is checked even when there was nothing to write
+void log_flush(struct logger *log_fp) {
+    struct stat file;
+    if (log_fp == NULL) {
+        return;
+    }
+    if (log_fp->length > 0 && write(log_fp->fd, log_fp->buffer, log_fp->length) < 0) {
+        fprintf(stderr, "write error");
+    }
+    log_fp->length = 0;
+    if (log_fp->max_size != UNLIMITED && fstat(log_fp->fd, &file) == 0 && file.st_size >= log_fp->max_size) {
+        log_rotate(log_fp);
+    }
+}
+
+
+// the child has a copy of what the parent buffered, the parent writes that itself.
+// the child may be jailed, the path means something else there, so it never rotates
+void log_forked(struct logger *log_fp) {
     if (log_fp != NULL) {
-        fclose(log_fp);
+        log_fp->length = 0;
+        log_fp->unbuffered = 1;
+        log_fp->max_size = UNLIMITED;
     }
 }
 
 
-void log_write(int level, const char *source_filename, const int line, const FILE *log_fp, const char *fmt, ...) {
-    char LOG_LEVEL_NOTE[][10] = {"FATAL", "WARNING", "INFO", "DEBUG"};
+void log_close(struct logger *log_fp) {
+    if (log_fp != NULL) {
+        log_flush(log_fp);
+        close(log_fp->fd);
+        free(log_fp);
+    }
+}
+
+
+static size_t json_escape(char *target, size_t size, const char *source) {
+    size_t length = 0;
+    for (; *source != '\0' && length + 7 < size; source++) {
+        unsigned char c = (unsigned char) *source;
+        if (c == '"' || c == '\\') {
+            target[length++] = '\\';
+            target[length++] = (char) c;
+        }
+        else if (c < 0x20) {
+            length += snprintf(target + length, size - length, "\\u%04x", c);
+        }
+        else {
+            target[length++] = (char) c;
+        }
+    }
+    target[length] = '\0';
+    return length;
+}
+
+
+void log_write(int level, const char *source_filename, const int line, struct logger *log_fp, const char *fmt, ...) {
     if (log_fp == NULL) {
         fprintf(stderr, "can not open log file");
         return;
     }
-    static char buffer[log_buffer_size];
-    static char log_buffer[log_buffer_size];
-    static char datetime[100];
-    static char line_str[20];
-    static time_t now;
-    now = time(NULL);
+    char message[LOG_LINE_SIZE];
+    char escaped[LOG_LINE_SIZE];
+    char buffer[LOG_LINE_SIZE + 256];
+    struct tm now_tm;
+    time_t now = time(NULL);
+    int count;
 
-    strftime(datetime, 99, "%Y-%m-%d %H:%M:%S", localtime(&now));
-    snprintf(line_str, 19, "%d", line);
+    if (now != log_fp->datetime_second) {
+        strftime(log_fp->datetime, sizeof(log_fp->datetime), "%Y-%m-%d %H:%M:%S", localtime_r(&now, &now_tm));
+        log_fp->datetime_second = now;
+    }
     va_list ap;
     va_start(ap, fmt);
-    vsnprintf(log_buffer, log_buffer_size, fmt, ap);
+    vsnprintf(message, sizeof(message), fmt, ap);
     va_end(ap);
 
-    int count = snprintf(buffer, log_buffer_size,
-                         "%s [%s] [%s:%s]%s\n",
-                         LOG_LEVEL_NOTE[level], datetime, source_filename, line_str, log_buffer);
-    // fprintf(stderr, "%s", buffer);
-    int log_fd = fileno((FILE *) log_fp);
-    if (flock(log_fd, LOCK_EX) == 0) {
-        if (write(log_fd, buffer, (size_t) count) < 0) {
-            fprintf(stderr, "write error");
-            return;
-        }
-        flock(log_fd, LOCK_UN);
+    if (log_fp->format == LOG_FORMAT_JSON) {
+        json_escape(escaped, sizeof(escaped), message);
+        count = snprintf(buffer, sizeof(buffer),
+                         "{\"time\": \"%s\", \"level\": \"%s\", \"pid\": %d, \"file\": \"%s\", \"line\": %d, "
+                         "\"message\": \"%s\"}\n",
+                         log_fp->datetime, LOG_LEVEL_NOTE[level], (int) getpid(), source_filename, line, escaped);
     }
     else {
-        fprintf(stderr, "flock error");
-        return;
+        count = snprintf(buffer, sizeof(buffer), "%s [%s] [%s:%d]%s\n",
+                         LOG_LEVEL_NOTE[level], log_fp->datetime, source_filename, line, message);
+    }
+    if (count >= (int) sizeof(buffer)) {
+        count = sizeof(buffer) - 1;
+        buffer[count - 1] = '\n';
+    }
+
+    if (log_fp->length + count > sizeof(log_fp->buffer)) {
+        log_flush(log_fp);
+    }
+    memcpy(log_fp->buffer + log_fp->length, buffer, (size_t) count);
+    log_fp->length += count;
+    if (log_fp->unbuffered) {
+        log_flush(log_fp);
     }
-}
\ No newline at end of file
+}
@@ -1,27 +1,68 @@
 #ifndef JUDGER_LOGGER_H
 #define JUDGER_LOGGER_H
 
+#include <stddef.h>
+#include <time.h>
+#include <linux/limits.h>
+#include "definitions.h"
+
 #define LOG_LEVEL_FATAL 0
 #define LOG_LEVEL_WARNING 1
 #define LOG_LEVEL_INFO 2
 #define LOG_LEVEL_DEBUG 3
 
+#define LOG_FORMAT_TEXT 0
+#define LOG_FORMAT_JSON 1
+
+// the lines of a run are kept here and written at once, a longer log is written in several parts
+#define LOG_BUFFER_SIZE 8192
+// a rotated log keeps this many old files, <log_path>.1 being the newest
+#define LOG_ROTATE_COUNT 3
+
+// the log of one run (or one batch), it is not shared between threads
+struct logger {
+    int fd;
+    int level;
+    int format;
+    // rotate once the file is this big (bytes), UNLIMITED to let it grow
+    long max_size;
+    // in the child after fork, every line is written right away and nothing the parent buffered is repeated
+    int unbuffered;
+    char path[PATH_MAX];
+    // the time of the lines, formatted again once a second
+    time_t datetime_second;
+    char datetime[32];
+    size_t length;
+    char buffer[LOG_BUFFER_SIZE];
+};
+
+
+int log_level_from_name(const char *name);
+
+int log_format_from_name(const char *name);
+
+struct logger *log_open(const struct config *_config);
+
+void log_forked(struct logger *log_fp);
 
-FILE *log_open(const char *);
+void log_flush(struct logger *log_fp);
 
-void log_close(FILE *);
+void log_close(struct logger *log_fp);
 
-void log_write(int level, const char *source_filename, const int line_number, const FILE *log_fp, const char *, ...);
+void log_write(int level, const char *source_filename, const int line_number, struct logger *log_fp, const char *, ...)
+        __attribute__((format(printf, 5, 6)));
 
-#define JUDGER_DEBUG
-#ifdef JUDGER_DEBUG
-#define LOG_DEBUG(log_fp, x...)   log_write(LOG_LEVEL_DEBUG, __FILE__, __LINE__, log_fp, ##x)
-#else
-#define LOG_DEBUG(log_fp, x...)
-#endif
+// the arguments are not even evaluated for a level that is off
+#define LOG_LEVEL(log_level, log_fp, x...) \
+    do { \
+        if ((log_fp) == NULL || (log_level) <= (log_fp)->level) { \
+            log_write(log_level, __FILE__, __LINE__, log_fp, ##x); \
+        } \
+    } while (0)
 
-#define LOG_INFO(log_fp, x...)  log_write(LOG_LEVEL_INFO, __FILE__, __LINE__, log_fp, ##x)
-#define LOG_WARNING(log_fp, x...) log_write(LOG_LEVEL_WARNING, __FILE__, __LINE__, log_fp, ##x)
-#define LOG_FATAL(log_fp, x...)   log_write(LOG_LEVEL_FATAL, __FILE__, __LINE__, log_fp, ##x)
+#define LOG_DEBUG(log_fp, x...)   LOG_LEVEL(LOG_LEVEL_DEBUG, log_fp, ##x)
+#define LOG_INFO(log_fp, x...)    LOG_LEVEL(LOG_LEVEL_INFO, log_fp, ##x)
+#define LOG_WARNING(log_fp, x...) LOG_LEVEL(LOG_LEVEL_WARNING, log_fp, ##x)
+#define LOG_FATAL(log_fp, x...)   LOG_LEVEL(LOG_LEVEL_FATAL, log_fp, ##x)
 
 #endif //JUDGER_LOGGER_H
@@ -3,23 +3,36 @@
 
 #include "argtable3.h"
 #include "runner.h"
+#include "server.h"
+#include "supervisor.h"
+#include "comparator.h"
+#include "cgroup.h"
+#include "logger.h"
+#include "rules/seccomp_rules.h"
 #include <string.h>
 #include <unistd.h>
 #include <errno.h>
+#include <fcntl.h>
 
 #define INT_PLACE_HOLDER "<n>"
 #define STR_PLACE_HOLDER "<str>"
 
-struct arg_lit *verb, *help, *version;
-struct arg_int *max_cpu_time, *max_real_time, *max_memory, *max_stack, *memory_limit_check_only,
-        *max_process_number, *max_output_size, *uid, *gid;
-struct arg_str *exe_path, *input_path, *output_path, *error_path, *args, *env, *log_path, *chroot_path, *seccomp_rule_name;
+struct arg_lit *verb, *help, *version, *serve;
+struct arg_int *max_cpu_time, *max_real_time, *max_memory, *max_stack, *memory_limit_check_only, *output_pipe,
+        *cpu_core, *zygote, *source_fd, *input_fd, *checker_persistent, *interactor_max_cpu_time, *interactor_max_memory, *sample_interval, *log_max_size, *supervise, *max_process_number, *max_output_size, *uid, *gid, *stop_on_failure;
+struct arg_str *exe_path, *input_path, *output_path, *error_path, *args, *env, *log_path, *chroot_path, *seccomp_rule_name,
+        *socket_path, *case_input, *case_output, *case_answer, *answer_path, *compare_mode, *checker_path, *interactor_path,
+        *cgroup_path, *seccomp_rule_file, *log_level, *log_format;
+struct arg_dbl *float_tolerance;
 struct arg_end *end;
 
 int main(int argc, char *argv[]) {
     void *arg_table[] = {
             help = arg_litn(NULL, "help", 0, 1, "Display This Help And Exit"),
             version = arg_litn(NULL, "version", 0, 1, "Display Version Info And Exit"),
+            serve = arg_litn(NULL, "serve", 0, 1, "Read JSON Configs Line By Line And Write One Result Per Line"),
+            socket_path = arg_strn(NULL, "socket_path", STR_PLACE_HOLDER, 0, 1, "Serve On This Unix Socket Instead Of Stdin"),
+            supervise = arg_intn(NULL, "supervise", INT_PLACE_HOLDER, 0, 1, "Serve Up To <n> Runs At Once From One Process, Each Result Written When Its Run Is Over With The \"id\" Of Its Request"),
             max_cpu_time = arg_intn(NULL, "max_cpu_time", INT_PLACE_HOLDER, 0, 1, "Max CPU Time (ms)"),
             max_real_time = arg_intn(NULL, "max_real_time", INT_PLACE_HOLDER, 0, 1, "Max Real Time (ms)"),
             max_memory = arg_intn(NULL, "max_memory", INT_PLACE_HOLDER, 0, 1, "Max Memory (byte)"),
@@ -27,18 +40,44 @@ int main(int argc, char *argv[]) {
             max_stack = arg_intn(NULL, "max_stack", INT_PLACE_HOLDER, 0, 1, "Max Stack (byte, default 16M)"),
             max_process_number = arg_intn(NULL, "max_process_number", INT_PLACE_HOLDER, 0, 1, "Max Process Number"),
             max_output_size = arg_intn(NULL, "max_output_size", INT_PLACE_HOLDER, 0, 1, "Max Output Size (byte)"),
+            cpu_core = arg_intn(NULL, "cpu_core", INT_PLACE_HOLDER, 0, 1, "Pin The Program To This CPU Core"),
 
-            exe_path = arg_str1(NULL, "exe_path", STR_PLACE_HOLDER, "Exe Path"),
+            exe_path = arg_strn(NULL, "exe_path", STR_PLACE_HOLDER, 0, 1, "Exe Path (required unless --serve)"),
             input_path = arg_strn(NULL, "input_path", STR_PLACE_HOLDER, 0, 1, "Input Path"),
+            input_fd = arg_intn(NULL, "input_fd", INT_PLACE_HOLDER, 0, 1, "Use This Inherited Fd As Stdin Instead Of Opening --input_path"),
             output_path = arg_strn(NULL, "output_path", STR_PLACE_HOLDER, 0, 1, "Output Path"),
             error_path = arg_strn(NULL, "error_path", STR_PLACE_HOLDER, 0, 1, "Error Path"),
 
+            answer_path = arg_strn(NULL, "answer_path", STR_PLACE_HOLDER, 0, 1, "Expected Output Path, Compared With The Output"),
+            compare_mode = arg_strn(NULL, "compare_mode", STR_PLACE_HOLDER, 0, 1, "exact, lines, tokens or floats (default exact)"),
+            float_tolerance = arg_dbln(NULL, "float_tolerance", "<x>", 0, 1, "Float Tolerance Of The floats Mode (default 1e-6)"),
+            checker_path = arg_strn(NULL, "checker_path", STR_PLACE_HOLDER, 0, 1, "Run \"<checker_path> <input_path> <output_path> <answer_path>\" In The Same Sandbox Instead Of Comparing, Exit Code 0 Is Accepted And 1 Or 2 Wrong Answer"),
+            checker_persistent = arg_intn(NULL, "checker_persistent", INT_PLACE_HOLDER, 0, 1, "Check All The Cases Of A Batch With One Checker Process, Sent The Three Paths Of Each Case On Stdin (default False)"),
+            interactor_path = arg_strn(NULL, "interactor_path", STR_PLACE_HOLDER, 0, 1, "Run \"<interactor_path> <input_path> <output_path> <answer_path>\" Next To The Program, The Stdout Of Each One Piped Into The Stdin Of The Other"),
+            interactor_max_cpu_time = arg_intn(NULL, "interactor_max_cpu_time", INT_PLACE_HOLDER, 0, 1, "Max CPU Time Of The Interactor (ms)"),
+            interactor_max_memory = arg_intn(NULL, "interactor_max_memory", INT_PLACE_HOLDER, 0, 1, "Max Memory Of The Interactor (byte)"),
+            output_pipe = arg_intn(NULL, "output_pipe", INT_PLACE_HOLDER, 0, 1, "compare stdout with --answer_path while it is written, stop the program at the first difference (default False)"),
+            zygote = arg_intn(NULL, "zygote", INT_PLACE_HOLDER, 0, 1, "fork \"--args=-c --args=<source>\" from a warm interpreter, for the cases of a batch or the requests of --serve (default False)"),
+            source_fd = arg_intn(NULL, "source_fd", INT_PLACE_HOLDER, 0, 1, "Run \"<exe_path> -c <source> <args>\" With The Source Read From This Inherited Fd"),
+
+            sample_interval = arg_intn(NULL, "sample_interval", INT_PLACE_HOLDER, 0, 1, "Record The CPU Time And Memory Of The Program Every <n> ms (default 0, no samples)"),
+
             args = arg_strn(NULL, "args", STR_PLACE_HOLDER, 0, 255, "Arg"),
             env = arg_strn(NULL, "env", STR_PLACE_HOLDER, 0, 255, "Env"),
 
             log_path = arg_strn(NULL, "log_path", STR_PLACE_HOLDER, 0, 1, "Log Path"),
+            log_level = arg_strn(NULL, "log_level", STR_PLACE_HOLDER, 0, 1, "fatal, warning, info or debug (default warning)"),
+            log_format = arg_strn(NULL, "log_format", STR_PLACE_HOLDER, 0, 1, "text or json, one object per line (default text)"),
+            log_max_size = arg_intn(NULL, "log_max_size", INT_PLACE_HOLDER, 0, 1, "Rotate The Log At This Many Bytes, Keeping 3 Old Files (default unlimited)"),
             chroot_path = arg_strn(NULL, "chroot_path", STR_PLACE_HOLDER, 0, 1, "Chroot jail path"),
             seccomp_rule_name = arg_strn(NULL, "seccomp_rule_name", STR_PLACE_HOLDER, 0, 1, "Seccomp Rule Name"),
+            seccomp_rule_file = arg_strn(NULL, "seccomp_rule_file", STR_PLACE_HOLDER, 0, 255, "Register The Seccomp Rule Of This File, Named After The File"),
+            cgroup_path = arg_strn(NULL, "cgroup_path", STR_PLACE_HOLDER, 0, 1, "Run In A New Cgroup Under This Delegated Cgroup v2 (limits memory.max and pids.max)"),
+
+            case_input = arg_strn(NULL, "case_input", STR_PLACE_HOLDER, 0, CASES_MAX_NUMBER, "Batch Case Input Path"),
+            case_output = arg_strn(NULL, "case_output", STR_PLACE_HOLDER, 0, CASES_MAX_NUMBER, "Batch Case Output Path"),
+            case_answer = arg_strn(NULL, "case_answer", STR_PLACE_HOLDER, 0, CASES_MAX_NUMBER, "Batch Case Expected Output Path, - To Skip It"),
+            stop_on_failure = arg_intn(NULL, "stop_on_failure", INT_PLACE_HOLDER, 0, 1, "Skip The Remaining Cases After The First Failure (default False)"),
 
             uid = arg_intn(NULL, "uid", INT_PLACE_HOLDER, 0, 1, "UID (default 65534)"),
             gid = arg_intn(NULL, "gid", INT_PLACE_HOLDER, 0, 1, "GID (default 65534)"),
@@ -63,6 +102,35 @@ int main(int argc, char *argv[]) {
         goto exit;
     }
 
+    if (nerrors == 0 && supervise->count > 0 && (*supervise->ival < 1 || *supervise->ival > SUPERVISOR_MAX_RUNS)) {
+        printf("%s: --supervise must be between 1 and %d\n", name, SUPERVISOR_MAX_RUNS);
+        nerrors = 1;
+    }
+
+    if (nerrors == 0 && serve->count == 0 && supervise->count == 0 && exe_path->count == 0) {
+        printf("%s: missing option --exe_path=<str>\n", name);
+        nerrors = 1;
+    }
+
+    if (nerrors == 0 && (case_output->count != case_input->count ||
+                         (case_answer->count > 0 && case_answer->count != case_input->count))) {
+        printf("%s: every --case_input needs a --case_output (and a --case_answer if any is given)\n", name);
+        nerrors = 1;
+    }
+
+    if (nerrors == 0 && compare_mode->count > 0 && compare_mode_from_name(compare_mode->sval[0]) < 0) {
+        printf("%s: unknown --compare_mode %s\n", name, compare_mode->sval[0]);
+        nerrors = 1;
+    }
+    if (nerrors == 0 && log_level->count > 0 && log_level_from_name(log_level->sval[0]) < 0) {
+        printf("%s: unknown --log_level %s\n", name, log_level->sval[0]);
+        nerrors = 1;
+    }
+    if (nerrors == 0 && log_format->count > 0 && log_format_from_name(log_format->sval[0]) < 0) {
+        printf("%s: unknown --log_format %s\n", name, log_format->sval[0]);
+        nerrors = 1;
+    }
+
     if (nerrors > 0) {
         arg_print_errors(stdout, end, name);
         printf("Try '%s --help' for more information.\n", name);
@@ -70,6 +138,37 @@ int main(int argc, char *argv[]) {
         goto exit;
     }
 
+    // the socket lives outside of the jail, so bind it before chroot
+    int listen_fd = -1;
+    if ((serve->count > 0 || supervise->count > 0) && socket_path->count > 0) {
+        listen_fd = server_listen(socket_path->sval[0]);
+        if (listen_fd < 0) {
+            printf("can not listen on %s: %s\n", socket_path->sval[0], strerror(errno));
+            exitcode = 1;
+            goto exit;
+        }
+    }
+
+    // the cgroup tree is not visible from inside the jail either
+    int cgroup_fd = -1;
+    if (cgroup_path->count > 0) {
+        cgroup_fd = cgroup_open(cgroup_path->sval[0]);
+        if (cgroup_fd < 0) {
+            printf("can not open cgroup %s: %s\n", cgroup_path->sval[0], strerror(errno));
+            exitcode = 1;
+            goto exit;
+        }
+    }
+
+    // rule files are read before chroot as well
+    for (int i = 0; i < seccomp_rule_file->count; i++) {
+        if (seccomp_rules_load_file(seccomp_rule_file->sval[i]) != 0) {
+            printf("invalid seccomp rule file %s\n", seccomp_rule_file->sval[i]);
+            exitcode = 1;
+            goto exit;
+        }
+    }
+
     // chroot
     if (chroot_path->count > 0) {
         char* path = (char *)chroot_path->sval[0];
@@ -81,67 +180,79 @@ int main(int argc, char *argv[]) {
         }
     }
 
+    if (serve->count > 0 || supervise->count > 0) {
+        struct server_options options;
+        // compile every rule set now, so no request waits for it and the workers inherit them
+        if (seccomp_rules_compile_all() != 0) {
+            printf("can not compile the seccomp rules\n");
+            exitcode = 1;
+            goto exit;
+        }
+        options.chroot_path = chroot_path->count > 0 ? chroot_path->sval[0] : NULL;
+        options.cgroup_path = cgroup_path->count > 0 ? cgroup_path->sval[0] : NULL;
+        options.cgroup_fd = cgroup_fd;
+        options.max_runs = supervise->count > 0 ? *supervise->ival : 0;
+        if (listen_fd >= 0) {
+            exitcode = serve_socket(listen_fd, &options) == 0 ? 0 : 1;
+        }
+        else if (options.max_runs > 0) {
+            exitcode = serve_supervised(STDIN_FILENO, stdout, &options) == 0 ? 0 : 1;
+        }
+        else {
+            serve_stream(stdin, stdout, &options);
+        }
+        goto exit;
+    }
+
     struct config _config;
-    struct result _result = {0, 0, 0, 0, 0, 0, 0};
+    struct result _result;
+
+    init_config(&_config);
 
     if (max_cpu_time->count > 0) {
         _config.max_cpu_time = *max_cpu_time->ival;
-    } else {
-        _config.max_cpu_time = UNLIMITED;
     }
-
     if (max_real_time->count > 0) {
         _config.max_real_time = *max_real_time->ival;
-    } else {
-        _config.max_real_time = UNLIMITED;
     }
-
     if (max_memory->count > 0) {
         _config.max_memory = (long) *max_memory->ival;
-    } else {
-        _config.max_memory = UNLIMITED;
     }
-
     if (memory_limit_check_only->count > 0) {
         _config.memory_limit_check_only = *memory_limit_check_only->ival == 0 ? 0 : 1;
-    } else {
-        _config.memory_limit_check_only = 0;
     }
-
     if (max_stack->count > 0) {
         _config.max_stack = (long) *max_stack->ival;
-    } else {
-        _config.max_stack = 16 * 1024 * 1024;
     }
-
     if (max_process_number->count > 0) {
         _config.max_process_number = *max_process_number->ival;
-    } else {
-        _config.max_process_number = UNLIMITED;
     }
-
     if (max_output_size->count > 0) {
         _config.max_output_size = (long) *max_output_size->ival;
-    } else {
-        _config.max_output_size = UNLIMITED;
+    }
+    if (cpu_core->count > 0) {
+        _config.cpu_core = *cpu_core->ival;
     }
 
     _config.exe_path = (char *)*exe_path->sval;
+    if (cgroup_fd >= 0) {
+        _config.cgroup_path = (char *)cgroup_path->sval[0];
+        _config.cgroup_fd = cgroup_fd;
+    }
 
     if (input_path->count > 0) {
         _config.input_path = (char *)input_path->sval[0];
-    } else {
-        _config.input_path = "/dev/stdin";
+    }
+    if (input_fd->count > 0) {
+        _config.input_fd = *input_fd->ival;
+        // the child gets it as stdin, the one at its original number is closed on exec
+        fcntl(_config.input_fd, F_SETFD, FD_CLOEXEC);
     }
     if (output_path->count > 0) {
         _config.output_path = (char *)output_path->sval[0];
-    } else {
-        _config.output_path = "/dev/stdout";
     }
     if (error_path->count > 0) {
         _config.error_path = (char *)error_path->sval[0];
-    } else {
-        _config.error_path = "/dev/stderr";
     }
 
     _config.args[0] = _config.exe_path;
@@ -163,53 +274,85 @@ int main(int argc, char *argv[]) {
 
     if (log_path->count > 0) {
         _config.log_path = (char *)log_path->sval[0];
-    } else {
-        _config.log_path = "judger.log";
+    }
+    if (log_level->count > 0) {
+        _config.log_level = log_level_from_name(log_level->sval[0]);
+    }
+    if (log_format->count > 0) {
+        _config.log_format = log_format_from_name(log_format->sval[0]);
+    }
+    if (log_max_size->count > 0) {
+        _config.log_max_size = (long) *log_max_size->ival;
     }
     if (seccomp_rule_name->count > 0) {
         _config.seccomp_rule_name = (char *)seccomp_rule_name->sval[0];
-    } else {
-        _config.seccomp_rule_name = NULL;
     }
- 
-    if (chroot_path->count > 0) {
-        _config.chroot_path = (char *)chroot_path->sval[0];
-    } else {
-        _config.chroot_path = NULL;
+    if (answer_path->count > 0) {
+        _config.answer_path = (char *)answer_path->sval[0];
     }
-
+    if (checker_path->count > 0) {
+        _config.checker_path = (char *)checker_path->sval[0];
+    }
+    if (checker_persistent->count > 0) {
+        _config.checker_persistent = *checker_persistent->ival == 0 ? 0 : 1;
+    }
+    if (interactor_path->count > 0) {
+        _config.interactor_path = (char *)interactor_path->sval[0];
+    }
+    if (interactor_max_cpu_time->count > 0) {
+        _config.interactor_max_cpu_time = *interactor_max_cpu_time->ival;
+    }
+    if (interactor_max_memory->count > 0) {
+        _config.interactor_max_memory = (long) *interactor_max_memory->ival;
+    }
+    if (compare_mode->count > 0) {
+        _config.compare_mode = compare_mode_from_name(compare_mode->sval[0]);
+    }
+    if (float_tolerance->count > 0) {
+        _config.float_tolerance = float_tolerance->dval[0];
+    }
+    if (zygote->count > 0) {
+        _config.zygote = *zygote->ival == 0 ? 0 : 1;
+    }
+    if (sample_interval->count > 0) {
+        _config.sample_interval = *sample_interval->ival;
+    }
+    if (source_fd->count > 0) {
+        _config.source_fd = *source_fd->ival;
+        // read by the judger only, the submission must not inherit it
+        fcntl(_config.source_fd, F_SETFD, FD_CLOEXEC);
+    }
+    if (output_pipe->count > 0) {
+        _config.output_pipe = *output_pipe->ival == 0 ? 0 : 1;
+    }
+    // chroot_path is already applied to the whole judger, the child must not chroot again
 
     if (uid->count > 0) {
         _config.uid = (uid_t)*(uid->ival);
     }
-    else {
-        _config.uid = 65534;
-    }
     if(gid->count > 0) {
         _config.gid = (gid_t)*(gid->ival);
     }
-    else {
-        _config.gid = 65534;
+
+    if (case_input->count > 0) {
+        struct test_case cases[CASES_MAX_NUMBER];
+        // a result carries its samples, too big for the stack times CASES_MAX_NUMBER
+        static struct result results[CASES_MAX_NUMBER];
+        for (i = 0; i < case_input->count; i++) {
+            cases[i].input_path = (char *)case_input->sval[i];
+            cases[i].output_path = (char *)case_output->sval[i];
+            // "-" skips the comparison of that case
+            cases[i].answer_path = case_answer->count > 0 && strcmp(case_answer->sval[i], "-") != 0 ?
+                                   (char *)case_answer->sval[i] : NULL;
+        }
+        int count = run_batch(&_config, cases, case_input->count,
+                              stop_on_failure->count > 0 && *stop_on_failure->ival != 0, results);
+        print_results(stdout, results, count);
+        goto exit;
     }
 
     run(&_config, &_result);
-
-    printf("{\n"
-           "    \"cpu_time\": %d,\n"
-           "    \"real_time\": %d,\n"
-           "    \"memory\": %ld,\n"
-           "    \"signal\": %d,\n"
-           "    \"exit_code\": %d,\n"
-           "    \"error\": %d,\n"
-           "    \"result\": %d\n"
-           "}",
-           _result.cpu_time,
-           _result.real_time,
-           _result.memory,
-           _result.signal,
-           _result.exit_code,
-           _result.error,
-           _result.result);
+    print_result(stdout, &_result);
 
     exit:
     arg_freetable(arg_table, sizeof(arg_table) / sizeof(arg_table[0]));
@@ -0,0 +1,315 @@
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <limits.h>
+#include <string.h>
+
+#include "../runner.h"
+#include "../comparator.h"
+#include "../rules/seccomp_rules.h"
+
+
+static int fill_string_list(PyObject *list, const char *name, char **items, int offset, int max_length,
+                            PyObject **holder) {
+    Py_ssize_t i, length;
+    if (!PyList_Check(list)) {
+        PyErr_Format(PyExc_ValueError, "%s must be a list", name);
+        return -1;
+    }
+    // hold our own reference to every item, the list may change while the GIL is released
+    *holder = PySequence_Tuple(list);
+    if (*holder == NULL) {
+        return -1;
+    }
+    length = PyTuple_GET_SIZE(*holder);
+    if (length + offset >= max_length) {
+        PyErr_Format(PyExc_ValueError, "%s has too many items", name);
+        return -1;
+    }
+    for (i = 0; i < length; i++) {
+        PyObject *item = PyTuple_GET_ITEM(*holder, i);
+        if (!PyUnicode_Check(item) || (items[offset + i] = (char *) PyUnicode_AsUTF8(item)) == NULL) {
+            PyErr_Clear();
+            PyErr_Format(PyExc_ValueError, "%s item must be a string", name);
+            return -1;
+        }
+    }
+    items[offset + i] = NULL;
+    return 0;
+}
+
+
+// the same "phases" object as the command line prints, NULL (and the error set) on failure
+static PyObject *build_phases(const struct result *_result) {
+    int i;
+    PyObject *phases = PyDict_New(), *value;
+    for (i = 0; phases != NULL && i < PHASE_NUMBER; i++) {
+        value = PyLong_FromLongLong(_result->phases[i]);
+        if (value == NULL || PyDict_SetItemString(phases, PHASE_NAMES[i], value) != 0) {
+            Py_XDECREF(value);
+            Py_CLEAR(phases);
+            break;
+        }
+        Py_DECREF(value);
+    }
+    return phases;
+}
+
+
+// the "rusage" object of the command line, times in microseconds
+static PyObject *build_rusage(const struct rusage *usage) {
+    return Py_BuildValue("{s:L,s:L,s:l,s:l,s:l,s:l,s:l,s:l,s:l}",
+                         "utime", (long long) usage->ru_utime.tv_sec * 1000000 + usage->ru_utime.tv_usec,
+                         "stime", (long long) usage->ru_stime.tv_sec * 1000000 + usage->ru_stime.tv_usec,
+                         "maxrss", usage->ru_maxrss,
+                         "minflt", usage->ru_minflt,
+                         "majflt", usage->ru_majflt,
+                         "inblock", usage->ru_inblock,
+                         "oublock", usage->ru_oublock,
+                         "nvcsw", usage->ru_nvcsw,
+                         "nivcsw", usage->ru_nivcsw);
+}
+
+
+// [time, cpu_time, memory] lists, like the command line
+static PyObject *build_samples(const struct result *_result) {
+    int i;
+    PyObject *samples = PyList_New(_result->sample_count), *sample;
+    for (i = 0; samples != NULL && i < _result->sample_count; i++) {
+        sample = Py_BuildValue("[i,i,l]", _result->samples[i].time, _result->samples[i].cpu_time,
+                               _result->samples[i].memory);
+        if (sample == NULL) {
+            Py_CLEAR(samples);
+            break;
+        }
+        PyList_SET_ITEM(samples, i, sample);
+    }
+    return samples;
+}
+
+
+// the "interactor" object of the command line
+static PyObject *build_interactor(const struct interactor_result *interactor) {
+    return Py_BuildValue("{s:i,s:i,s:l,s:i,s:i}",
+                         "cpu_time", interactor->cpu_time,
+                         "real_time", interactor->real_time,
+                         "memory", interactor->memory,
+                         "signal", interactor->signal,
+                         "exit_code", interactor->exit_code);
+}
+
+
+static PyObject *judger_run(PyObject *self, PyObject *args, PyObject *kwargs) {
+    struct config _config;
+    struct result _result;
+    char log_path[PATH_MAX];
+    PyObject *args_list, *env_list, *args_holder = NULL, *env_holder = NULL, *float_tolerance = Py_None;
+    int max_cpu_time, max_real_time, max_process_number, uid, gid, memory_limit_check_only = 0, output_pipe = 0,
+        cpu_core = UNLIMITED, zygote = 0, source_fd = -1, sample_interval = 0, input_fd = -1, checker_persistent = 0,
+        interactor_max_cpu_time = UNLIMITED;
+    long max_memory, max_stack, max_output_size, log_max_size = UNLIMITED, interactor_max_memory = UNLIMITED;
+    char *exe_path, *input_path, *output_path, *error_path, *log_file, *seccomp_rule_name, *chroot_path = NULL;
+    char *answer_path = NULL, *compare_mode = NULL, *cgroup_path = NULL, *log_level = NULL, *log_format = NULL;
+    char *checker_path = NULL, *interactor_path = NULL;
+    static char *kwargs_list[] = {"max_cpu_time", "max_real_time", "max_memory", "max_stack", "max_output_size",
+                                  "max_process_number", "exe_path", "input_path", "output_path", "error_path",
+                                  "args", "env", "log_path", "seccomp_rule_name", "uid", "gid",
+                                  "memory_limit_check_only", "chroot_path", "answer_path", "compare_mode",
+                                  "float_tolerance", "output_pipe", "cgroup_path", "cpu_core", "zygote", "source_fd",
+                                  "sample_interval", "log_level", "log_format", "log_max_size", "input_fd", "checker_path",
+                                  "checker_persistent", "interactor_path", "interactor_max_cpu_time",
+                                  "interactor_max_memory", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "iilllissssOOszii|izzzOiziiiizzlizizil", kwargs_list,
+                                     &max_cpu_time, &max_real_time, &max_memory, &max_stack,
+                                     &max_output_size, &max_process_number, &exe_path, &input_path,
+                                     &output_path, &error_path, &args_list, &env_list, &log_file,
+                                     &seccomp_rule_name, &uid, &gid, &memory_limit_check_only, &chroot_path,
+                                     &answer_path, &compare_mode, &float_tolerance, &output_pipe,
+                                     &cgroup_path, &cpu_core, &zygote, &source_fd, &sample_interval,
+                                     &log_level, &log_format, &log_max_size, &input_fd,
+                                     &checker_path, &checker_persistent, &interactor_path,
+                                     &interactor_max_cpu_time, &interactor_max_memory)) {
+        return NULL;
+    }
+
+    // same defaults as the command line, where UNLIMITED means "not given"
+    init_config(&_config);
+    if (max_cpu_time != UNLIMITED) {
+        _config.max_cpu_time = max_cpu_time;
+    }
+    if (max_real_time != UNLIMITED) {
+        _config.max_real_time = max_real_time;
+    }
+    if (max_memory != UNLIMITED) {
+        _config.max_memory = max_memory;
+    }
+    if (max_stack != UNLIMITED) {
+        _config.max_stack = max_stack;
+    }
+    if (max_output_size != UNLIMITED) {
+        _config.max_output_size = max_output_size;
+    }
+    if (max_process_number != UNLIMITED) {
+        _config.max_process_number = max_process_number;
+    }
+    if (uid != UNLIMITED) {
+        _config.uid = (uid_t) uid;
+    }
+    if (gid != UNLIMITED) {
+        _config.gid = (gid_t) gid;
+    }
+    if (memory_limit_check_only != UNLIMITED) {
+        _config.memory_limit_check_only = memory_limit_check_only == 0 ? 0 : 1;
+    }
+    _config.exe_path = exe_path;
+    _config.input_path = input_path;
+    // dup2'd by the child, the caller keeps its own
+    _config.input_fd = input_fd;
+    _config.output_path = output_path;
+    _config.error_path = error_path;
+    _config.seccomp_rule_name = seccomp_rule_name;
+    _config.chroot_path = chroot_path;
+    _config.answer_path = answer_path;
+    _config.output_pipe = output_pipe == 0 ? 0 : 1;
+    // run() opens it, the extension is not chrooted
+    _config.cgroup_path = cgroup_path;
+    _config.cpu_core = cpu_core;
+    // the zygotes stay alive between calls, so every run after the first one is forked warm
+    _config.zygote = zygote == 0 ? 0 : 1;
+    // stays open in the caller, so one memfd can serve every run of a submission
+    _config.source_fd = source_fd;
+    _config.sample_interval = sample_interval;
+    // a single run starts its own checker either way, only a batch keeps one
+    _config.checker_path = checker_path;
+    _config.checker_persistent = checker_persistent == 0 ? 0 : 1;
+    _config.interactor_path = interactor_path;
+    _config.interactor_max_cpu_time = interactor_max_cpu_time;
+    _config.interactor_max_memory = interactor_max_memory;
+    if ((_config.compare_mode = compare_mode_from_name(compare_mode)) < 0) {
+        PyErr_Format(PyExc_ValueError, "unknown compare_mode %s", compare_mode);
+        return NULL;
+    }
+    if ((_config.log_level = log_level_from_name(log_level)) < 0) {
+        PyErr_Format(PyExc_ValueError, "unknown log_level %s", log_level);
+        return NULL;
+    }
+    if ((_config.log_format = log_format_from_name(log_format)) < 0) {
+        PyErr_Format(PyExc_ValueError, "unknown log_format %s", log_format);
+        return NULL;
+    }
+    _config.log_max_size = log_max_size;
+    if (float_tolerance != Py_None) {
+        _config.float_tolerance = PyFloat_AsDouble(float_tolerance);
+        if (PyErr_Occurred()) {
+            return NULL;
+        }
+    }
+
+    // the command line opens the log inside the jail, so do we
+    if (chroot_path != NULL && *chroot_path != '\0') {
+        if (snprintf(log_path, sizeof(log_path), "%s/%s", chroot_path, log_file) >= (int) sizeof(log_path)) {
+            PyErr_SetString(PyExc_ValueError, "log_path is too long");
+            return NULL;
+        }
+        _config.log_path = log_path;
+    }
+    else {
+        _config.chroot_path = NULL;
+        _config.log_path = log_file;
+    }
+
+    _config.args[0] = exe_path;
+    if (fill_string_list(args_list, "args", _config.args, 1, ARGS_MAX_NUMBER, &args_holder) != 0 ||
+        fill_string_list(env_list, "env", _config.env, 0, ENV_MAX_NUMBER, &env_holder) != 0) {
+        Py_XDECREF(args_holder);
+        Py_XDECREF(env_holder);
+        return NULL;
+    }
+
+    // the sandboxed child runs for a while, let other threads judge meanwhile
+    Py_BEGIN_ALLOW_THREADS
+    run(&_config, &_result);
+    Py_END_ALLOW_THREADS
+
+    Py_DECREF(args_holder);
+    Py_DECREF(env_holder);
+
+    return Py_BuildValue("{s:i,s:i,s:l,s:i,s:i,s:i,s:i,s:i,s:N,s:N,s:N,s:N}",
+                         "cpu_time", _result.cpu_time,
+                         "real_time", _result.real_time,
+                         "memory", _result.memory,
+                         "signal", _result.signal,
+                         "exit_code", _result.exit_code,
+                         "error", _result.error,
+                         "result", _result.result,
+                         "cpu_core", _result.cpu_core,
+                         "phases", build_phases(&_result),
+                         "rusage", build_rusage(&_result.resource_usage),
+                         "samples", build_samples(&_result),
+                         "interactor", build_interactor(&_result.interactor));
+}
+
+
+static PyObject *judger_load_seccomp_rule_file(PyObject *self, PyObject *args) {
+    char *path;
+    if (!PyArg_ParseTuple(args, "s", &path)) {
+        return NULL;
+    }
+    if (seccomp_rules_load_file(path) != 0) {
+        PyErr_Format(PyExc_ValueError, "invalid seccomp rule file %s", path);
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+
+static PyMethodDef judger_methods[] = {
+        {"run", (PyCFunction) judger_run, METH_VARARGS | METH_KEYWORDS, "Run a sandboxed program and wait for its result"},
+        {"load_seccomp_rule_file", (PyCFunction) judger_load_seccomp_rule_file, METH_VARARGS,
+         "Register the seccomp rule of a file, named after the file"},
+        {NULL, NULL, 0, NULL}
+};
+
+
+static struct PyModuleDef judger_module = {
+        PyModuleDef_HEAD_INIT,
+        "_judger",
+        NULL,
+        -1,
+        judger_methods
+};
+
+
+PyMODINIT_FUNC PyInit__judger(void) {
+    PyObject *module = PyModule_Create(&judger_module);
+    if (module == NULL) {
+        return NULL;
+    }
+    PyModule_AddIntConstant(module, "VERSION", VERSION);
+    PyModule_AddIntConstant(module, "UNLIMITED", UNLIMITED);
+
+    PyModule_AddIntConstant(module, "RESULT_SUCCESS", SUCCESS);
+    PyModule_AddIntConstant(module, "RESULT_WRONG_ANSWER", WRONG_ANSWER);
+    PyModule_AddIntConstant(module, "RESULT_CPU_TIME_LIMIT_EXCEEDED", CPU_TIME_LIMIT_EXCEEDED);
+    PyModule_AddIntConstant(module, "RESULT_REAL_TIME_LIMIT_EXCEEDED", REAL_TIME_LIMIT_EXCEEDED);
+    PyModule_AddIntConstant(module, "RESULT_MEMORY_LIMIT_EXCEEDED", MEMORY_LIMIT_EXCEEDED);
+    PyModule_AddIntConstant(module, "RESULT_RUNTIME_ERROR", RUNTIME_ERROR);
+    PyModule_AddIntConstant(module, "RESULT_SYSTEM_ERROR", SYSTEM_ERROR);
+
+    PyModule_AddIntConstant(module, "ERROR_INVALID_CONFIG", INVALID_CONFIG);
+    PyModule_AddIntConstant(module, "ERROR_FORK_FAILED", FORK_FAILED);
+    PyModule_AddIntConstant(module, "ERROR_PTHREAD_FAILED", PTHREAD_FAILED);
+    PyModule_AddIntConstant(module, "ERROR_WAIT_FAILED", WAIT_FAILED);
+    PyModule_AddIntConstant(module, "ERROR_ROOT_REQUIRED", ROOT_REQUIRED);
+    PyModule_AddIntConstant(module, "ERROR_LOAD_SECCOMP_FAILED", LOAD_SECCOMP_FAILED);
+    PyModule_AddIntConstant(module, "ERROR_SETRLIMIT_FAILED", SETRLIMIT_FAILED);
+    PyModule_AddIntConstant(module, "ERROR_DUP2_FAILED", DUP2_FAILED);
+    PyModule_AddIntConstant(module, "ERROR_SETUID_FAILED", SETUID_FAILED);
+    PyModule_AddIntConstant(module, "ERROR_EXECVE_FAILED", EXECVE_FAILED);
+    PyModule_AddIntConstant(module, "ERROR_SPJ_ERROR", SPJ_ERROR);
+    PyModule_AddIntConstant(module, "ERROR_CHROOT_FAILED", CHROOT_FAILED);
+    PyModule_AddIntConstant(module, "ERROR_COMPARE_FAILED", COMPARE_FAILED);
+    PyModule_AddIntConstant(module, "ERROR_CGROUP_FAILED", CGROUP_FAILED);
+    PyModule_AddIntConstant(module, "ERROR_SETAFFINITY_FAILED", SETAFFINITY_FAILED);
+    return module;
+}
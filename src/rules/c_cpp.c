@@ -4,11 +4,12 @@
 #include <sys/stat.h>
 #include <fcntl.h>
 #include <stdbool.h>
+#include "seccomp_rules.h"
 #include "../definitions.h"
 
 
-int _c_cpp_seccomp_rules(struct config *_config, bool allow_write_file) {
-    int syscalls_whitelist[] = {SCMP_SYS(read), SCMP_SYS(fstat),
+static void _c_cpp_seccomp_rules(struct seccomp_rule_spec *spec, bool allow_write_file) {
+    static const int syscalls_whitelist[] = {SCMP_SYS(read), SCMP_SYS(fstat),
                                 SCMP_SYS(mmap), SCMP_SYS(mprotect),
                                 SCMP_SYS(munmap), SCMP_SYS(uname),
                                 SCMP_SYS(arch_prctl), SCMP_SYS(brk),
@@ -21,39 +22,20 @@ int _c_cpp_seccomp_rules(struct config *_config, bool allow_write_file) {
                                 SCMP_SYS(stat), SCMP_SYS(pread64)
                                 };
 
-    int syscalls_whitelist_length = sizeof(syscalls_whitelist) / sizeof(int);
-    scmp_filter_ctx ctx = NULL;
-    // load seccomp rules
-    ctx = seccomp_init(SCMP_ACT_KILL);
-    if (!ctx) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    for (int i = 0; i < syscalls_whitelist_length; i++) {
-        if (seccomp_rule_add(ctx, SCMP_ACT_ALLOW, syscalls_whitelist[i], 0) != 0) {
-            return LOAD_SECCOMP_FAILED;
-        }
-    }
+    spec->default_action = SCMP_ACT_KILL;
+    seccomp_spec_add(spec, SCMP_ACT_ALLOW, syscalls_whitelist, sizeof(syscalls_whitelist) / sizeof(int));
     // add extra rule for execve
-    if (seccomp_rule_add(ctx, SCMP_ACT_ALLOW, SCMP_SYS(execve), 1, SCMP_A0(SCMP_CMP_EQ, (scmp_datum_t)(_config->exe_path))) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    if (!allow_write_file) {
-        // do not allow "w" and "rw"
-        if (seccomp_rule_add(ctx, SCMP_ACT_ALLOW, SCMP_SYS(open), 1, SCMP_CMP(1, SCMP_CMP_MASKED_EQ, O_WRONLY | O_RDWR, 0)) != 0) {
-            return LOAD_SECCOMP_FAILED;
-        }
-        if (seccomp_rule_add(ctx, SCMP_ACT_ALLOW, SCMP_SYS(openat), 1, SCMP_CMP(2, SCMP_CMP_MASKED_EQ, O_WRONLY | O_RDWR, 0)) != 0) {
-            return LOAD_SECCOMP_FAILED;
-        }
-    }
-    if (seccomp_load(ctx) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    seccomp_release(ctx);
-    return 0;
+    spec->execve_exe_path = true;
+    // do not allow "w" and "rw"
+    spec->read_only_open = !allow_write_file;
 }
 
 
-int c_cpp_seccomp_rules(struct config *_config, bool allow_write_file) {
-    return _c_cpp_seccomp_rules(_config, false);
-}
\ No newline at end of file
+void c_cpp_seccomp_rules(struct seccomp_rule_spec *spec) {
+    _c_cpp_seccomp_rules(spec, false);
+}
+
+
+void c_cpp_file_io_seccomp_rules(struct seccomp_rule_spec *spec) {
+    _c_cpp_seccomp_rules(spec, true);
+}
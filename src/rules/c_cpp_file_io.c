@@ -1,8 +0,0 @@
-#include <stdbool.h>
-#include "seccomp_rules.h"
-#include "../definitions.h"
-
-
-int c_cpp_file_io_seccomp_rules(struct config *_config) {
-    return _c_cpp_seccomp_rules(_config, true);
-}
@@ -0,0 +1,31 @@
+#include <stdio.h>
+#include <seccomp.h>
+#include <sys/types.h>
+#include <sys/stat.h>
+#include <fcntl.h>
+#include <errno.h>
+#include "seccomp_rules.h"
+#include "../definitions.h"
+
+// for compilers, gcc runs cc1, as and ld itself and they write the object files and the executable,
+// so only what a compiler never needs is forbidden and the limits of the run do the rest
+void compile_seccomp_rules(struct seccomp_rule_spec *spec) {
+    static const int syscalls_blacklist[] = {SCMP_SYS(ptrace), SCMP_SYS(process_vm_readv),
+                                SCMP_SYS(process_vm_writev), SCMP_SYS(mount),
+                                SCMP_SYS(umount2), SCMP_SYS(pivot_root),
+                                SCMP_SYS(chroot), SCMP_SYS(setns),
+                                SCMP_SYS(unshare), SCMP_SYS(reboot),
+                                SCMP_SYS(kexec_load), SCMP_SYS(init_module),
+                                SCMP_SYS(finit_module), SCMP_SYS(delete_module),
+                                SCMP_SYS(bpf), SCMP_SYS(perf_event_open),
+                                SCMP_SYS(keyctl), SCMP_SYS(add_key),
+                                SCMP_SYS(request_key), SCMP_SYS(swapon),
+                                SCMP_SYS(swapoff), SCMP_SYS(userfaultfd)
+                               };
+    static const int network_syscalls[] = {SCMP_SYS(socket), SCMP_SYS(socketpair)};
+
+    spec->default_action = SCMP_ACT_ALLOW;
+    seccomp_spec_add(spec, SCMP_ACT_KILL, syscalls_blacklist, sizeof(syscalls_blacklist) / sizeof(int));
+    // no network, the compiler gets an error instead of being killed
+    seccomp_spec_add(spec, SCMP_ACT_ERRNO(EACCES), network_syscalls, sizeof(network_syscalls) / sizeof(int));
+}
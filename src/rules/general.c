@@ -4,54 +4,25 @@
 #include <sys/stat.h>
 #include <fcntl.h>
 #include <errno.h>
+#include "seccomp_rules.h"
 #include "../definitions.h"
 
-int general_seccomp_rules(struct config *_config) {
-    int syscalls_blacklist[] = {SCMP_SYS(clone),
+void general_seccomp_rules(struct seccomp_rule_spec *spec) {
+    static const int syscalls_blacklist[] = {SCMP_SYS(clone),
                                 SCMP_SYS(fork), SCMP_SYS(vfork),
                                 SCMP_SYS(kill), 
 #ifdef __NR_execveat
                                 SCMP_SYS(execveat)
 #endif
                                };
-    int syscalls_blacklist_length = sizeof(syscalls_blacklist) / sizeof(int);
-    scmp_filter_ctx ctx = NULL;
-    // load seccomp rules
-    ctx = seccomp_init(SCMP_ACT_ALLOW);
-    if (!ctx) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    for (int i = 0; i < syscalls_blacklist_length; i++) {
-        if (seccomp_rule_add(ctx, SCMP_ACT_KILL, syscalls_blacklist[i], 0) != 0) {
-            return LOAD_SECCOMP_FAILED;
-        }
-    }
+    static const int socket_syscall[] = {SCMP_SYS(socket)};
+
+    spec->default_action = SCMP_ACT_ALLOW;
+    seccomp_spec_add(spec, SCMP_ACT_KILL, syscalls_blacklist, sizeof(syscalls_blacklist) / sizeof(int));
     // use SCMP_ACT_KILL for socket, python will be killed immediately
-    if (seccomp_rule_add(ctx, SCMP_ACT_ERRNO(EACCES), SCMP_SYS(socket), 0) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
+    seccomp_spec_add(spec, SCMP_ACT_ERRNO(EACCES), socket_syscall, 1);
     // add extra rule for execve
-    if (seccomp_rule_add(ctx, SCMP_ACT_KILL, SCMP_SYS(execve), 1, SCMP_A0(SCMP_CMP_NE, (scmp_datum_t)(_config->exe_path))) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    // do not allow "w" and "rw" using open
-    if (seccomp_rule_add(ctx, SCMP_ACT_KILL, SCMP_SYS(open), 1, SCMP_CMP(1, SCMP_CMP_MASKED_EQ, O_WRONLY, O_WRONLY)) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    if (seccomp_rule_add(ctx, SCMP_ACT_KILL, SCMP_SYS(open), 1, SCMP_CMP(1, SCMP_CMP_MASKED_EQ, O_RDWR, O_RDWR)) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    // do not allow "w" and "rw" using openat
-    if (seccomp_rule_add(ctx, SCMP_ACT_KILL, SCMP_SYS(openat), 1, SCMP_CMP(2, SCMP_CMP_MASKED_EQ, O_WRONLY, O_WRONLY)) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    if (seccomp_rule_add(ctx, SCMP_ACT_KILL, SCMP_SYS(openat), 1, SCMP_CMP(2, SCMP_CMP_MASKED_EQ, O_RDWR, O_RDWR)) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-
-    if (seccomp_load(ctx) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    seccomp_release(ctx);
-    return 0;
-}
\ No newline at end of file
+    spec->execve_exe_path = true;
+    // do not allow "w" and "rw" using open and openat
+    spec->read_only_open = true;
+}
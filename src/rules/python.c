@@ -5,10 +5,11 @@
 #include <unistd.h>
 #include <fcntl.h>
 #include <stdbool.h>
+#include "seccomp_rules.h"
 #include "../definitions.h"
 
-int python_seccomp_rules(struct config *_config) {
-    static int syscalls_whitelist[] = {SCMP_SYS(read), SCMP_SYS(fstat),
+void python_seccomp_rules(struct seccomp_rule_spec *spec) {
+    static const int syscalls_whitelist[] = {SCMP_SYS(read), SCMP_SYS(fstat),
                                 SCMP_SYS(mmap), SCMP_SYS(mprotect),
                                 SCMP_SYS(munmap), SCMP_SYS(uname),
                                 SCMP_SYS(arch_prctl), SCMP_SYS(brk),
@@ -30,35 +31,10 @@ int python_seccomp_rules(struct config *_config) {
                                 SCMP_SYS(socket), SCMP_SYS(connect)
                                 };
 
-    int syscalls_whitelist_length = sizeof(syscalls_whitelist) / sizeof(int);
-    scmp_filter_ctx ctx = NULL;
-    // load seccomp rules
-    ctx = seccomp_init(SCMP_ACT_KILL);
-    if (!ctx) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    for (int i = 0; i < syscalls_whitelist_length; i++) {
-        if (seccomp_rule_add(ctx, SCMP_ACT_ALLOW, syscalls_whitelist[i], 0) != 0) {
-            return LOAD_SECCOMP_FAILED;
-        }
-    }
+    spec->default_action = SCMP_ACT_KILL;
+    seccomp_spec_add(spec, SCMP_ACT_ALLOW, syscalls_whitelist, sizeof(syscalls_whitelist) / sizeof(int));
     // add extra rule for execve
-    if (seccomp_rule_add(ctx, SCMP_ACT_ALLOW, SCMP_SYS(execve), 1, SCMP_A0(SCMP_CMP_EQ, (scmp_datum_t)(_config->exe_path))) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-
-
+    spec->execve_exe_path = true;
     // do not allow "w" and "rw"
-    if (seccomp_rule_add(ctx, SCMP_ACT_ALLOW, SCMP_SYS(open), 1, SCMP_CMP(1, SCMP_CMP_MASKED_EQ, O_WRONLY | O_RDWR, 0)) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    if (seccomp_rule_add(ctx, SCMP_ACT_ALLOW, SCMP_SYS(openat), 1, SCMP_CMP(2, SCMP_CMP_MASKED_EQ, O_WRONLY | O_RDWR, 0)) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-
-    if (seccomp_load(ctx) != 0) {
-        return LOAD_SECCOMP_FAILED;
-    }
-    seccomp_release(ctx);
-    return 0;
+    spec->read_only_open = true;
 }
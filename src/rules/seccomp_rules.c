@@ -0,0 +1,375 @@
+#define _GNU_SOURCE
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <fcntl.h>
+#include <pthread.h>
+#include <seccomp.h>
+#include <unistd.h>
+#include <sys/mman.h>
+
+#include "seccomp_rules.h"
+
+// a rule set, its filter is compiled on first use and kept for the lifetime of the process
+struct seccomp_filter {
+    char name[SECCOMP_RULE_NAME_MAX];
+    struct seccomp_rule_spec spec;
+    struct sock_fprog program;
+    // the same rules plus what a zygote needs to fork the runs, see zygote.c
+    struct sock_fprog zygote_program;
+    struct seccomp_filter *next;
+};
+
+char seccomp_exe_path[PATH_MAX];
+
+static struct seccomp_filter *filters[SECCOMP_FILTER_BUCKETS];
+static pthread_mutex_t filters_lock = PTHREAD_MUTEX_INITIALIZER;
+static pthread_once_t builtins_once = PTHREAD_ONCE_INIT;
+
+
+static unsigned int hash_name(const char *name) {
+    unsigned int hash = 5381;
+    for (; *name != '\0'; name++) {
+        hash = hash * 33 + (unsigned char) *name;
+    }
+    return hash % SECCOMP_FILTER_BUCKETS;
+}
+
+
+static struct seccomp_filter *find_filter(const char *name) {
+    struct seccomp_filter *filter;
+    for (filter = filters[hash_name(name)]; filter != NULL; filter = filter->next) {
+        if (strcmp(filter->name, name) == 0) {
+            return filter;
+        }
+    }
+    return NULL;
+}
+
+
+int seccomp_spec_add(struct seccomp_rule_spec *spec, uint32_t action, const int *syscalls, int count) {
+    if (spec->syscall_count + count > SECCOMP_RULE_MAX_SYSCALLS) {
+        return -1;
+    }
+    for (int i = 0; i < count; i++) {
+        spec->syscalls[spec->syscall_count] = syscalls[i];
+        spec->actions[spec->syscall_count] = action;
+        spec->syscall_count++;
+    }
+    return 0;
+}
+
+
+static int add_filter(const char *name, const struct seccomp_rule_spec *spec) {
+    struct seccomp_filter *filter;
+    unsigned int bucket = hash_name(name);
+
+    if (strlen(name) == 0 || strlen(name) >= SECCOMP_RULE_NAME_MAX || find_filter(name) != NULL) {
+        return -1;
+    }
+    filter = calloc(1, sizeof(struct seccomp_filter));
+    if (filter == NULL) {
+        return -1;
+    }
+    strcpy(filter->name, name);
+    filter->spec = *spec;
+    filter->next = filters[bucket];
+    filters[bucket] = filter;
+    return 0;
+}
+
+
+static void register_builtins(void) {
+    static const struct {
+        const char *name;
+        void (*build)(struct seccomp_rule_spec *spec);
+    } builtins[] = {
+        {"c_cpp", c_cpp_seccomp_rules},
+        {"c_cpp_file_io", c_cpp_file_io_seccomp_rules},
+        {"compile", compile_seccomp_rules},
+        {"general", general_seccomp_rules},
+        {"python", python_seccomp_rules},
+    };
+    struct seccomp_rule_spec spec;
+
+    for (int i = 0; i < sizeof(builtins) / sizeof(builtins[0]); i++) {
+        memset(&spec, 0, sizeof(spec));
+        builtins[i].build(&spec);
+        add_filter(builtins[i].name, &spec);
+    }
+}
+
+
+int seccomp_rules_register(const char *name, const struct seccomp_rule_spec *spec) {
+    int status;
+    pthread_once(&builtins_once, register_builtins);
+    pthread_mutex_lock(&filters_lock);
+    status = add_filter(name, spec);
+    pthread_mutex_unlock(&filters_lock);
+    return status;
+}
+
+
+static int add_conditional_rules(scmp_filter_ctx ctx, const struct seccomp_rule_spec *spec) {
+    if (spec->default_action == SCMP_ACT_ALLOW) {
+        if (spec->execve_exe_path &&
+            seccomp_rule_add(ctx, SCMP_ACT_KILL, SCMP_SYS(execve), 1, SCMP_A0(SCMP_CMP_NE, (scmp_datum_t) seccomp_exe_path)) != 0) {
+            return -1;
+        }
+        // do not allow "w" and "rw" using open and openat
+        if (spec->read_only_open &&
+            (seccomp_rule_add(ctx, SCMP_ACT_KILL, SCMP_SYS(open), 1, SCMP_CMP(1, SCMP_CMP_MASKED_EQ, O_WRONLY, O_WRONLY)) != 0 ||
+             seccomp_rule_add(ctx, SCMP_ACT_KILL, SCMP_SYS(open), 1, SCMP_CMP(1, SCMP_CMP_MASKED_EQ, O_RDWR, O_RDWR)) != 0 ||
+             seccomp_rule_add(ctx, SCMP_ACT_KILL, SCMP_SYS(openat), 1, SCMP_CMP(2, SCMP_CMP_MASKED_EQ, O_WRONLY, O_WRONLY)) != 0 ||
+             seccomp_rule_add(ctx, SCMP_ACT_KILL, SCMP_SYS(openat), 1, SCMP_CMP(2, SCMP_CMP_MASKED_EQ, O_RDWR, O_RDWR)) != 0)) {
+            return -1;
+        }
+    }
+    else {
+        if (spec->execve_exe_path &&
+            seccomp_rule_add(ctx, SCMP_ACT_ALLOW, SCMP_SYS(execve), 1, SCMP_A0(SCMP_CMP_EQ, (scmp_datum_t) seccomp_exe_path)) != 0) {
+            return -1;
+        }
+        // do not allow "w" and "rw"
+        if (spec->read_only_open &&
+            (seccomp_rule_add(ctx, SCMP_ACT_ALLOW, SCMP_SYS(open), 1, SCMP_CMP(1, SCMP_CMP_MASKED_EQ, O_WRONLY | O_RDWR, 0)) != 0 ||
+             seccomp_rule_add(ctx, SCMP_ACT_ALLOW, SCMP_SYS(openat), 1, SCMP_CMP(2, SCMP_CMP_MASKED_EQ, O_WRONLY | O_RDWR, 0)) != 0)) {
+            return -1;
+        }
+    }
+    return 0;
+}
+
+
+// builds the filter with libseccomp and keeps the bpf program it exports
+static int compile_spec(const struct seccomp_rule_spec *spec, struct sock_fprog *program) {
+    struct sock_filter *instructions = NULL;
+    int status = -1, bpf_fd = -1;
+    off_t size;
+
+    scmp_filter_ctx ctx = seccomp_init(spec->default_action);
+    if (!ctx) {
+        return -1;
+    }
+    for (int i = 0; i < spec->syscall_count; i++) {
+        if (seccomp_rule_add(ctx, spec->actions[i], spec->syscalls[i], 0) != 0) {
+            goto out;
+        }
+    }
+    if (add_conditional_rules(ctx, spec) != 0) {
+        goto out;
+    }
+
+    bpf_fd = memfd_create("seccomp", MFD_CLOEXEC);
+    if (bpf_fd < 0 || seccomp_export_bpf(ctx, bpf_fd) != 0) {
+        goto out;
+    }
+    size = lseek(bpf_fd, 0, SEEK_END);
+    if (size <= 0 || size % sizeof(struct sock_filter) != 0 || (instructions = malloc(size)) == NULL) {
+        goto out;
+    }
+    if (pread(bpf_fd, instructions, size, 0) != size) {
+        free(instructions);
+        goto out;
+    }
+    program->len = (unsigned short) (size / sizeof(struct sock_filter));
+    program->filter = instructions;
+    status = 0;
+
+out:
+    if (bpf_fd >= 0) {
+        close(bpf_fd);
+    }
+    seccomp_release(ctx);
+    return status;
+}
+
+
+static int compile_filter(struct seccomp_filter *filter) {
+    return compile_spec(&filter->spec, &filter->program);
+}
+
+
+// the zygote forks and reaps the runs, receives their files and loads their filter on top of its own
+static int compile_zygote_filter(struct seccomp_filter *filter) {
+    static const int zygote_syscalls[] = {SCMP_SYS(clone), SCMP_SYS(wait4),
+                                          SCMP_SYS(dup2), SCMP_SYS(dup3),
+                                          SCMP_SYS(recvmsg), SCMP_SYS(getpid),
+                                          SCMP_SYS(gettid), SCMP_SYS(kill),
+                                          SCMP_SYS(prctl), SCMP_SYS(seccomp),
+                                          SCMP_SYS(prlimit64)};
+    int zygote_syscalls_length = sizeof(zygote_syscalls) / sizeof(int);
+    struct seccomp_rule_spec *spec = malloc(sizeof(struct seccomp_rule_spec));
+    int status;
+
+    if (spec == NULL) {
+        return -1;
+    }
+    *spec = filter->spec;
+    spec->syscall_count = 0;
+    // drop whatever the rule says about them, the runs still get the rule itself
+    for (int i = 0; i < filter->spec.syscall_count; i++) {
+        int j;
+        for (j = 0; j < zygote_syscalls_length && zygote_syscalls[j] != filter->spec.syscalls[i]; j++);
+        if (j == zygote_syscalls_length) {
+            seccomp_spec_add(spec, filter->spec.actions[i], &filter->spec.syscalls[i], 1);
+        }
+    }
+    if (spec->default_action != SCMP_ACT_ALLOW) {
+        seccomp_spec_add(spec, SCMP_ACT_ALLOW, zygote_syscalls, zygote_syscalls_length);
+    }
+    status = compile_spec(spec, &filter->zygote_program);
+    free(spec);
+    return status;
+}
+
+
+const struct sock_fprog *seccomp_rules_get(const char *name) {
+    struct seccomp_filter *filter;
+    const struct sock_fprog *program = NULL;
+
+    pthread_once(&builtins_once, register_builtins);
+    pthread_mutex_lock(&filters_lock);
+    filter = find_filter(name);
+    if (filter != NULL && (filter->program.filter != NULL || compile_filter(filter) == 0)) {
+        program = &filter->program;
+    }
+    pthread_mutex_unlock(&filters_lock);
+    return program;
+}
+
+
+const struct sock_fprog *seccomp_rules_get_zygote(const char *name) {
+    struct seccomp_filter *filter;
+    const struct sock_fprog *program = NULL;
+
+    pthread_once(&builtins_once, register_builtins);
+    pthread_mutex_lock(&filters_lock);
+    filter = find_filter(name);
+    if (filter != NULL && (filter->zygote_program.filter != NULL || compile_zygote_filter(filter) == 0)) {
+        program = &filter->zygote_program;
+    }
+    pthread_mutex_unlock(&filters_lock);
+    return program;
+}
+
+
+int seccomp_rules_compile_all(void) {
+    int status = 0;
+    pthread_once(&builtins_once, register_builtins);
+    pthread_mutex_lock(&filters_lock);
+    for (int i = 0; i < SECCOMP_FILTER_BUCKETS; i++) {
+        for (struct seccomp_filter *filter = filters[i]; filter != NULL; filter = filter->next) {
+            if (filter->program.filter == NULL && compile_filter(filter) != 0) {
+                status = -1;
+            }
+        }
+    }
+    pthread_mutex_unlock(&filters_lock);
+    return status;
+}
+
+
+static int add_syscall_names(struct seccomp_rule_spec *spec, uint32_t action, char *names) {
+    char *name, *saveptr = NULL;
+    for (name = strtok_r(names, " \t", &saveptr); name != NULL; name = strtok_r(NULL, " \t", &saveptr)) {
+        int syscall = seccomp_syscall_resolve_name(name);
+        if (syscall == __NR_SCMP_ERROR || seccomp_spec_add(spec, action, &syscall, 1) != 0) {
+            return -1;
+        }
+    }
+    return 0;
+}
+
+
+// parses one line of a rule file, see seccomp_rules_load_file in seccomp_rules.h
+static int parse_rule_line(struct seccomp_rule_spec *spec, char *line) {
+    char *directive, *rest, *end;
+
+    line[strcspn(line, "#\r\n")] = '\0';
+    directive = strtok_r(line, " \t", &rest);
+    if (directive == NULL) {
+        return 0;
+    }
+    if (strcmp(directive, "default") == 0) {
+        char *action = strtok_r(NULL, " \t", &rest);
+        if (action != NULL && strcmp(action, "kill") == 0) {
+            spec->default_action = SCMP_ACT_KILL;
+        }
+        else if (action != NULL && strcmp(action, "allow") == 0) {
+            spec->default_action = SCMP_ACT_ALLOW;
+        }
+        else {
+            return -1;
+        }
+        return strtok_r(NULL, " \t", &rest) == NULL ? 0 : -1;
+    }
+    if (strcmp(directive, "allow") == 0) {
+        return add_syscall_names(spec, SCMP_ACT_ALLOW, rest);
+    }
+    if (strcmp(directive, "kill") == 0) {
+        return add_syscall_names(spec, SCMP_ACT_KILL, rest);
+    }
+    if (strcmp(directive, "errno") == 0) {
+        char *number = strtok_r(NULL, " \t", &rest);
+        long error_number;
+        if (number == NULL) {
+            return -1;
+        }
+        error_number = strtol(number, &end, 10);
+        if (*end != '\0' || error_number < 0 || error_number > 0xffff) {
+            return -1;
+        }
+        return add_syscall_names(spec, SCMP_ACT_ERRNO(error_number), rest);
+    }
+    if (strcmp(directive, "execve_exe_path") == 0) {
+        spec->execve_exe_path = true;
+        return strtok_r(NULL, " \t", &rest) == NULL ? 0 : -1;
+    }
+    if (strcmp(directive, "read_only_open") == 0) {
+        spec->read_only_open = true;
+        return strtok_r(NULL, " \t", &rest) == NULL ? 0 : -1;
+    }
+    return -1;
+}
+
+
+int seccomp_rules_load_file(const char *path) {
+    struct seccomp_rule_spec *spec;
+    char name[SECCOMP_RULE_NAME_MAX];
+    const char *base = strrchr(path, '/');
+    char *line = NULL;
+    size_t capacity = 0, length;
+    int status = 0;
+    FILE *fp;
+
+    // the rule is named after the file, "rules/java.rules" registers "java"
+    base = base == NULL ? path : base + 1;
+    length = strcspn(base, ".");
+    if (length == 0 || length >= sizeof(name)) {
+        return -1;
+    }
+    memcpy(name, base, length);
+    name[length] = '\0';
+
+    fp = fopen(path, "r");
+    if (fp == NULL) {
+        return -1;
+    }
+    spec = calloc(1, sizeof(struct seccomp_rule_spec));
+    if (spec == NULL) {
+        fclose(fp);
+        return -1;
+    }
+    spec->default_action = SCMP_ACT_KILL;
+    while (status == 0 && getline(&line, &capacity, fp) != -1) {
+        status = parse_rule_line(spec, line);
+    }
+    if (status == 0) {
+        status = seccomp_rules_register(name, spec);
+    }
+    free(line);
+    free(spec);
+    fclose(fp);
+    return status;
+}
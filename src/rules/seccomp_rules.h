@@ -1,12 +1,58 @@
 #ifndef JUDGER_SECCOMP_RULES_H
 #define JUDGER_SECCOMP_RULES_H
 #include <stdbool.h>
+#include <stdint.h>
+#include <linux/limits.h>
+#include <linux/filter.h>
 #include "../definitions.h"
 
-int _c_cpp_seccomp_rules(struct config *_config, bool allow_write_file);
-int c_cpp_seccomp_rules(struct config *_config);
-int python_seccomp_rules(struct config *_config);
-int general_seccomp_rules(struct config *_config);
-int c_cpp_file_io_seccomp_rules(struct config *_config);
+#define SECCOMP_RULE_MAX_SYSCALLS 512
+#define SECCOMP_RULE_NAME_MAX 64
+#define SECCOMP_FILTER_BUCKETS 64
+
+// what a rule set allows, compiled to bpf once per judger process
+struct seccomp_rule_spec {
+    // SCMP_ACT_KILL or SCMP_ACT_ALLOW
+    uint32_t default_action;
+    int syscalls[SECCOMP_RULE_MAX_SYSCALLS];
+    uint32_t actions[SECCOMP_RULE_MAX_SYSCALLS];
+    int syscall_count;
+    // execve may only run the exe_path of the run
+    bool execve_exe_path;
+    // open and openat may not open files for writing
+    bool read_only_open;
+};
+
+// the child copies exe_path here before execve, so the execve rule compares against a fixed address
+extern char seccomp_exe_path[PATH_MAX];
+
+int seccomp_spec_add(struct seccomp_rule_spec *spec, uint32_t action, const int *syscalls, int count);
+
+void c_cpp_seccomp_rules(struct seccomp_rule_spec *spec);
+void c_cpp_file_io_seccomp_rules(struct seccomp_rule_spec *spec);
+void python_seccomp_rules(struct seccomp_rule_spec *spec);
+void general_seccomp_rules(struct seccomp_rule_spec *spec);
+void compile_seccomp_rules(struct seccomp_rule_spec *spec);
+
+int seccomp_rules_register(const char *name, const struct seccomp_rule_spec *spec);
+
+// registers the rule set of a file, named after the file without its extension. One directive per line:
+//   default kill|allow
+//   allow <syscall>...
+//   kill <syscall>...
+//   errno <number> <syscall>...
+//   execve_exe_path
+//   read_only_open
+// and "#" starts a comment
+int seccomp_rules_load_file(const char *path);
+
+// the filter of a rule set, compiled on first use. NULL if there is no such rule set or it does not compile
+const struct sock_fprog *seccomp_rules_get(const char *name);
+
+// the filter of a python zygote that forks runs of this rule set, they load the rule set itself on top of it
+const struct sock_fprog *seccomp_rules_get_zygote(const char *name);
+
+// compiles every registered rule set up front, for long running judgers
+int seccomp_rules_compile_all(void);
 
 #endif //JUDGER_SECCOMP_RULES_H
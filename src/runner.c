@@ -5,9 +5,9 @@
 #include <stdlib.h>
 #include <sched.h>
 #include <signal.h>
-#include <pthread.h>
 #include <errno.h>
 #include <unistd.h>
+#include <fcntl.h>
 
 #include <sys/wait.h>
 #include <sys/time.h>
@@ -17,17 +17,213 @@
 #include "runner.h"
 #include "killer.h"
 #include "logger.h"
+#include "comparator.h"
+#include "checker.h"
+#include "interactor.h"
+#include "cgroup.h"
+#include "zygote.h"
+#include "rules/seccomp_rules.h"
+
+void init_config(struct config *_config) {
+    _config->max_cpu_time = _config->max_real_time = UNLIMITED;
+    _config->max_memory = UNLIMITED;
+    _config->max_stack = 16 * 1024 * 1024;
+    _config->max_process_number = UNLIMITED;
+    _config->max_output_size = UNLIMITED;
+    _config->memory_limit_check_only = 0;
+    _config->exe_path = NULL;
+    _config->input_path = "/dev/stdin";
+    _config->input_fd = -1;
+    _config->output_fd = -1;
+    _config->output_path = "/dev/stdout";
+    _config->error_path = "/dev/stderr";
+    _config->args[0] = _config->env[0] = NULL;
+    _config->log_path = "judger.log";
+    _config->log_level = LOG_LEVEL_WARNING;
+    _config->log_format = LOG_FORMAT_TEXT;
+    _config->log_max_size = UNLIMITED;
+    _config->seccomp_rule_name = NULL;
+    _config->chroot_path = NULL;
+    _config->uid = 65534;
+    _config->gid = 65534;
+    _config->answer_path = NULL;
+    _config->compare_mode = COMPARE_EXACT;
+    _config->float_tolerance = 1e-6;
+    _config->output_pipe = 0;
+    _config->cgroup_path = NULL;
+    _config->cgroup_fd = -1;
+    _config->cpu_core = UNLIMITED;
+    _config->zygote = 0;
+    _config->source_fd = -1;
+    _config->sample_interval = 0;
+    _config->checker_path = NULL;
+    _config->checker_persistent = 0;
+    _config->checker = NULL;
+    _config->interactor_path = NULL;
+    _config->interactor_max_cpu_time = UNLIMITED;
+    _config->interactor_max_memory = UNLIMITED;
+}
+
+
+const char *PHASE_NAMES[PHASE_NUMBER] = {"setup", "fork", "jail", "setrlimit", "open_files", "setuid", "execve",
+                                         "run", "teardown", "compare"};
+
 
 void init_result(struct result *_result) {
+    int i;
     _result->result = _result->error = SUCCESS;
     _result->cpu_time = _result->real_time = _result->signal = _result->exit_code = 0;
     _result->memory = 0;
+    _result->cpu_core = UNLIMITED;
+    for (i = 0; i < PHASE_NUMBER; i++) {
+        _result->phases[i] = 0;
+    }
+    memset(&_result->resource_usage, 0, sizeof(_result->resource_usage));
+    _result->sample_count = 0;
+    memset(&_result->interactor, 0, sizeof(_result->interactor));
+}
+
+
+void print_result(FILE *fp, const struct result *_result) {
+    fputc('{', fp);
+    print_result_members(fp, _result);
+    fputc('}', fp);
+}
+
+
+void print_result_members(FILE *fp, const struct result *_result) {
+    int i;
+    fprintf(fp, "\"cpu_time\": %d, \"real_time\": %d, \"memory\": %ld, \"signal\": %d, "
+                "\"exit_code\": %d, \"error\": %d, \"result\": %d, \"cpu_core\": %d, \"phases\": {",
+            _result->cpu_time,
+            _result->real_time,
+            _result->memory,
+            _result->signal,
+            _result->exit_code,
+            _result->error,
+            _result->result,
+            _result->cpu_core);
+    for (i = 0; i < PHASE_NUMBER; i++) {
+        fprintf(fp, "%s\"%s\": %lld", i > 0 ? ", " : "", PHASE_NAMES[i], _result->phases[i]);
+    }
+
+    // times in microseconds, maxrss in kilobytes, like getrusage
+    const struct rusage *usage = &_result->resource_usage;
+    fprintf(fp, "}, \"rusage\": {\"utime\": %lld, \"stime\": %lld, \"maxrss\": %ld, \"minflt\": %ld, "
+                "\"majflt\": %ld, \"inblock\": %ld, \"oublock\": %ld, \"nvcsw\": %ld, \"nivcsw\": %ld}",
+            (long long) usage->ru_utime.tv_sec * 1000000 + usage->ru_utime.tv_usec,
+            (long long) usage->ru_stime.tv_sec * 1000000 + usage->ru_stime.tv_usec,
+            usage->ru_maxrss, usage->ru_minflt, usage->ru_majflt, usage->ru_inblock, usage->ru_oublock,
+            usage->ru_nvcsw, usage->ru_nivcsw);
+
+    // [time, cpu_time, memory] triples
+    fputs(", \"samples\": [", fp);
+    for (i = 0; i < _result->sample_count; i++) {
+        fprintf(fp, "%s[%d, %d, %ld]", i > 0 ? ", " : "", _result->samples[i].time,
+                _result->samples[i].cpu_time, _result->samples[i].memory);
+    }
+    fputc(']', fp);
+
+    fprintf(fp, ", \"interactor\": {\"cpu_time\": %d, \"real_time\": %d, \"memory\": %ld, \"signal\": %d, "
+                "\"exit_code\": %d}",
+            _result->interactor.cpu_time, _result->interactor.real_time, _result->interactor.memory,
+            _result->interactor.signal, _result->interactor.exit_code);
+}
+
+
+void print_results(FILE *fp, const struct result *results, int count) {
+    int i;
+    fputc('[', fp);
+    for (i = 0; i < count; i++) {
+        if (i > 0) {
+            fputs(", ", fp);
+        }
+        print_result(fp, &results[i]);
+    }
+    fputc(']', fp);
+}
+
+
+int is_valid_config(struct config *_config) {
+    return !((_config->max_cpu_time < 1 && _config->max_cpu_time != UNLIMITED) ||
+             (_config->max_real_time < 1 && _config->max_real_time != UNLIMITED) ||
+             (_config->max_stack < 1) ||
+             (_config->max_memory < 1 && _config->max_memory != UNLIMITED) ||
+             (_config->max_process_number < 1 && _config->max_process_number != UNLIMITED) ||
+             (_config->max_output_size < 1 && _config->max_output_size != UNLIMITED) ||
+             (_config->compare_mode < COMPARE_EXACT || _config->compare_mode > COMPARE_FLOATS) ||
+             (_config->answer_path != NULL && _config->output_path == NULL && !_config->output_pipe) ||
+             (_config->output_pipe && _config->answer_path == NULL) ||
+             (_config->float_tolerance < 0) ||
+             (_config->cpu_core < UNLIMITED || _config->cpu_core >= CPU_SETSIZE) ||
+             (_config->args[0] == NULL) ||
+             (_config->sample_interval < 0) ||
+             (_config->input_fd < -1) ||
+             (_config->checker_path != NULL && (_config->output_path == NULL || _config->output_pipe)) ||
+             (_config->interactor_path != NULL && (_config->output_pipe || _config->input_fd >= 0)) ||
+             (_config->interactor_max_cpu_time < 1 && _config->interactor_max_cpu_time != UNLIMITED) ||
+             (_config->interactor_max_memory < 1 && _config->interactor_max_memory != UNLIMITED) ||
+             (_config->log_level < LOG_LEVEL_FATAL || _config->log_level > LOG_LEVEL_DEBUG) ||
+             (_config->log_format != LOG_FORMAT_TEXT && _config->log_format != LOG_FORMAT_JSON) ||
+             (_config->log_max_size < 1 && _config->log_max_size != UNLIMITED) ||
+             (_config->zygote && _config->source_fd < 0 && (_config->args[1] == NULL ||
+                                  strcmp(_config->args[1], "-c") != 0 || _config->args[2] == NULL)));
+}
+
+
+// run as "-c" instead of the source, which may not fit in argv: it reads the source from the start of the inherited
+// source_fd, so one sealed memfd serves all the runs of a submission, and runs it like "-c <source>" would
+static const char SOURCE_STUB[] =
+        "import os, sys, traceback, types\n"
+        "source = b\"\"\n"
+        "while True:\n"
+        "    chunk = os.pread(%d, 1 << 20, len(source))\n"
+        "    if not chunk:\n"
+        "        break\n"
+        "    source += chunk\n"
+        "os.close(%d)\n"
+        "module = types.ModuleType(\"__main__\")\n"
+        "sys.modules[\"__main__\"] = module\n"
+        "try:\n"
+        "    exec(compile(source, \"<string>\", \"exec\"), module.__dict__)\n"
+        "except SystemExit:\n"
+        "    raise\n"
+        "except BaseException:\n"
+        "    error_type, error, trace = sys.exc_info()\n"
+        "    traceback.print_exception(error_type, error, trace.tb_next)\n"
+        "    sys.exit(1)\n";
+
+
+// "exe_path -c <stub> args...", a zygote sends the source itself instead of the stub, see zygote_spawn.
+// Returns the stub to free, NULL on failure
+static char *add_source(const struct config *_config, struct config *source_config) {
+    size_t size = sizeof(SOURCE_STUB) + 2 * 16;
+    char *stub = malloc(size);
+    int i;
+
+    if (stub == NULL) {
+        return NULL;
+    }
+    snprintf(stub, size, SOURCE_STUB, _config->source_fd, _config->source_fd);
+
+    *source_config = *_config;
+    source_config->args[1] = "-c";
+    source_config->args[2] = stub;
+    for (i = 1; _config->args[i] != NULL; i++) {
+        if (i + 3 >= ARGS_MAX_NUMBER) {
+            free(stub);
+            return NULL;
+        }
+        source_config->args[i + 2] = _config->args[i];
+    }
+    source_config->args[i + 2] = NULL;
+    return stub;
 }
 
 
 void run(struct config *_config, struct result *_result) {
     // init log fp
-    FILE *log_fp = log_open(_config->log_path);
+    struct logger *log_fp = log_open(_config);
 
     // init result
     init_result(_result);
@@ -39,113 +235,482 @@ void run(struct config *_config, struct result *_result) {
     }
 
     // check args
-    if ((_config->max_cpu_time < 1 && _config->max_cpu_time != UNLIMITED) ||
-        (_config->max_real_time < 1 && _config->max_real_time != UNLIMITED) ||
-        (_config->max_stack < 1) ||
-        (_config->max_memory < 1 && _config->max_memory != UNLIMITED) ||
-        (_config->max_process_number < 1 && _config->max_process_number != UNLIMITED) ||
-        (_config->max_output_size < 1 && _config->max_output_size != UNLIMITED)) {
+    if (!is_valid_config(_config)) {
         ERROR_EXIT(INVALID_CONFIG);
     }
 
-    // record current time
-    struct timeval start, end;
-    gettimeofday(&start, NULL);
+    struct config source_config;
+    char *stub = NULL;
+    if (_config->source_fd >= 0) {
+        if ((stub = add_source(_config, &source_config)) == NULL) {
+            ERROR_EXIT(INVALID_CONFIG);
+        }
+        _config = &source_config;
+    }
+
+    // a judger that is not chrooted itself opens the cgroup for this run only
+    if (_config->cgroup_path != NULL && _config->cgroup_fd < 0) {
+        struct config cgroup_config = *_config;
+        if ((cgroup_config.cgroup_fd = cgroup_open(_config->cgroup_path)) < 0) {
+            free(stub);
+            ERROR_EXIT(CGROUP_FAILED);
+        }
+        run_process(log_fp, &cgroup_config, _result);
+        close(cgroup_config.cgroup_fd);
+    }
+    else {
+        run_process(log_fp, _config, _result);
+    }
+    free(stub);
+    log_close(log_fp);
+}
+
+
+int run_batch(struct config *_config, struct test_case *cases, int case_count, int stop_on_failure,
+              struct result *results) {
+    int i;
+    struct config case_config = *_config;
+    struct checker checker;
+    char *stub = NULL;
+    // the checks below report through the first result
+    struct result *_result = results;
+
+    // one log and one round of checks for all the cases
+    struct logger *log_fp = log_open(_config);
+
+    init_result(_result);
+    if (getuid() != 0) {
+        LOG_ERROR(ROOT_REQUIRED);
+        _result->error = ROOT_REQUIRED;
+        log_close(log_fp);
+        return 1;
+    }
+    // the stub is built once for all the cases, the inputs are the ones of the cases
+    if (case_count < 1 || !is_valid_config(_config) || _config->input_fd >= 0 ||
+        (_config->source_fd >= 0 && (stub = add_source(_config, &case_config)) == NULL)) {
+        LOG_ERROR(INVALID_CONFIG);
+        _result->error = INVALID_CONFIG;
+        log_close(log_fp);
+        return 1;
+    }
+    if (_config->cgroup_path != NULL && _config->cgroup_fd < 0 &&
+        (case_config.cgroup_fd = cgroup_open(_config->cgroup_path)) < 0) {
+        LOG_ERROR(CGROUP_FAILED);
+        _result->error = CGROUP_FAILED;
+        free(stub);
+        log_close(log_fp);
+        return 1;
+    }
+    // started once, every case is sent to it
+    if (_config->checker_path != NULL && _config->checker_persistent) {
+        if (checker_start(&checker, log_fp, &case_config) != 0) {
+            LOG_ERROR(SPJ_ERROR);
+            _result->error = SPJ_ERROR;
+            if (case_config.cgroup_fd != _config->cgroup_fd) {
+                close(case_config.cgroup_fd);
+            }
+            free(stub);
+            log_close(log_fp);
+            return 1;
+        }
+        case_config.checker = &checker;
+    }
+
+    for (i = 0; i < case_count; i++) {
+        case_config.input_path = cases[i].input_path;
+        case_config.output_path = cases[i].output_path;
+        case_config.answer_path = cases[i].answer_path;
+
+        init_result(&results[i]);
+        run_process(log_fp, &case_config, &results[i]);
+        if (stop_on_failure && (results[i].error != SUCCESS || results[i].result != SUCCESS)) {
+            LOG_DEBUG(log_fp, "Stopped after case %d of %d", i + 1, case_count);
+            i++;
+            break;
+        }
+    }
+    if (case_config.checker != NULL) {
+        checker_stop(&checker);
+    }
+    if (case_config.cgroup_fd != _config->cgroup_fd) {
+        close(case_config.cgroup_fd);
+    }
+    free(stub);
+    log_close(log_fp);
+    return i;
+}
+
+
+// the durations of the phases from the time each one ended, 0 for the ones that did not happen
+static void set_phases(struct result *_result, long long start, const long long phase_ends[PHASE_NUMBER]) {
+    int i;
+    for (i = 0; i < PHASE_NUMBER; i++) {
+        if (phase_ends[i] > 0) {
+            _result->phases[i] = phase_ends[i] - start;
+            start = phase_ends[i];
+        }
+    }
+}
+
+
+// like PROCESS_ERROR_EXIT, for process_start()
+#define START_ERROR_EXIT(error_code)\
+    {\
+        LOG_ERROR(error_code);  \
+        _result->error = error_code; \
+        return -1; \
+    }
+
+
+// the program runs from now on
+static void process_executed(struct process *_process) {
+    if (_process->config->sample_interval > 0) {
+        watchdog_sample(&_process->watchdog, _process->config->sample_interval, _process->result);
+    }
+}
+
+
+static void process_close_phases(struct process *_process, int executed) {
+    close(_process->phases_fd);
+    _process->phases_fd = -1;
+    if (!executed) {
+        memset(_process->phase_ends + PHASE_FORK, 0, sizeof(long long) * (PHASE_EXECVE - PHASE_FORK));
+    }
+    process_executed(_process);
+}
+
+
+// sets up the run and forks the child, which never returns from here; -1 with the error in the result if it failed
+int process_start(struct process *_process, struct logger *log_fp, struct config *_config, struct result *_result) {
+    int output_pipe[2] = {-1, -1}, phases_pipe[2] = {-1, -1};
+    struct child_args _args;
+    pid_t child_pid = -1;
+
+    memset(_process->phase_ends, 0, sizeof(_process->phase_ends));
+    _process->start = monotonic_ns();
+    _process->log_fp = log_fp;
+    _process->config = _config;
+    _process->result = _result;
+    _process->zygote = NULL;
+    _process->output_fd = _process->phases_fd = -1;
+    _process->phases_length = 0;
+    _process->compare_status = COMPARE_ACCEPTED;
+    _process->stopped = 0;
+
+    // rule sets are compiled once per process, the child only loads the filter
+    _args.seccomp_filter = NULL;
+    if (_config->seccomp_rule_name != NULL &&
+        (_args.seccomp_filter = seccomp_rules_get(_config->seccomp_rule_name)) == NULL) {
+        START_ERROR_EXIT(LOAD_SECCOMP_FAILED);
+    }
+
+    // every run gets a fresh cgroup, so nothing is left from a previous one
+    _process->cgroup.procs_fd = _process->cgroup.cpu_stat_fd = _process->cgroup.memory_current_fd = -1;
+    if (_config->cgroup_fd >= 0 && cgroup_create(&_process->cgroup, _config->cgroup_fd, _config) != 0) {
+        START_ERROR_EXIT(CGROUP_FAILED);
+    }
+
+    // the output is compared while it is written, instead of going to output_path
+    if (_config->output_pipe && pipe2(output_pipe, O_CLOEXEC) != 0) {
+        if (_config->cgroup_fd >= 0) {
+            cgroup_destroy(&_process->cgroup);
+        }
+        START_ERROR_EXIT(DUP2_FAILED);
+    }
 
-    pid_t child_pid = fork();
+    // the zygote forks outside of the cgroup, and writes the output to a file
+    if (_config->zygote && _config->cgroup_fd < 0 && !_config->output_pipe && _config->output_fd < 0) {
+        _process->zygote = zygote_acquire(log_fp, _config);
+    }
+    // the child reports its phases, a child of the zygote does not execve
+    if (_process->zygote == NULL && pipe2(phases_pipe, O_CLOEXEC) != 0) {
+        phases_pipe[0] = phases_pipe[1] = -1;
+    }
+
+    _process->phase_ends[PHASE_SETUP] = monotonic_ns();
+
+    if (_process->zygote != NULL && (child_pid = zygote_spawn(_process->zygote, _config)) < 0) {
+        LOG_WARNING(log_fp, "Zygote %d is gone, starting the program instead", _process->zygote->pid);
+        zygote_release(_process->zygote, 1);
+        _process->zygote = NULL;
+    }
+    if (_process->zygote == NULL) {
+        child_pid = fork();
+    }
+    else {
+        _process->phase_ends[PHASE_FORK] = monotonic_ns();
+    }
 
     // pid < 0 shows clone failed
     if (child_pid < 0) {
-        ERROR_EXIT(FORK_FAILED);
+        if (_config->output_pipe) {
+            close(output_pipe[0]);
+            close(output_pipe[1]);
+        }
+        if (phases_pipe[0] >= 0) {
+            close(phases_pipe[0]);
+            close(phases_pipe[1]);
+        }
+        if (_config->cgroup_fd >= 0) {
+            cgroup_destroy(&_process->cgroup);
+        }
+        START_ERROR_EXIT(FORK_FAILED);
     }
     else if (child_pid == 0) {
-        child_process(log_fp, _config);
-    }
-    else if (child_pid > 0){
-        // create new thread to monitor process running time
-        pthread_t tid = 0;
-        if (_config->max_real_time != UNLIMITED) {
-            struct timeout_killer_args killer_args;
-
-            killer_args.timeout = _config->max_real_time;
-            killer_args.pid = child_pid;
-            if (pthread_create(&tid, NULL, timeout_killer, (void *) (&killer_args)) != 0) {
-                kill_pid(child_pid);
-                ERROR_EXIT(PTHREAD_FAILED);
-            }
+        sigset_t no_signals;
+        if (_config->output_pipe) {
+            close(output_pipe[0]);
+        }
+        if (phases_pipe[0] >= 0) {
+            close(phases_pipe[0]);
         }
+        // the program starts with no signal blocked, whatever its judger blocked
+        sigemptyset(&no_signals);
+        sigprocmask(SIG_SETMASK, &no_signals, NULL);
+        _args.output_fd = _config->output_pipe ? output_pipe[1] : _config->output_fd;
+        _args.cgroup_procs_fd = _process->cgroup.procs_fd;
+        _args.phases_fd = phases_pipe[1];
+        child_process(log_fp, _config, &_args);
+    }
 
-        int status;
-        struct rusage resource_usage;
-
-        // wait for child process to terminate
-        // on success, returns the process ID of the child whose state has changed;
-        // On error, -1 is returned.
-        int wait_status = wait4(child_pid, &status, WSTOPPED, &resource_usage);
-        if (wait_status == -1) {
-            LOG_WARNING(log_fp, "Couldn't wait for process! %s", wait_status);
-            kill_pid(child_pid);
-            ERROR_EXIT(WAIT_FAILED);
-        }
-        // get end time
-        gettimeofday(&end, NULL);
-        _result->real_time = (int) (end.tv_sec * 1000 + end.tv_usec / 1000 - start.tv_sec * 1000 - start.tv_usec / 1000);
-
-        // process exited, we may need to cancel timeout killer thread
-        if (_config->max_real_time != UNLIMITED) {
-            int cancel_thread_status = pthread_cancel(tid);
-            if (cancel_thread_status != 0) {
-                // 3 means No Process Found which means the thread already exited before
-                if (cancel_thread_status != 3) {
-                    LOG_WARNING(log_fp, "Couldn't cancel the thread %d! Error %d %s ", tid, cancel_thread_status, strerror(cancel_thread_status));
-                }
+    _process->pid = child_pid;
+    // the time limits are enforced by polling with a deadline, no thread needed
+    watchdog_init(&_process->watchdog, child_pid, _config->max_real_time, _config->max_cpu_time);
+    _process->watchdog.cpu_stat_fd = _process->cgroup.cpu_stat_fd;
+    _process->watchdog.memory_current_fd = _process->cgroup.memory_current_fd;
+    _result->cpu_core = _config->cpu_core;
+
+    // real_time counts from the execve, the setup of the child is the judger's own overhead
+    _process->exec_time = _process->phase_ends[_process->zygote != NULL ? PHASE_FORK : PHASE_SETUP];
+    if (phases_pipe[0] >= 0) {
+        close(phases_pipe[1]);
+        _process->phases_fd = phases_pipe[0];
+    }
+    else {
+        process_executed(_process);
+    }
+    if (_config->output_pipe) {
+        close(output_pipe[1]);
+        _process->output_fd = output_pipe[0];
+    }
+    return 0;
+}
+
+
+// reads the end times the child sends, once phases_fd is readable, until its execve closes the pipe.
+// Returns 1 while there is more to read; then the real time limit starts over from the time the child sent
+// last, just before its execve, not from when the judger got around to the end of the pipe
+int process_read_phases(struct process *_process) {
+    char *record = (char *) (_process->phase_ends + PHASE_FORK), rest;
+    size_t size = sizeof(long long) * (PHASE_EXECVE - PHASE_FORK);
+    ssize_t count;
+
+    if (_process->phases_length < size) {
+        count = read(_process->phases_fd, record + _process->phases_length, size - _process->phases_length);
+    }
+    else {
+        count = read(_process->phases_fd, &rest, 1);
+    }
+    if (count < 0 && (errno == EINTR || errno == EAGAIN)) {
+        return 1;
+    }
+    if (count > 0) {
+        _process->phases_length += count;
+        return 1;
+    }
+    // end of file, every fd of the child was closed by execve or by its exit
+    if (count == 0 && _process->phases_length == size) {
+        _process->phase_ends[PHASE_EXECVE] = monotonic_ns();
+        _process->exec_time = _process->phase_ends[PHASE_SETUID];
+        watchdog_restart_at(&_process->watchdog, _process->exec_time);
+        process_close_phases(_process, 1);
+    }
+    else {
+        process_close_phases(_process, 0);
+    }
+    return 0;
+}
+
+
+// process_read_phases() until the child executed, exited, or was killed for a limit
+void process_wait_executed(struct process *_process) {
+    while (_process->phases_fd >= 0) {
+        if (watchdog_wait_fd(&_process->watchdog, _process->phases_fd) <= 0) {
+            process_close_phases(_process, 0);
+        }
+        else {
+            process_read_phases(_process);
+        }
+    }
+}
+
+
+// the rest of the run once the child exited, with what waiting for it returned
+void process_finish(struct process *_process, int wait_status, int status, const struct rusage *resource_usage) {
+    struct logger *log_fp = _process->log_fp;
+    struct config *_config = _process->config;
+    struct result *_result = _process->result;
+    long long *phase_ends = _process->phase_ends;
+    int cgroup_status = 0, cgroup_cpu_time = 0, oom_killed = 0;
+    long cgroup_memory = -1;
+
+    phase_ends[PHASE_RUN] = monotonic_ns();
+    watchdog_close(&_process->watchdog);
+    if (_process->phases_fd >= 0) {
+        process_close_phases(_process, 0);
+    }
+    if (_process->zygote != NULL) {
+        zygote_release(_process->zygote, wait_status != 0);
+    }
+    // the cgroup also counts what the processes started by the child did, they are killed with it
+    if (_config->cgroup_fd >= 0) {
+        if (wait_status != -1) {
+            cgroup_status = cgroup_read_usage(&_process->cgroup, &cgroup_cpu_time, &cgroup_memory, &oom_killed);
+        }
+        cgroup_destroy(&_process->cgroup);
+    }
+    phase_ends[PHASE_TEARDOWN] = monotonic_ns();
+    set_phases(_result, _process->start, phase_ends);
+    if (wait_status == -1) {
+        LOG_WARNING(log_fp, "Couldn't wait for process! %s", strerror(errno));
+        kill_pid(_process->pid);
+        waitpid(_process->pid, NULL, 0);
+        PROCESS_ERROR_EXIT(WAIT_FAILED);
+    }
+    _result->real_time = (int) ((phase_ends[PHASE_RUN] - _process->exec_time) / 1000000);
+    _result->resource_usage = *resource_usage;
+
+    if (WIFSIGNALED(status) != 0) {
+        _result->signal = WTERMSIG(status);
+    }
+
+    if(_result->signal == SIGUSR1) {
+        _result->result = SYSTEM_ERROR;
+    }
+    else {
+        _result->exit_code = WEXITSTATUS(status);
+        // time spent in the kernel on behalf of the program counts too
+        _result->cpu_time = (int) (resource_usage->ru_utime.tv_sec * 1000 + resource_usage->ru_utime.tv_usec / 1000 +
+                                   resource_usage->ru_stime.tv_sec * 1000 + resource_usage->ru_stime.tv_usec / 1000);
+        _result->memory = resource_usage->ru_maxrss * 1024;
+        if (_config->cgroup_fd >= 0) {
+            if (cgroup_status != 0) {
+                _result->result = SYSTEM_ERROR;
+                PROCESS_ERROR_EXIT(CGROUP_FAILED);
+            }
+            _result->cpu_time = cgroup_cpu_time;
+            if (cgroup_memory >= 0) {
+                _result->memory = cgroup_memory;
             }
         }
 
-        if (WIFSIGNALED(status) != 0) {
-            _result->signal = WTERMSIG(status);
+        if (_result->exit_code != 0) {
+            _result->result = RUNTIME_ERROR;
+            LOG_DEBUG(log_fp, "Failed with signal %d", _result->signal);
         }
 
-        if(_result->signal == SIGUSR1) {
-            _result->result = SYSTEM_ERROR;
+        if (_result->signal == SIGSEGV) {
+            if (_config->max_memory != UNLIMITED && _result->memory > _config->max_memory) {
+                _result->result = MEMORY_LIMIT_EXCEEDED;
+            }
+            else {
+                _result->result = RUNTIME_ERROR;
+                LOG_DEBUG(log_fp, "Failed with signal %d %s", _result->signal, strsignal(_result->signal));
+            }
         }
         else {
-            _result->exit_code = WEXITSTATUS(status);
-            _result->cpu_time = (int) (resource_usage.ru_utime.tv_sec * 1000 +
-                                       resource_usage.ru_utime.tv_usec / 1000);
-            _result->memory = resource_usage.ru_maxrss * 1024;
-
-            if (_result->exit_code != 0) {
+            if (_result->signal != 0) {
                 _result->result = RUNTIME_ERROR;
-                LOG_DEBUG(log_fp, "Failed with signal %d", _result->signal);
+                LOG_DEBUG(log_fp, "Failed with signal %d %s", _result->signal, strsignal(_result->signal));
             }
-
-            if (_result->signal == SIGSEGV) {
-                if (_config->max_memory != UNLIMITED && _result->memory > _config->max_memory) {
-                    _result->result = MEMORY_LIMIT_EXCEEDED;
-                }
-                else {
-                    _result->result = RUNTIME_ERROR;
-                    LOG_DEBUG(log_fp, "Failed with signal %d %s", _result->signal, strsignal(_result->signal));
-                }
+            if (oom_killed || (_config->max_memory != UNLIMITED && _result->memory > _config->max_memory)) {
+                _result->result = MEMORY_LIMIT_EXCEEDED;
             }
-            else {
-                if (_result->signal != 0) {
-                    _result->result = RUNTIME_ERROR;
-                    LOG_DEBUG(log_fp, "Failed with signal %d %s", _result->signal, strsignal(_result->signal));
-                }
-                if (_config->max_memory != UNLIMITED && _result->memory > _config->max_memory) {
-                    _result->result = MEMORY_LIMIT_EXCEEDED;
-                }
-                if (_config->max_real_time != UNLIMITED && _result->real_time > _config->max_real_time) {
-                    _result->result = REAL_TIME_LIMIT_EXCEEDED;
-                }
-                if (_config->max_cpu_time != UNLIMITED && _result->cpu_time > _config->max_cpu_time) {
-                    _result->result = CPU_TIME_LIMIT_EXCEEDED;
-                }
+            if (_process->watchdog.timed_out ||
+                (_config->max_real_time != UNLIMITED && _result->real_time > _config->max_real_time)) {
+                _result->result = REAL_TIME_LIMIT_EXCEEDED;
+            }
+            if (_process->watchdog.cpu_timed_out ||
+                (_config->max_cpu_time != UNLIMITED && _result->cpu_time > _config->max_cpu_time)) {
+                _result->result = CPU_TIME_LIMIT_EXCEEDED;
             }
         }
+    }
 
-        log_close(log_fp);
+    // only a program that finished cleanly gets its output checked
+    if (_result->result == SUCCESS && _config->checker_path != NULL) {
+        _process->compare_status = check_output(log_fp, _config);
+        phase_ends[PHASE_COMPARE] = monotonic_ns();
+        set_phases(_result, _process->start, phase_ends);
+    }
+    else if (_result->result == SUCCESS && _config->answer_path != NULL && !_config->output_pipe) {
+        _process->compare_status = compare_output(_config);
+        phase_ends[PHASE_COMPARE] = monotonic_ns();
+        set_phases(_result, _process->start, phase_ends);
+    }
+    // a program stopped above died of our SIGKILL, the comparison tells why
+    if (_result->result == SUCCESS || (_process->stopped && _result->result == RUNTIME_ERROR)) {
+        if (_process->compare_status == COMPARE_MISMATCH) {
+            _result->result = WRONG_ANSWER;
+        }
+        else if (_process->compare_status == COMPARE_TOO_LONG) {
+            _result->result = RUNTIME_ERROR;
+        }
+        else if (_process->compare_status == COMPARE_IO_ERROR) {
+            _result->result = SYSTEM_ERROR;
+            PROCESS_ERROR_EXIT(COMPARE_FAILED);
+        }
+        else if (_process->compare_status == COMPARE_CHECKER_FAILED) {
+            _result->result = SYSTEM_ERROR;
+            PROCESS_ERROR_EXIT(SPJ_ERROR);
+        }
+    }
+}
+
+
+void run_process(struct logger *log_fp, struct config *_config, struct result *_result) {
+    struct process _process;
+    struct rusage resource_usage;
+    int status, wait_status;
+
+    if (_config->interactor_path != NULL) {
+        run_interactive(log_fp, _config, _result);
+        return;
+    }
+    if (process_start(&_process, log_fp, _config, _result) != 0) {
+        return;
+    }
+    process_wait_executed(&_process);
+
+    if (_process.output_fd >= 0) {
+        _process.compare_status = compare_output_fd(_config, _process.output_fd, _config->max_output_size,
+                                                    &_process.watchdog);
+        // the first wrong byte decides, do not let the program run on
+        if (_process.compare_status != COMPARE_ACCEPTED && !watchdog_killed(&_process.watchdog)) {
+            siginfo_t info;
+            info.si_pid = 0;
+            if (waitid(P_PID, _process.pid, &info, WEXITED | WNOHANG | WNOWAIT) == 0 && info.si_pid == 0) {
+                kill_pid(_process.pid);
+                _process.stopped = 1;
+                LOG_DEBUG(log_fp, "Stopped the program, output comparison status %d", _process.compare_status);
+            }
+        }
+        close(_process.output_fd);
+        _process.output_fd = -1;
+    }
+
+    // wait for child process to terminate
+    // on success, returns the process ID of the child whose state has changed;
+    // On error, -1 is returned.
+    if (_process.zygote != NULL) {
+        // the child of the zygote is not ours, the zygote reaps it and reports its status and rusage
+        wait_status = zygote_wait(_process.zygote, &_process.watchdog, &status, &resource_usage);
+    }
+    else {
+        wait_status = watchdog_wait(&_process.watchdog);
+        if (wait_status == 0) {
+            wait_status = wait4(_process.pid, &status, WSTOPPED, &resource_usage);
+        }
     }
+    process_finish(&_process, wait_status, status, &resource_usage);
 }
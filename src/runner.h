@@ -4,7 +4,61 @@
 #include <sys/types.h>
 #include <stdio.h>
 #include "child.h"
+#include "cgroup.h"
+#include "killer.h"
+#include "zygote.h"
 
+// the keys of the "phases" object of a result, by PHASE_*
+extern const char *PHASE_NAMES[PHASE_NUMBER];
+
+void init_config(struct config *);
+
+void init_result(struct result *);
+
+int is_valid_config(struct config *);
+
+void print_result(FILE *, const struct result *);
+
+// the members of the object print_result() writes, without the braces
+void print_result_members(FILE *, const struct result *);
+
+void print_results(FILE *, const struct result *, int count);
 
 void run(struct config *, struct result *);
+
+int run_batch(struct config *, struct test_case *, int case_count, int stop_on_failure, struct result *);
+
+void run_process(struct logger *log_fp, struct config *, struct result *);
+
+// run_process() in steps: process_start() forks the child, the caller waits for it, feeding process_read_phases()
+// while phases_fd is open, and hands what wait4 returned to process_finish(). The supervisor drives many at once
+struct process {
+    struct logger *log_fp;
+    struct config *config;
+    struct result *result;
+    pid_t pid;
+    long long start;
+    long long phase_ends[PHASE_NUMBER];
+    // real_time counts from here, the time the child sent just before its execve
+    long long exec_time;
+    struct cgroup cgroup;
+    struct zygote *zygote;
+    struct watchdog watchdog;
+    // the read end of the output pipe, -1 without output_pipe
+    int output_fd;
+    // the read end of the phases pipe of the child, -1 once it is closed
+    int phases_fd;
+    size_t phases_length;
+    int compare_status;
+    // the program was killed because its output was already wrong
+    int stopped;
+};
+
+int process_start(struct process *, struct logger *log_fp, struct config *, struct result *);
+
+int process_read_phases(struct process *);
+
+void process_wait_executed(struct process *);
+
+void process_finish(struct process *, int wait_status, int status, const struct rusage *resource_usage);
 #endif //JUDGER_RUNNER_H
@@ -0,0 +1,306 @@
+#define _GNU_SOURCE
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <errno.h>
+#include <sys/types.h>
+#include <sys/socket.h>
+#include <sys/un.h>
+#include <sys/wait.h>
+
+#include "server.h"
+#include "supervisor.h"
+#include "runner.h"
+#include "comparator.h"
+#include "logger.h"
+
+
+static int read_number(const struct json_value *request, const char *key, double *value) {
+    struct json_value *item = json_object_get(request, key);
+    // missing and null keys keep the default value
+    if (item == NULL || item->type == JSON_NULL) {
+        return 0;
+    }
+    if (item->type != JSON_NUMBER && item->type != JSON_BOOL) {
+        return -1;
+    }
+    *value = item->number;
+    return 1;
+}
+
+
+static int read_string(const struct json_value *request, const char *key, char **value) {
+    struct json_value *item = json_object_get(request, key);
+    if (item == NULL) {
+        return 0;
+    }
+    if (item->type == JSON_NULL) {
+        *value = NULL;
+        return 1;
+    }
+    if (item->type != JSON_STRING) {
+        return -1;
+    }
+    *value = item->string;
+    return 1;
+}
+
+
+static int read_string_list(const struct json_value *request, const char *key, char **list, int offset, int max_length) {
+    int i;
+    struct json_value *item = json_object_get(request, key);
+    if (item == NULL || item->type == JSON_NULL) {
+        list[offset] = NULL;
+        return 0;
+    }
+    // keep one slot for the terminating NULL
+    if (item->type != JSON_ARRAY || item->length + offset >= max_length) {
+        return -1;
+    }
+    for (i = 0; i < item->length; i++) {
+        if (item->items[i].type != JSON_STRING) {
+            return -1;
+        }
+        list[offset + i] = item->items[i].string;
+    }
+    list[offset + i] = NULL;
+    return 0;
+}
+
+
+int config_from_json(const struct json_value *request, struct config *_config) {
+    double number;
+    char *compare_mode = NULL, *log_level = NULL, *log_format = NULL;
+    int status = 0;
+
+    if (request == NULL || request->type != JSON_OBJECT) {
+        return INVALID_CONFIG;
+    }
+
+    init_config(_config);
+    // stdin and stdout of the server carry the protocol, never hand them to the child
+    _config->input_path = _config->output_path = _config->error_path = "/dev/null";
+
+#define READ_NUMBER(field, type) \
+    if ((status = read_number(request, #field, &number)) < 0) { \
+        return INVALID_CONFIG; \
+    } else if (status > 0) { \
+        _config->field = (type) number; \
+    }
+
+    READ_NUMBER(max_cpu_time, int);
+    READ_NUMBER(max_real_time, int);
+    READ_NUMBER(max_memory, long);
+    READ_NUMBER(max_stack, long);
+    READ_NUMBER(max_process_number, int);
+    READ_NUMBER(max_output_size, long);
+    READ_NUMBER(memory_limit_check_only, int);
+    READ_NUMBER(uid, uid_t);
+    READ_NUMBER(gid, gid_t);
+    READ_NUMBER(float_tolerance, double);
+    READ_NUMBER(output_pipe, int);
+    READ_NUMBER(cpu_core, int);
+    READ_NUMBER(zygote, int);
+    READ_NUMBER(sample_interval, int);
+    READ_NUMBER(log_max_size, long);
+    READ_NUMBER(checker_persistent, int);
+    READ_NUMBER(interactor_max_cpu_time, int);
+    READ_NUMBER(interactor_max_memory, long);
+#undef READ_NUMBER
+
+    if (read_string(request, "exe_path", &_config->exe_path) < 0 ||
+        read_string(request, "input_path", &_config->input_path) < 0 ||
+        read_string(request, "output_path", &_config->output_path) < 0 ||
+        read_string(request, "error_path", &_config->error_path) < 0 ||
+        read_string(request, "log_path", &_config->log_path) < 0 ||
+        read_string(request, "seccomp_rule_name", &_config->seccomp_rule_name) < 0 ||
+        read_string(request, "chroot_path", &_config->chroot_path) < 0 ||
+        read_string(request, "cgroup_path", &_config->cgroup_path) < 0 ||
+        read_string(request, "answer_path", &_config->answer_path) < 0 ||
+        read_string(request, "compare_mode", &compare_mode) < 0 ||
+        read_string(request, "checker_path", &_config->checker_path) < 0 ||
+        read_string(request, "interactor_path", &_config->interactor_path) < 0 ||
+        read_string(request, "log_level", &log_level) < 0 ||
+        read_string(request, "log_format", &log_format) < 0) {
+        return INVALID_CONFIG;
+    }
+    if ((_config->compare_mode = compare_mode_from_name(compare_mode)) < 0 ||
+        (_config->log_level = log_level_from_name(log_level)) < 0 ||
+        (_config->log_format = log_format_from_name(log_format)) < 0) {
+        return INVALID_CONFIG;
+    }
+    if (_config->exe_path == NULL || _config->log_path == NULL) {
+        return INVALID_CONFIG;
+    }
+
+    _config->args[0] = _config->exe_path;
+    if (read_string_list(request, "args", _config->args, 1, ARGS_MAX_NUMBER) != 0 ||
+        read_string_list(request, "env", _config->env, 0, ENV_MAX_NUMBER) != 0) {
+        return INVALID_CONFIG;
+    }
+    return SUCCESS;
+}
+
+
+int cases_from_json(const struct json_value *request, struct test_case *cases, int max_count) {
+    int i;
+    struct json_value *item = json_object_get(request, "cases");
+    if (item == NULL || item->type == JSON_NULL) {
+        return 0;
+    }
+    if (item->type != JSON_ARRAY || item->length < 1 || item->length > max_count) {
+        return -1;
+    }
+    for (i = 0; i < item->length; i++) {
+        cases[i].input_path = cases[i].output_path = cases[i].answer_path = NULL;
+        if (read_string(&item->items[i], "input_path", &cases[i].input_path) < 0 ||
+            read_string(&item->items[i], "output_path", &cases[i].output_path) < 0 ||
+            read_string(&item->items[i], "answer_path", &cases[i].answer_path) < 0 ||
+            cases[i].input_path == NULL || cases[i].output_path == NULL) {
+            return -1;
+        }
+    }
+    return item->length;
+}
+
+
+static void serve_batch(FILE *output, const struct json_value *request, struct config *_config) {
+    static struct test_case cases[CASES_MAX_NUMBER];
+    static struct result results[CASES_MAX_NUMBER];
+    double stop_on_failure = 0;
+
+    int case_count = cases_from_json(request, cases, CASES_MAX_NUMBER);
+    if (case_count < 0 || read_number(request, "stop_on_failure", &stop_on_failure) < 0) {
+        init_result(&results[0]);
+        results[0].error = INVALID_CONFIG;
+        print_results(output, results, 1);
+        return;
+    }
+    print_results(output, results, run_batch(_config, cases, case_count, stop_on_failure != 0, results));
+}
+
+
+static int same_path(const char *request_path, const char *server_path) {
+    return request_path == NULL || (server_path != NULL && strcmp(request_path, server_path) == 0);
+}
+
+
+int config_for_server(struct config *_config, const struct server_options *options) {
+    // the server is jailed once at startup, a request can not pick another jail (or cgroup)
+    if (!same_path(_config->chroot_path, options->chroot_path) ||
+        !same_path(_config->cgroup_path, options->cgroup_path)) {
+        return INVALID_CONFIG;
+    }
+    // already applied to the server, the child must not chroot again
+    _config->chroot_path = NULL;
+    _config->cgroup_path = (char *) options->cgroup_path;
+    _config->cgroup_fd = options->cgroup_fd;
+    return SUCCESS;
+}
+
+
+void serve_stream(FILE *input, FILE *output, const struct server_options *options) {
+    char *line = NULL;
+    size_t capacity = 0;
+
+    while (getline(&line, &capacity, input) != -1) {
+        struct config _config;
+        struct result _result;
+        struct json_value *request;
+        int is_batch = 0;
+
+        // blank lines are keep-alives
+        if (strspn(line, " \t\r\n") == strlen(line)) {
+            continue;
+        }
+
+        init_result(&_result);
+        request = json_parse(line);
+        if (config_from_json(request, &_config) != SUCCESS || config_for_server(&_config, options) != SUCCESS) {
+            _result.error = INVALID_CONFIG;
+        }
+        else {
+            // batches are answered with an array of results
+            if (json_object_get(request, "cases") != NULL) {
+                serve_batch(output, request, &_config);
+                is_batch = 1;
+            }
+            else {
+                run(&_config, &_result);
+            }
+        }
+        json_free(request);
+
+        if (!is_batch) {
+            print_result(output, &_result);
+        }
+        fputc('\n', output);
+        // the child inherits our buffers, they must be empty before the next fork
+        if (fflush(output) != 0) {
+            break;
+        }
+    }
+    free(line);
+}
+
+
+int server_listen(const char *socket_path) {
+    struct sockaddr_un address;
+    int listen_fd;
+
+    if (strlen(socket_path) >= sizeof(address.sun_path)) {
+        return -1;
+    }
+    memset(&address, 0, sizeof(address));
+    address.sun_family = AF_UNIX;
+    strcpy(address.sun_path, socket_path);
+
+    listen_fd = socket(AF_UNIX, SOCK_STREAM | SOCK_CLOEXEC, 0);
+    if (listen_fd < 0) {
+        return -1;
+    }
+    // stale socket left by a previous server
+    unlink(socket_path);
+    if (bind(listen_fd, (struct sockaddr *) &address, sizeof(address)) != 0 ||
+        listen(listen_fd, SERVER_BACKLOG) != 0) {
+        close(listen_fd);
+        return -1;
+    }
+    return listen_fd;
+}
+
+
+int serve_socket(int listen_fd, const struct server_options *options) {
+    while (1) {
+        int connection_fd = accept(listen_fd, NULL, NULL);
+        if (connection_fd < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            return -1;
+        }
+
+        // every connection gets its own worker, so clients judge concurrently
+        pid_t worker_pid = fork();
+        if (worker_pid == 0) {
+            close(listen_fd);
+            FILE *output = fdopen(dup(connection_fd), "w");
+            if (options->max_runs > 0) {
+                if (output != NULL) {
+                    serve_supervised(connection_fd, output, options);
+                }
+                _exit(0);
+            }
+            FILE *input = fdopen(connection_fd, "r");
+            if (input != NULL && output != NULL) {
+                serve_stream(input, output, options);
+            }
+            _exit(0);
+        }
+        close(connection_fd);
+
+        // reap workers whose clients went away
+        while (waitpid(-1, NULL, WNOHANG) > 0);
+    }
+}
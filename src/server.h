@@ -0,0 +1,34 @@
+#ifndef JUDGER_SERVER_H
+#define JUDGER_SERVER_H
+
+#include <stdio.h>
+#include "definitions.h"
+#include "json.h"
+
+// backlog of the unix socket, connections are handled in forked workers
+#define SERVER_BACKLOG 64
+
+// settings of the server itself, requests may repeat them but can not change them
+struct server_options {
+    const char *chroot_path;
+    const char *cgroup_path;
+    int cgroup_fd;
+    // 0 to run one request after the other, else the requests are supervised, this many at once
+    int max_runs;
+};
+
+
+int config_from_json(const struct json_value *request, struct config *_config);
+
+// checks the jail and cgroup of a request against the server's and hands it the server's cgroup
+int config_for_server(struct config *_config, const struct server_options *options);
+
+int cases_from_json(const struct json_value *request, struct test_case *cases, int max_count);
+
+int server_listen(const char *socket_path);
+
+void serve_stream(FILE *input, FILE *output, const struct server_options *options);
+
+int serve_socket(int listen_fd, const struct server_options *options);
+
+#endif //JUDGER_SERVER_H
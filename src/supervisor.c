@@ -0,0 +1,416 @@
+#define _GNU_SOURCE
+#include <errno.h>
+#include <signal.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#include <sys/epoll.h>
+#include <sys/signalfd.h>
+#include <sys/timerfd.h>
+#include <sys/wait.h>
+
+#include "supervisor.h"
+#include "runner.h"
+#include "killer.h"
+#include "logger.h"
+
+#define SUPERVISOR_EVENTS 64
+#define SUPERVISOR_READ_SIZE 65536
+
+// what an epoll event is about, the index of the run is kept above EVENT_BITS
+enum {
+    EVENT_INPUT = 0,
+    EVENT_SIGNAL,
+    EVENT_EXIT,
+    EVENT_PHASES,
+    EVENT_TIMER,
+    EVENT_BITS = 3
+};
+
+struct supervised_run {
+    int used;
+    // the strings of the config point into it
+    struct json_value *request;
+    struct config config;
+    struct result result;
+    struct logger *log_fp;
+    struct process process;
+    // fires when the limits (or the samples) of the run are due to be checked
+    int timer_fd;
+};
+
+struct supervisor {
+    int epoll_fd;
+    int input_fd;
+    int input_open;
+    // regular files can not be polled, they are read whenever a request is wanted
+    int input_pollable;
+    int input_watched;
+    // SIGTERM or SIGINT arrived, the runs are killed and no request is started any more
+    int stopping;
+    FILE *output;
+    const struct server_options *options;
+    char *buffer;
+    size_t length;
+    size_t capacity;
+    int running;
+    struct supervised_run *runs;
+};
+
+
+static int watch(struct supervisor *_supervisor, int fd, uint32_t events, int event, int index) {
+    struct epoll_event _event;
+    _event.events = events;
+    _event.data.u64 = ((uint64_t) index << EVENT_BITS) | (uint64_t) event;
+    return epoll_ctl(_supervisor->epoll_fd, EPOLL_CTL_ADD, fd, &_event);
+}
+
+
+// before the fd is closed, a child that is not executed yet still shares it and epoll would go on reporting it
+static void unwatch(struct supervisor *_supervisor, int fd) {
+    epoll_ctl(_supervisor->epoll_fd, EPOLL_CTL_DEL, fd, NULL);
+}
+
+
+static void write_result(struct supervisor *_supervisor, const struct json_value *request,
+                         const struct result *_result) {
+    struct json_value *id = request != NULL && request->type == JSON_OBJECT ? json_object_get(request, "id") : NULL;
+
+    fputs("{\"id\": ", _supervisor->output);
+    if (id != NULL && id->type == JSON_STRING) {
+        json_print_string(_supervisor->output, id->string);
+    }
+    else if (id != NULL && id->type == JSON_NUMBER) {
+        fprintf(_supervisor->output, "%.15g", id->number);
+    }
+    else {
+        fputs("null", _supervisor->output);
+    }
+    fputs(", ", _supervisor->output);
+    print_result_members(_supervisor->output, _result);
+    fputs("}\n", _supervisor->output);
+    // the children inherit our buffers, they must be empty before the next fork
+    fflush(_supervisor->output);
+}
+
+
+static void release_run(struct supervisor *_supervisor, struct supervised_run *run) {
+    if (run->timer_fd >= 0) {
+        unwatch(_supervisor, run->timer_fd);
+        close(run->timer_fd);
+    }
+    log_close(run->log_fp);
+    json_free(run->request);
+    run->used = 0;
+    _supervisor->running--;
+}
+
+
+// kills the run when it is over a limit, and arms its timer for the next check
+static void check_run(struct supervised_run *run) {
+    struct itimerspec timer;
+    int remaining = watchdog_check(&run->process.watchdog);
+
+    memset(&timer, 0, sizeof(timer));
+    if (remaining != UNLIMITED) {
+        // a zero timer would be disarmed
+        if (remaining < 1) {
+            remaining = 1;
+        }
+        timer.it_value.tv_sec = remaining / 1000;
+        timer.it_value.tv_nsec = (long) (remaining % 1000) * 1000000;
+    }
+    timerfd_settime(run->timer_fd, 0, &timer, NULL);
+}
+
+
+static void start_run(struct supervisor *_supervisor, const char *line) {
+    struct supervised_run *run = NULL;
+    int index;
+
+    for (index = 0; index < _supervisor->options->max_runs; index++) {
+        if (!_supervisor->runs[index].used) {
+            run = &_supervisor->runs[index];
+            break;
+        }
+    }
+    run->used = 1;
+    _supervisor->running++;
+    run->log_fp = NULL;
+    run->timer_fd = -1;
+    init_result(&run->result);
+    run->request = json_parse(line);
+
+    if (config_from_json(run->request, &run->config) != SUCCESS ||
+        config_for_server(&run->config, _supervisor->options) != SUCCESS ||
+        // the output of these is read while the program runs, the checker and the interactor would run inside
+        // the loop, and the cases of a batch run one after the other
+        run->config.output_pipe || run->config.checker_path != NULL || run->config.interactor_path != NULL ||
+        json_object_get(run->request, "cases") != NULL ||
+        !is_valid_config(&run->config)) {
+        run->result.error = INVALID_CONFIG;
+    }
+    else if (getuid() != 0) {
+        run->result.error = ROOT_REQUIRED;
+    }
+    else if ((run->timer_fd = timerfd_create(CLOCK_MONOTONIC, TFD_NONBLOCK | TFD_CLOEXEC)) < 0) {
+        run->result.error = WAIT_FAILED;
+    }
+    else {
+        // a zygote answers one run at a time
+        run->config.zygote = 0;
+        run->log_fp = log_open(&run->config);
+        if (process_start(&run->process, run->log_fp, &run->config, &run->result) == 0) {
+            // without pidfd_open, SIGCHLD tells the exit
+            if (run->process.watchdog.pidfd >= 0) {
+                watch(_supervisor, run->process.watchdog.pidfd, EPOLLIN, EVENT_EXIT, index);
+            }
+            // one shot, the pipe is closed while the run goes on
+            if (run->process.phases_fd >= 0) {
+                watch(_supervisor, run->process.phases_fd, EPOLLIN | EPOLLONESHOT, EVENT_PHASES, index);
+            }
+            watch(_supervisor, run->timer_fd, EPOLLIN, EVENT_TIMER, index);
+            check_run(run);
+            return;
+        }
+    }
+    write_result(_supervisor, run->request, &run->result);
+    release_run(_supervisor, run);
+}
+
+
+// once the child has exited, nothing of the run is left to wait for
+static void finish_run(struct supervisor *_supervisor, struct supervised_run *run) {
+    struct rusage resource_usage;
+    int status = 0, wait_status = 0;
+    pid_t pid = wait4(run->process.pid, &status, WNOHANG, &resource_usage);
+
+    if (pid == 0) {
+        return;
+    }
+    if (pid < 0) {
+        wait_status = -1;
+    }
+    if (run->process.watchdog.pidfd >= 0) {
+        unwatch(_supervisor, run->process.watchdog.pidfd);
+    }
+    // the child is gone, whatever it wrote to the pipe can be read without waiting
+    if (run->process.phases_fd >= 0) {
+        unwatch(_supervisor, run->process.phases_fd);
+        while (run->process.phases_fd >= 0) {
+            process_read_phases(&run->process);
+        }
+    }
+    process_finish(&run->process, wait_status, status, &resource_usage);
+    write_result(_supervisor, run->request, &run->result);
+    release_run(_supervisor, run);
+}
+
+
+static void read_phases(struct supervisor *_supervisor, struct supervised_run *run, int index) {
+    struct epoll_event _event;
+
+    if (process_read_phases(&run->process) != 0) {
+        _event.events = EPOLLIN | EPOLLONESHOT;
+        _event.data.u64 = ((uint64_t) index << EVENT_BITS) | EVENT_PHASES;
+        epoll_ctl(_supervisor->epoll_fd, EPOLL_CTL_MOD, run->process.phases_fd, &_event);
+    }
+    else {
+        // executed, the real time limit starts over
+        check_run(run);
+    }
+}
+
+
+static void read_signals(struct supervisor *_supervisor, int signal_fd) {
+    struct signalfd_siginfo info;
+    siginfo_t child;
+    int i;
+
+    while (read(signal_fd, &info, sizeof(info)) == sizeof(info)) {
+        if (info.ssi_signo == SIGCHLD) {
+            for (i = 0; i < _supervisor->options->max_runs; i++) {
+                struct supervised_run *run = &_supervisor->runs[i];
+                child.si_pid = 0;
+                if (run->used && run->process.watchdog.pidfd < 0 &&
+                    waitid(P_PID, run->process.pid, &child, WEXITED | WNOHANG | WNOWAIT) == 0 && child.si_pid != 0) {
+                    finish_run(_supervisor, run);
+                }
+            }
+            continue;
+        }
+        // stop: the runs are killed like the ones over a limit, their results are still written
+        _supervisor->stopping = 1;
+        for (i = 0; i < _supervisor->options->max_runs; i++) {
+            if (_supervisor->runs[i].used) {
+                kill_pid(_supervisor->runs[i].process.pid);
+            }
+        }
+    }
+}
+
+
+static void read_input(struct supervisor *_supervisor) {
+    ssize_t count;
+    char *buffer;
+
+    // one byte is kept for the newline of a last line without one
+    if (_supervisor->capacity - _supervisor->length < SUPERVISOR_READ_SIZE) {
+        buffer = realloc(_supervisor->buffer, _supervisor->capacity * 2 + SUPERVISOR_READ_SIZE);
+        if (buffer == NULL) {
+            _supervisor->input_open = 0;
+            return;
+        }
+        _supervisor->buffer = buffer;
+        _supervisor->capacity = _supervisor->capacity * 2 + SUPERVISOR_READ_SIZE;
+    }
+    count = read(_supervisor->input_fd, _supervisor->buffer + _supervisor->length,
+                 _supervisor->capacity - _supervisor->length - 1);
+    if (count < 0 && (errno == EINTR || errno == EAGAIN)) {
+        return;
+    }
+    if (count <= 0) {
+        _supervisor->input_open = 0;
+        if (_supervisor->length > 0 && _supervisor->buffer[_supervisor->length - 1] != '\n') {
+            _supervisor->buffer[_supervisor->length++] = '\n';
+        }
+        return;
+    }
+    _supervisor->length += count;
+}
+
+
+// starts the complete requests of the buffer while there are free slots
+static void start_buffered(struct supervisor *_supervisor) {
+    size_t consumed = 0;
+    char *line, *newline;
+
+    while (_supervisor->running < _supervisor->options->max_runs && !_supervisor->stopping &&
+           (newline = memchr(_supervisor->buffer + consumed, '\n', _supervisor->length - consumed)) != NULL) {
+        *newline = '\0';
+        line = _supervisor->buffer + consumed;
+        consumed = newline - _supervisor->buffer + 1;
+        // blank lines are keep-alives
+        if (strspn(line, " \t\r") != strlen(line)) {
+            start_run(_supervisor, line);
+        }
+    }
+    memmove(_supervisor->buffer, _supervisor->buffer + consumed, _supervisor->length - consumed);
+    _supervisor->length -= consumed;
+}
+
+
+// the next request is only read while there is a free slot for it
+static int input_wanted(const struct supervisor *_supervisor) {
+    return _supervisor->input_open && !_supervisor->stopping &&
+           _supervisor->running < _supervisor->options->max_runs &&
+           memchr(_supervisor->buffer, '\n', _supervisor->length) == NULL;
+}
+
+
+int serve_supervised(int input_fd, FILE *output, const struct server_options *options) {
+    struct supervisor _supervisor;
+    struct epoll_event events[SUPERVISOR_EVENTS];
+    sigset_t signals, old_signals;
+    int signal_fd, i, count, status = 0;
+
+    memset(&_supervisor, 0, sizeof(_supervisor));
+    _supervisor.input_fd = input_fd;
+    _supervisor.input_open = 1;
+    _supervisor.output = output;
+    _supervisor.options = options;
+    _supervisor.runs = calloc((size_t) options->max_runs, sizeof(struct supervised_run));
+    _supervisor.capacity = SUPERVISOR_READ_SIZE;
+    _supervisor.buffer = malloc(_supervisor.capacity);
+    _supervisor.epoll_fd = epoll_create1(EPOLL_CLOEXEC);
+    if (_supervisor.runs == NULL || _supervisor.buffer == NULL || _supervisor.epoll_fd < 0) {
+        free(_supervisor.runs);
+        free(_supervisor.buffer);
+        if (_supervisor.epoll_fd >= 0) {
+            close(_supervisor.epoll_fd);
+        }
+        return -1;
+    }
+
+    // the children get their own mask back in process_start
+    sigemptyset(&signals);
+    sigaddset(&signals, SIGCHLD);
+    sigaddset(&signals, SIGTERM);
+    sigaddset(&signals, SIGINT);
+    sigprocmask(SIG_BLOCK, &signals, &old_signals);
+    signal_fd = signalfd(-1, &signals, SFD_NONBLOCK | SFD_CLOEXEC);
+    if (signal_fd < 0 || watch(&_supervisor, signal_fd, EPOLLIN, EVENT_SIGNAL, 0) != 0) {
+        status = -1;
+        _supervisor.input_open = 0;
+    }
+
+    _supervisor.input_pollable = 1;
+    while (1) {
+        int wanted, timeout = -1;
+
+        start_buffered(&_supervisor);
+        if ((!_supervisor.input_open || _supervisor.stopping) && _supervisor.running == 0) {
+            break;
+        }
+        wanted = input_wanted(&_supervisor);
+        if (wanted != _supervisor.input_watched && _supervisor.input_pollable) {
+            if (!wanted) {
+                unwatch(&_supervisor, input_fd);
+            }
+            else if (watch(&_supervisor, input_fd, EPOLLIN, EVENT_INPUT, 0) != 0) {
+                _supervisor.input_pollable = 0;
+            }
+            _supervisor.input_watched = wanted && _supervisor.input_pollable;
+        }
+        if (wanted && !_supervisor.input_pollable) {
+            read_input(&_supervisor);
+            timeout = 0;
+        }
+
+        count = epoll_wait(_supervisor.epoll_fd, events, SUPERVISOR_EVENTS, timeout);
+        if (count < 0 && errno != EINTR) {
+            status = -1;
+            break;
+        }
+
+        for (i = 0; i < count; i++) {
+            int event = (int) (events[i].data.u64 & ((1 << EVENT_BITS) - 1));
+            int index = (int) (events[i].data.u64 >> EVENT_BITS);
+            struct supervised_run *run = &_supervisor.runs[index];
+
+            if (event == EVENT_INPUT) {
+                read_input(&_supervisor);
+            }
+            else if (event == EVENT_SIGNAL) {
+                read_signals(&_supervisor, signal_fd);
+            }
+            // an earlier event of this round may have finished the run
+            else if (!run->used) {
+                continue;
+            }
+            else if (event == EVENT_EXIT) {
+                finish_run(&_supervisor, run);
+            }
+            else if (event == EVENT_PHASES && run->process.phases_fd >= 0) {
+                read_phases(&_supervisor, run, index);
+            }
+            else if (event == EVENT_TIMER) {
+                uint64_t expirations;
+                if (read(run->timer_fd, &expirations, sizeof(expirations)) > 0) {
+                    check_run(run);
+                }
+            }
+        }
+    }
+
+    if (signal_fd >= 0) {
+        close(signal_fd);
+    }
+    sigprocmask(SIG_SETMASK, &old_signals, NULL);
+    close(_supervisor.epoll_fd);
+    free(_supervisor.runs);
+    free(_supervisor.buffer);
+    return status;
+}
@@ -0,0 +1,16 @@
+#ifndef JUDGER_SUPERVISOR_H
+#define JUDGER_SUPERVISOR_H
+
+#include <stdio.h>
+#include "server.h"
+
+// at most this many runs at once per supervisor, each one holds a pidfd, a timerfd and a log
+#define SUPERVISOR_MAX_RUNS 1024
+
+// reads run requests line by line from input_fd like serve_stream, but keeps up to options->max_runs of them running
+// at once in this one process: the exits, the limits and the phases of all the children are waited for in a single
+// epoll loop. Every result is written as soon as its run is over, with the "id" of its request.
+// SIGTERM and SIGINT kill the runs, their results are still written
+int serve_supervised(int input_fd, FILE *output, const struct server_options *options);
+
+#endif //JUDGER_SUPERVISOR_H
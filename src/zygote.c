@@ -0,0 +1,613 @@
+#define _GNU_SOURCE
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <errno.h>
+#include <fcntl.h>
+#include <limits.h>
+#include <pthread.h>
+#include <signal.h>
+#include <unistd.h>
+#include <poll.h>
+#include <sys/socket.h>
+#include <sys/uio.h>
+#include <sys/stat.h>
+#include <sys/wait.h>
+
+#include "zygote.h"
+#include "child.h"
+#include "logger.h"
+#include "rules/seccomp_rules.h"
+
+// run by the interpreter as "-c", it loads its seccomp filter, then forks a child for every request:
+//   "<rlimit cpu seconds> <rlimit as bytes> <source length> <arg length>...\n", the source and the args,
+//   with stdin, stdout and stderr of the run attached
+// and answers "pid <pid>\n" once forked and "exit <status> <utime us> <stime us> <maxrss kb> <minflt> <majflt>
+// <inblock> <oublock> <nvcsw> <nivcsw>\n" once reaped.
+// the source is compiled before the fork and its code object is kept, so a submission is compiled once for all its runs
+static const char ZYGOTE_SOURCE[] =
+        "import builtins, collections, ctypes, gc, os, resource, signal, socket, struct, sys, traceback, types\n"
+        "\n"
+        "for name in (\"bisect\", \"collections\", \"functools\", \"heapq\", \"itertools\", \"math\", \"re\", \"string\"):\n"
+        "    try:\n"
+        "        __import__(name)\n"
+        "    except ImportError:\n"
+        "        pass\n"
+        "\n"
+        "libc = ctypes.CDLL(None, use_errno=True)\n"
+        "libc.prctl.argtypes = [ctypes.c_int, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong]\n"
+        "\n"
+        "\n"
+        "class Fprog(ctypes.Structure):\n"
+        "    _fields_ = [(\"len\", ctypes.c_ushort), (\"filter\", ctypes.c_char_p)]\n"
+        "\n"
+        "\n"
+        "def load_filter(program):\n"
+        "    if program:\n"
+        "        fprog = Fprog(len(program) // 8, program)\n"
+        "        if libc.prctl(38, 1, 0, 0, 0) != 0 or libc.prctl(22, 2, ctypes.addressof(fprog), 0, 0) != 0:\n"
+        "            raise OSError(ctypes.get_errno(), \"can not load the seccomp filter\")\n"
+        "\n"
+        "\n"
+        "class Control(object):\n"
+        "    def __init__(self, fd):\n"
+        "        self.socket = socket.socket(fileno=fd)\n"
+        "        self.buffer = b\"\"\n"
+        "        self.fds = []\n"
+        "\n"
+        "    def receive(self):\n"
+        "        data, ancdata, flags, address = self.socket.recvmsg(65536, socket.CMSG_SPACE(3 * 4))\n"
+        "        if not data:\n"
+        "            raise EOFError()\n"
+        "        self.buffer += data\n"
+        "        for level, kind, payload in ancdata:\n"
+        "            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:\n"
+        "                self.fds += struct.unpack(\"{}i\".format(len(payload) // 4), payload[:len(payload) // 4 * 4])\n"
+        "\n"
+        "    def read_line(self):\n"
+        "        while b\"\\n\" not in self.buffer:\n"
+        "            self.receive()\n"
+        "        line, self.buffer = self.buffer.split(b\"\\n\", 1)\n"
+        "        return line\n"
+        "\n"
+        "    def read(self, size):\n"
+        "        while len(self.buffer) < size:\n"
+        "            self.receive()\n"
+        "        data, self.buffer = self.buffer[:size], self.buffer[size:]\n"
+        "        return data\n"
+        "\n"
+        "    def write(self, line):\n"
+        "        os.write(self.socket.fileno(), line.encode())\n"
+        "\n"
+        "\n"
+        "def exit_status(code):\n"
+        "    if code is None:\n"
+        "        return 0\n"
+        "    if isinstance(code, int):\n"
+        "        return code & 0xff\n"
+        "    print(code, file=sys.stderr)\n"
+        "    return 1\n"
+        "\n"
+        "\n"
+        "# the code object of the submission, compiled once for all of its runs\n"
+        "codes = collections.OrderedDict()\n"
+        "\n"
+        "\n"
+        "def compile_source(source):\n"
+        "    if source in codes:\n"
+        "        codes.move_to_end(source)\n"
+        "    else:\n"
+        "        try:\n"
+        "            codes[source] = compile(source, \"<string>\", \"exec\")\n"
+        "        except BaseException as error:\n"
+        "            codes[source] = error.with_traceback(None)\n"
+        "        if len(codes) > 16:\n"
+        "            codes.popitem(last=False)\n"
+        "    return codes[source]\n"
+        "\n"
+        "\n"
+        "def run(control, fds, cpu_time, memory, code, argv, run_filter):\n"
+        "    # the zygote serves a single submission, still the run starts without what the zygote kept\n"
+        "    codes.clear()\n"
+        "    control.buffer = b\"\"\n"
+        "    try:\n"
+        "        os.close(control.socket.detach())\n"
+        "        for target, fd in enumerate(fds):\n"
+        "            os.dup2(fd, target)\n"
+        "        for fd in fds:\n"
+        "            os.close(fd)\n"
+        "        if cpu_time > 0:\n"
+        "            resource.setrlimit(resource.RLIMIT_CPU, (cpu_time, cpu_time))\n"
+        "        if memory > 0:\n"
+        "            resource.setrlimit(resource.RLIMIT_AS, (memory, memory))\n"
+        "        load_filter(run_filter)\n"
+        "    except BaseException:\n"
+        "        os.kill(os.getpid(), signal.SIGUSR1)\n"
+        "        os._exit(1)\n"
+        "\n"
+        "    module = types.ModuleType(\"__main__\")\n"
+        "    module.__builtins__ = builtins\n"
+        "    sys.modules[\"__main__\"] = module\n"
+        "    sys.argv = argv\n"
+        "    status = 0\n"
+        "    try:\n"
+        "        if isinstance(code, BaseException):\n"
+        "            raise code\n"
+        "        exec(code, module.__dict__)\n"
+        "    except SystemExit as error:\n"
+        "        status = exit_status(error.code)\n"
+        "    except BaseException:\n"
+        "        error_type, error, trace = sys.exc_info()\n"
+        "        traceback.print_exception(error_type, error, trace.tb_next)\n"
+        "        status = 1\n"
+        "    try:\n"
+        "        sys.stdout.flush()\n"
+        "        sys.stderr.flush()\n"
+        "    except BaseException:\n"
+        "        status = 120\n"
+        "    os._exit(status)\n"
+        "\n"
+        "\n"
+        "def main():\n"
+        "    control = Control(os.dup(1))\n"
+        "    sizes = [int(size) for size in control.read_line().split()]\n"
+        "    zygote_filter, run_filter = control.read(sizes[0]), control.read(sizes[1])\n"
+        "    load_filter(zygote_filter)\n"
+        "    gc.collect()\n"
+        "    gc.freeze()\n"
+        "    control.write(\"ready\\n\")\n"
+        "    while True:\n"
+        "        try:\n"
+        "            fields = [int(field) for field in control.read_line().split()]\n"
+        "        except EOFError:\n"
+        "            return\n"
+        "        fds, control.fds = control.fds, []\n"
+        "        items = [control.read(size) for size in fields[2:]]\n"
+        "        code = compile_source(items[0])\n"
+        "        pid = os.fork()\n"
+        "        if pid == 0:\n"
+        "            run(control, fds, fields[0], fields[1], code, [\"-c\"] + [os.fsdecode(item) for item in items[1:]], run_filter)\n"
+        "        for fd in fds:\n"
+        "            os.close(fd)\n"
+        "        control.write(\"pid {}\\n\".format(pid))\n"
+        "        status, usage = os.wait4(pid, 0)[1:]\n"
+        "        control.write(\"exit {} {} {} {} {} {} {} {} {} {}\\n\".format(\n"
+        "            status, int(usage.ru_utime * 1000000), int(usage.ru_stime * 1000000), usage.ru_maxrss, usage.ru_minflt,\n"
+        "            usage.ru_majflt, usage.ru_inblock, usage.ru_oublock, usage.ru_nvcsw, usage.ru_nivcsw))\n"
+        "\n"
+        "\n"
+        "main()\n";
+
+static struct zygote zygotes[ZYGOTE_MAX_NUMBER];
+static pid_t zygotes_owner;
+static pthread_mutex_t zygotes_lock = PTHREAD_MUTEX_INITIALIZER;
+
+
+static int append_key(char **key, size_t *length, const char *value) {
+    size_t size = strlen(value) + 1;
+    char *buffer = realloc(*key, *length + size);
+    if (buffer == NULL) {
+        return -1;
+    }
+    memcpy(buffer + *length, value, size);
+    *key = buffer;
+    *length += size;
+    return 0;
+}
+
+
+// everything that is applied to the zygote itself, the per run limits are applied to its children.
+// The submission is part of it: the heap of a zygote holds every source it was sent, freed or not, and a run can
+// read all of it, so a zygote only ever serves the runs of one submission
+static int zygote_key(const struct config *_config, char **key, size_t *length) {
+    char numbers[ZYGOTE_LINE_MAX];
+    struct stat source_stat;
+    int status = 0;
+
+    *key = NULL;
+    *length = 0;
+    snprintf(numbers, sizeof(numbers), "%d %d %ld %d %ld %d", (int) _config->uid, (int) _config->gid,
+             _config->max_stack, _config->max_process_number, _config->max_output_size, _config->cpu_core);
+    status |= append_key(key, length, numbers);
+    status |= append_key(key, length, _config->exe_path);
+    status |= append_key(key, length, _config->chroot_path != NULL ? _config->chroot_path : "");
+    status |= append_key(key, length, _config->seccomp_rule_name != NULL ? _config->seccomp_rule_name : "");
+    for (int i = 0; _config->env[i] != NULL; i++) {
+        status |= append_key(key, length, _config->env[i]);
+    }
+    // a sealed memfd is the same source for as long as it exists, otherwise the source is in args
+    if (_config->source_fd >= 0) {
+        if (fstat(_config->source_fd, &source_stat) != 0) {
+            free(*key);
+            return -1;
+        }
+        snprintf(numbers, sizeof(numbers), "source_fd %lu %lu", (unsigned long) source_stat.st_dev,
+                 (unsigned long) source_stat.st_ino);
+        status |= append_key(key, length, numbers);
+    }
+    else {
+        status |= append_key(key, length, _config->args[2]);
+    }
+    if (status != 0) {
+        free(*key);
+        return -1;
+    }
+    return 0;
+}
+
+
+static int write_all(int fd, const char *data, size_t size) {
+    while (size > 0) {
+        // a zygote that died must not take the judger down with SIGPIPE
+        ssize_t count = send(fd, data, size, MSG_NOSIGNAL);
+        if (count < 0 && errno == EINTR) {
+            continue;
+        }
+        if (count <= 0) {
+            return -1;
+        }
+        data += count;
+        size -= count;
+    }
+    return 0;
+}
+
+
+static int read_line(int fd, char *line, size_t size) {
+    size_t length = 0;
+    while (length + 1 < size) {
+        ssize_t count = read(fd, line + length, 1);
+        if (count < 0 && errno == EINTR) {
+            continue;
+        }
+        if (count <= 0) {
+            return -1;
+        }
+        if (line[length] == '\n') {
+            line[length] = '\0';
+            return 0;
+        }
+        length++;
+    }
+    return -1;
+}
+
+
+static void zygote_stop(struct zygote *_zygote) {
+    if (_zygote->pid > 0) {
+        close(_zygote->fd);
+        kill_pid(_zygote->pid);
+        waitpid(_zygote->pid, NULL, 0);
+    }
+    free(_zygote->key);
+    _zygote->key = NULL;
+    _zygote->pid = 0;
+    _zygote->busy = _zygote->failed = 0;
+}
+
+
+static int send_filter(int fd, const struct sock_fprog *filter) {
+    if (filter == NULL) {
+        return 0;
+    }
+    return write_all(fd, (const char *) filter->filter, filter->len * sizeof(struct sock_filter));
+}
+
+
+static int zygote_start(struct zygote *_zygote, struct logger *log_fp, const struct config *_config) {
+    const struct sock_fprog *zygote_filter = NULL, *run_filter = NULL;
+    struct config zygote_config = *_config;
+    struct child_args _args;
+    char line[ZYGOTE_LINE_MAX];
+    int fds[2];
+    pid_t pid;
+
+    // the zygote loads both filters itself, after its own imports
+    if (_config->seccomp_rule_name != NULL &&
+        ((run_filter = seccomp_rules_get(_config->seccomp_rule_name)) == NULL ||
+         (zygote_filter = seccomp_rules_get_zygote(_config->seccomp_rule_name)) == NULL)) {
+        return -1;
+    }
+    if (socketpair(AF_UNIX, SOCK_STREAM | SOCK_CLOEXEC, 0, fds) != 0) {
+        return -1;
+    }
+
+    zygote_config.args[1] = "-c";
+    zygote_config.args[2] = (char *) ZYGOTE_SOURCE;
+    zygote_config.args[3] = NULL;
+    zygote_config.input_path = zygote_config.error_path = "/dev/null";
+    zygote_config.output_path = NULL;
+    // the limits of a run start counting when it is forked
+    zygote_config.max_cpu_time = zygote_config.max_real_time = UNLIMITED;
+    zygote_config.max_memory = UNLIMITED;
+
+    pid = fork();
+    if (pid < 0) {
+        close(fds[0]);
+        close(fds[1]);
+        return -1;
+    }
+    if (pid == 0) {
+        close(fds[0]);
+        _args.output_fd = fds[1];
+        _args.cgroup_procs_fd = -1;
+        _args.seccomp_filter = NULL;
+        _args.phases_fd = -1;
+        child_process(log_fp, &zygote_config, &_args);
+    }
+    close(fds[1]);
+    _zygote->pid = pid;
+    _zygote->fd = fds[0];
+
+    snprintf(line, sizeof(line), "%zu %zu\n",
+             zygote_filter != NULL ? zygote_filter->len * sizeof(struct sock_filter) : 0,
+             run_filter != NULL ? run_filter->len * sizeof(struct sock_filter) : 0);
+    if (write_all(_zygote->fd, line, strlen(line)) != 0 || send_filter(_zygote->fd, zygote_filter) != 0 ||
+        send_filter(_zygote->fd, run_filter) != 0 ||
+        read_line(_zygote->fd, line, sizeof(line)) != 0 || strcmp(line, "ready") != 0) {
+        LOG_WARNING(log_fp, "Couldn't start a zygote for %s", _config->exe_path);
+        close(_zygote->fd);
+        kill_pid(pid);
+        waitpid(pid, NULL, 0);
+        _zygote->pid = 0;
+        return -1;
+    }
+    LOG_DEBUG(log_fp, "Started zygote %d for %s", pid, _config->exe_path);
+    return 0;
+}
+
+
+// a zygote started with the settings of the config, NULL when the run has to be started the usual way
+struct zygote *zygote_acquire(struct logger *log_fp, const struct config *_config) {
+    struct zygote *_zygote = NULL;
+    char *key;
+    size_t key_length;
+    int i;
+
+    if (zygote_key(_config, &key, &key_length) != 0) {
+        return NULL;
+    }
+    pthread_mutex_lock(&zygotes_lock);
+    // a forked copy of the judger must not share the zygotes of its parent
+    if (zygotes_owner != getpid()) {
+        for (i = 0; i < ZYGOTE_MAX_NUMBER; i++) {
+            if (zygotes[i].pid > 0) {
+                close(zygotes[i].fd);
+            }
+            free(zygotes[i].key);
+            memset(&zygotes[i], 0, sizeof(struct zygote));
+        }
+        zygotes_owner = getpid();
+    }
+    for (i = 0; i < ZYGOTE_MAX_NUMBER; i++) {
+        if (zygotes[i].key != NULL && !zygotes[i].busy && zygotes[i].key_length == key_length &&
+            memcmp(zygotes[i].key, key, key_length) == 0) {
+            break;
+        }
+    }
+    if (i < ZYGOTE_MAX_NUMBER) {
+        if (!zygotes[i].failed) {
+            _zygote = &zygotes[i];
+            _zygote->busy = 1;
+        }
+        pthread_mutex_unlock(&zygotes_lock);
+        free(key);
+        return _zygote;
+    }
+    // a free slot, or the first idle zygote of other settings
+    for (i = 0; i < ZYGOTE_MAX_NUMBER && zygotes[i].key != NULL; i++);
+    if (i == ZYGOTE_MAX_NUMBER) {
+        for (i = 0; i < ZYGOTE_MAX_NUMBER && zygotes[i].busy; i++);
+    }
+    if (i == ZYGOTE_MAX_NUMBER) {
+        pthread_mutex_unlock(&zygotes_lock);
+        free(key);
+        return NULL;
+    }
+    _zygote = &zygotes[i];
+    zygote_stop(_zygote);
+    _zygote->key = key;
+    _zygote->key_length = key_length;
+    _zygote->busy = 1;
+    pthread_mutex_unlock(&zygotes_lock);
+
+    // started outside of the lock, other runs go on meanwhile
+    if (zygote_start(_zygote, log_fp, _config) != 0) {
+        pthread_mutex_lock(&zygotes_lock);
+        _zygote->failed = 1;
+        _zygote->busy = 0;
+        pthread_mutex_unlock(&zygotes_lock);
+        return NULL;
+    }
+    return _zygote;
+}
+
+
+static int open_run_file(const struct config *_config, const char *path, int flags) {
+    char jailed_path[PATH_MAX];
+    // the zygote gets the files, it may not open them itself
+    if (path == NULL) {
+        return open("/dev/null", flags | O_CLOEXEC, 0666);
+    }
+    if (_config->chroot_path != NULL) {
+        if (snprintf(jailed_path, sizeof(jailed_path), "%s/%s", _config->chroot_path, path) >= (int) sizeof(jailed_path)) {
+            return -1;
+        }
+        path = jailed_path;
+    }
+    return open(path, flags | O_CLOEXEC, 0666);
+}
+
+
+static int send_files(int fd, const char *header, const int files[3]) {
+    struct msghdr message;
+    struct iovec data;
+    struct cmsghdr *control;
+    char buffer[CMSG_SPACE(sizeof(int) * 3)];
+
+    memset(&message, 0, sizeof(message));
+    memset(buffer, 0, sizeof(buffer));
+    data.iov_base = (void *) header;
+    data.iov_len = strlen(header);
+    message.msg_iov = &data;
+    message.msg_iovlen = 1;
+    message.msg_control = buffer;
+    message.msg_controllen = sizeof(buffer);
+    control = CMSG_FIRSTHDR(&message);
+    control->cmsg_level = SOL_SOCKET;
+    control->cmsg_type = SCM_RIGHTS;
+    control->cmsg_len = CMSG_LEN(sizeof(int) * 3);
+    memcpy(CMSG_DATA(control), files, sizeof(int) * 3);
+
+    while (1) {
+        ssize_t count = sendmsg(fd, &message, MSG_NOSIGNAL);
+        if (count < 0 && errno == EINTR) {
+            continue;
+        }
+        if (count < 0) {
+            return -1;
+        }
+        // the files went with the first byte, the rest is plain data
+        return write_all(fd, header + count, data.iov_len - count);
+    }
+}
+
+
+// the whole content of fd from its start, NULL on failure; the caller frees it
+static char *read_source(int fd, size_t *length) {
+    size_t capacity = 4096;
+    char *source = malloc(capacity), *buffer;
+    ssize_t count;
+
+    *length = 0;
+    while (source != NULL) {
+        count = pread(fd, source + *length, capacity - *length, (off_t) *length);
+        if (count < 0 && errno == EINTR) {
+            continue;
+        }
+        if (count < 0) {
+            free(source);
+            return NULL;
+        }
+        if (count == 0) {
+            break;
+        }
+        *length += count;
+        if (*length == capacity) {
+            capacity *= 2;
+            if ((buffer = realloc(source, capacity)) == NULL) {
+                free(source);
+            }
+            source = buffer;
+        }
+    }
+    return source;
+}
+
+
+// forks the run from the zygote, returns the pid of the child or -1
+pid_t zygote_spawn(struct zygote *_zygote, const struct config *_config) {
+    char header[ARGS_MAX_NUMBER * 24], line[ZYGOTE_LINE_MAX];
+    int files[3] = {-1, -1, -1};
+    int cpu_time = 0, length, i, status = -1;
+    long memory = 0;
+    char *source = NULL;
+    size_t source_length;
+    pid_t pid;
+
+    // args[2] is the stub of a source_fd, the zygote gets the source itself
+    if (_config->source_fd >= 0) {
+        if ((source = read_source(_config->source_fd, &source_length)) == NULL) {
+            return -1;
+        }
+    }
+    else {
+        source = _config->args[2];
+        source_length = strlen(source);
+    }
+
+    // the same limits child_process sets, for the child alone
+    if (_config->max_cpu_time != UNLIMITED) {
+        cpu_time = (_config->max_cpu_time + 1000) / 1000;
+    }
+    if (_config->memory_limit_check_only == 0 && _config->max_memory != UNLIMITED) {
+        memory = _config->max_memory * 2;
+    }
+    length = snprintf(header, sizeof(header), "%d %ld %zu", cpu_time, memory, source_length);
+    for (i = 3; _config->args[i] != NULL; i++) {
+        length += snprintf(header + length, sizeof(header) - length, " %zu", strlen(_config->args[i]));
+    }
+    header[length++] = '\n';
+    header[length] = '\0';
+
+    if (_config->input_fd >= 0) {
+        files[0] = fcntl(_config->input_fd, F_DUPFD_CLOEXEC, 0);
+    }
+    else {
+        files[0] = open_run_file(_config, _config->input_path, O_RDONLY);
+    }
+    files[1] = open_run_file(_config, _config->output_path, O_WRONLY | O_CREAT | O_TRUNC);
+    // if outfile and error_file is the same path, we use the same file
+    if (_config->error_path != NULL && _config->output_path != NULL &&
+        strcmp(_config->output_path, _config->error_path) == 0) {
+        files[2] = dup(files[1]);
+    }
+    else {
+        files[2] = open_run_file(_config, _config->error_path, O_WRONLY | O_CREAT | O_TRUNC);
+    }
+
+    if (files[0] >= 0 && files[1] >= 0 && files[2] >= 0 && send_files(_zygote->fd, header, files) == 0) {
+        status = write_all(_zygote->fd, source, source_length);
+        for (i = 3; _config->args[i] != NULL && status == 0; i++) {
+            status = write_all(_zygote->fd, _config->args[i], strlen(_config->args[i]));
+        }
+    }
+    for (i = 0; i < 3; i++) {
+        if (files[i] >= 0) {
+            close(files[i]);
+        }
+    }
+    if (_config->source_fd >= 0) {
+        free(source);
+    }
+    // the source is compiled before the fork, a zygote still compiling after max_real_time is given up
+    struct pollfd readable = {_zygote->fd, POLLIN, 0};
+    if (status != 0 || poll(&readable, 1, _config->max_real_time) <= 0 ||
+        read_line(_zygote->fd, line, sizeof(line)) != 0 || sscanf(line, "pid %d", &pid) != 1 || pid <= 0) {
+        return -1;
+    }
+    return pid;
+}
+
+
+// waits for the status of the run, killing it when it is over a limit; the zygote reaps it
+int zygote_wait(struct zygote *_zygote, struct watchdog *_watchdog, int *status, struct rusage *resource_usage) {
+    char line[ZYGOTE_LINE_MAX];
+    long long user_time, system_time;
+
+    memset(resource_usage, 0, sizeof(struct rusage));
+    if (watchdog_wait_fd(_watchdog, _zygote->fd) < 0 || read_line(_zygote->fd, line, sizeof(line)) != 0 ||
+        sscanf(line, "exit %d %lld %lld %ld %ld %ld %ld %ld %ld %ld", status, &user_time, &system_time,
+               &resource_usage->ru_maxrss, &resource_usage->ru_minflt, &resource_usage->ru_majflt,
+               &resource_usage->ru_inblock, &resource_usage->ru_oublock, &resource_usage->ru_nvcsw,
+               &resource_usage->ru_nivcsw) != 10) {
+        kill_pid(_watchdog->pid);
+        return -1;
+    }
+    resource_usage->ru_utime.tv_sec = user_time / 1000000;
+    resource_usage->ru_utime.tv_usec = user_time % 1000000;
+    resource_usage->ru_stime.tv_sec = system_time / 1000000;
+    resource_usage->ru_stime.tv_usec = system_time % 1000000;
+    return 0;
+}
+
+
+void zygote_release(struct zygote *_zygote, int broken) {
+    pthread_mutex_lock(&zygotes_lock);
+    if (broken) {
+        // the next run with these settings starts a new one
+        zygote_stop(_zygote);
+    }
+    _zygote->busy = 0;
+    pthread_mutex_unlock(&zygotes_lock);
+}
@@ -0,0 +1,38 @@
+#ifndef JUDGER_ZYGOTE_H
+#define JUDGER_ZYGOTE_H
+
+#include <stdio.h>
+#include <sys/types.h>
+#include <sys/resource.h>
+#include "definitions.h"
+#include "killer.h"
+#include "logger.h"
+
+// warm interpreters kept per process, one for every submission and set of settings in use
+#define ZYGOTE_MAX_NUMBER 8
+#define ZYGOTE_LINE_MAX 256
+
+// a sandboxed python interpreter, started once, that forks one child for every run of "-c <source>"
+struct zygote {
+    // 0 for a free slot
+    pid_t pid;
+    // unix socket to the zygote, it receives the files of a run and reports the pid and the status of the child
+    int fd;
+    int busy;
+    // the zygote could not be started with these settings, runs with them are not forked any more
+    int failed;
+    // the settings the zygote was started with, see zygote_key
+    char *key;
+    size_t key_length;
+};
+
+
+struct zygote *zygote_acquire(struct logger *log_fp, const struct config *_config);
+
+pid_t zygote_spawn(struct zygote *_zygote, const struct config *_config);
+
+int zygote_wait(struct zygote *_zygote, struct watchdog *_watchdog, int *status, struct rusage *resource_usage);
+
+void zygote_release(struct zygote *_zygote, int broken);
+
+#endif //JUDGER_ZYGOTE_H
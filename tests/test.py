@@ -6,5 +6,9 @@ from unittest import TestCase, main
 from testcase.integration.test import IntegrationTest
 from testcase.seccomp.test import SeccompTest
 from testcase.python.test import PythonTest
+from testcase.compile_cache.test import CompileCacheTest
+from testcase.workspace_pool.test import WorkspacePoolTest
+from testcase.data_store.test import DataStoreTest
+from testcase.case_stats.test import CaseStatsTest
 
 main()
@@ -0,0 +1,35 @@
+#include <stdio.h>
+#include <string.h>
+
+// 0 when the output is the answer, 1 when it is not, 3 when the answer is "fail"
+int check(const char *output_path, const char *answer_path) {
+    char output[1024] = {0}, answer[1024] = {0};
+    FILE *f;
+    if ((f = fopen(output_path, "r")) == NULL) {
+        return 3;
+    }
+    fread(output, 1, sizeof(output) - 1, f);
+    fclose(f);
+    if ((f = fopen(answer_path, "r")) == NULL) {
+        return 3;
+    }
+    fread(answer, 1, sizeof(answer) - 1, f);
+    fclose(f);
+    if (strcmp(answer, "fail") == 0) {
+        return 3;
+    }
+    return strcmp(output, answer) == 0 ? 0 : 1;
+}
+
+int main(int argc, char *argv[]) {
+    char input_path[256], output_path[256], answer_path[256];
+    if (argc == 4) {
+        return check(argv[2], argv[3]);
+    }
+    // persistent, three paths per case on stdin
+    while (scanf("%255s %255s %255s", input_path, output_path, answer_path) == 3) {
+        printf("%d\n", check(output_path, answer_path));
+        fflush(stdout);
+    }
+    return 0;
+}
@@ -0,0 +1,22 @@
+#include <stdio.h>
+
+// finds the number of the interactor by bisection, or always guesses 1 with an argument
+int main(int argc, char *argv[]) {
+    int low = 1, high = 1000000, guess;
+    char answer[2];
+    while (low <= high) {
+        guess = argc > 1 ? 1 : (low + high) / 2;
+        printf("%d\n", guess);
+        fflush(stdout);
+        if (scanf("%1s", answer) != 1 || answer[0] == '=') {
+            break;
+        }
+        if (answer[0] == '<') {
+            low = guess + 1;
+        }
+        else {
+            high = guess - 1;
+        }
+    }
+    return 0;
+}
@@ -0,0 +1,25 @@
+#include <stdio.h>
+
+// guess the number of the input file in 20 tries, answered with <, > or =
+int main(int argc, char *argv[]) {
+    int secret, guess, tries = 0;
+    FILE *f = fopen(argv[1], "r");
+    if (f == NULL || fscanf(f, "%d", &secret) != 1) {
+        return 3;
+    }
+    fclose(f);
+    while (tries < 20 && scanf("%d", &guess) == 1) {
+        tries++;
+        if (guess == secret) {
+            printf("=\n");
+            fflush(stdout);
+            f = fopen(argv[2], "w");
+            fprintf(f, "%d\n", tries);
+            fclose(f);
+            return 0;
+        }
+        printf("%s\n", guess < secret ? "<" : ">");
+        fflush(stdout);
+    }
+    return 1;
+}
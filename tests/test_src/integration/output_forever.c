@@ -0,0 +1,7 @@
+#include <stdio.h>
+int main() {
+    while (1) {
+        printf("A\n");
+    }
+    return 0;
+}
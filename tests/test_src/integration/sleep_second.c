@@ -0,0 +1,6 @@
+#include <unistd.h>
+
+int main(int argc, char *argv[]) {
+    sleep(1);
+    return 0;
+}
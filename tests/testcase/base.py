@@ -2,10 +2,13 @@
 from __future__ import print_function
 import os
 import random
-import shutil
 import copy
 from unittest import TestCase
 
+from .compiler import CompileCache, CompileError
+from .datastore import DataStore
+from .workspace import WorkspacePool
+
 
 class RunResult(object):
     cpu_time_limited = 1
@@ -18,37 +21,38 @@ class RunResult(object):
 class BaseTestCase(TestCase):
     BAD_SYSTEM_CALL = 31
     CHROOT_DIR = "/home/adelaly/Desktop/python-jail"
+    compile_cache = None
+    data_store = None
+    workspace_pools = {}
 
     def init_workspace(self, language):
-        base_workspace = os.path.join(self.CHROOT_DIR, "tmp")
-        workspace = os.path.join(base_workspace, language)
-        shutil.rmtree(workspace, ignore_errors=True)
-        os.makedirs(workspace)
+        # an empty directory from the pool of the language, it goes back once the test is done
+        if language not in self.workspace_pools:
+            self.workspace_pools[language] = WorkspacePool(os.path.join(self.CHROOT_DIR, "tmp", language))
+        pool = self.workspace_pools[language]
+        workspace = pool.acquire()
+        self.addCleanup(pool.release, workspace)
         return workspace
 
-    def tearDown(self):
-        shutil.rmtree(self.workspace, ignore_errors=True)
-
     def rand_str(self):
         return "".join([random.choice("123456789abcdefghijklmn") for _ in range(12)])
 
     def _compile_c(self, src_name, extra_flags=None):
-        exe_path = os.path.join(self.workspace, src_name.split("/")[-1].split(".")[0])
-        flags = " "
-        if extra_flags:
-            flags += " ".join(extra_flags)
-        cmd = ("gcc {0} -g -O0 -static -o {1}" + flags).format(self.get_file_absolute_path(src_name), exe_path)
-        if os.system(cmd):
-            raise AssertionError("compile error, cmd: {0}".format(cmd))
-        return self.get_path_relative_to_chroot(exe_path)
+        return self._compile("gcc", src_name, ["-g", "-O0", "-static"] + (extra_flags or []))
 
     def _compile_cpp(self, src_name):
-        exe_path = os.path.join(self.workspace, src_name.split("/")[-1].split(".")[0])
-        cmd = "g++ {0} -g -O0 -o {1}".format(self.get_file_absolute_path(src_name), exe_path)
-        if os.system(cmd):
-            raise AssertionError("compile error, cmd: {0}".format(cmd))
-        return self.get_path_relative_to_chroot(exe_path)
-    
+        return self._compile("g++", src_name, ["-g", "-O0"])
+
+    def _compile(self, compiler, src_name, flags):
+        # shared by every test, an unchanged source is not compiled again
+        if BaseTestCase.compile_cache is None:
+            BaseTestCase.compile_cache = CompileCache(os.path.join(self.CHROOT_DIR, "tmp", "compile_cache"),
+                                                      chroot_path=self.CHROOT_DIR)
+        try:
+            return self.compile_cache.compile(self.get_file_absolute_path(src_name), compiler, flags)
+        except CompileError as e:
+            raise AssertionError("compile error, {0}".format(e))
+
     def get_file_absolute_path(self, src_name):
         path = os.path.dirname(os.path.abspath(__file__))
         return os.path.join(path, src_name)
@@ -57,10 +61,11 @@ class BaseTestCase(TestCase):
         return "/" + os.path.relpath(path, self.CHROOT_DIR)
 
     def make_input(self, content):
-        path = os.path.join(self.workspace, self.rand_str())
-        with open(path, "w") as f:
-            f.write(content)
-        return path
+        # read-only and shared by every test, the same content is stored once
+        if BaseTestCase.data_store is None:
+            BaseTestCase.data_store = DataStore(os.path.join(self.CHROOT_DIR, "tmp", "data_store"),
+                                                chroot_path=self.CHROOT_DIR)
+        return self.data_store.path(self.data_store.add(content))
 
     def output_path(self):
         return os.path.join(self.workspace, self.rand_str())
@@ -0,0 +1,61 @@
+# coding=utf-8
+from __future__ import print_function, absolute_import
+import timeit
+import os
+
+from .. import base, judger
+from ..casestats import CaseStats
+
+
+class CaseStatsTest(base.BaseTestCase):
+    def setUp(self):
+        print("Running", self._testMethodName)
+        self.workspace = self.init_workspace("case_stats")
+        self.startTime = timeit.default_timer()
+
+    def tearDown(self):
+        print("Time: ", timeit.default_timer() - self.startTime)
+
+    def _result(self, cpu_time, result=judger.RESULT_SUCCESS):
+        return {"cpu_time": cpu_time, "result": result, "error": 0}
+
+    def test_order(self):
+        path = os.path.join(self.workspace, "stats.json")
+        stats = CaseStats(path)
+        # nothing known yet, the given order
+        self.assertEqual(stats.order("a", 4), [0, 1, 2, 3])
+
+        stats.record("a", [self._result(10), self._result(10), self._result(10, judger.RESULT_WRONG_ANSWER)])
+        stats.record("a", [self._result(10), self._result(10), self._result(10, judger.RESULT_WRONG_ANSWER)])
+        stats.record("a", [self._result(10), self._result(2), self._result(10), self._result(10)])
+        # the case that rejects most, then the cheap one, then the ones without history at the average time
+        self.assertEqual(stats.order("a", 5), [2, 1, 4, 0, 3])
+        self.assertEqual(stats.order("b", 2), [0, 1])
+
+        # kept in the file
+        self.assertEqual(CaseStats(path).order("a", 5), [2, 1, 4, 0, 3])
+        self.assertEqual(os.listdir(self.workspace), ["stats.json"])
+
+    def test_run_batch(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("../test_src/integration/normal.c")
+        del config["input_path"], config["output_path"]
+        cases = [{"input_path": self.get_path_relative_to_chroot(self.make_input(str(i))),
+                  "output_path": self.get_path_relative_to_chroot(self.output_path())} for i in range(5)]
+        stats = CaseStats()
+
+        results = stats.run_batch("normal", cases, **config)
+        self.assertEqual([result["result"] for result in results], [judger.RESULT_SUCCESS] * 5)
+
+        # the last case used to be the one failing, it runs first and fails, then so does an earlier one
+        for _ in range(3):
+            stats.record("normal", [self._result(1)] * 4 + [self._result(1, judger.RESULT_WRONG_ANSWER)])
+        self.assertEqual(stats.order("normal", 5)[0], 4)
+        cases[1]["input_path"] = cases[4]["input_path"] = "/nonexistent"
+        expected = judger.run_batch(cases, stop_on_failure=True, **config)
+        results = stats.run_batch("normal", cases, **config)
+        self.assertEqual(len(results), 2)
+        self.assertEqual([(result["result"], result["error"]) for result in results],
+                         [(result["result"], result["error"]) for result in expected])
+        # the first failure in the given order is the one recorded
+        self.assertEqual(stats.order("normal", 5)[:2], [4, 1])
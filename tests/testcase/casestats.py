@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import threading
+
+from . import judger
+
+
+class CaseStats(object):
+    """
+        How often each case of a problem was the first one to fail, and how much cpu time it takes, over the
+        submissions judged so far. run_batch() uses them to run the cases of a new submission likely failing and
+        cheap ones first, so a wrong submission is usually rejected by its first few runs, while its results are
+        still the ones of a stop_on_failure batch in the given order.
+        Kept in memory, or in the JSON file at path, which one process at a time may use.
+    """
+
+    # how much the last run of a case counts in its cpu time
+    TIME_WEIGHT = 0.25
+
+    def __init__(self, path=None):
+        self.path = path and os.path.abspath(path)
+        self._problems = {}
+        self._lock = threading.Lock()
+        if self.path is not None and os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self._problems = json.load(f)
+
+    def order(self, problem, case_count):
+        """
+            The indexes of case_count cases in the order they should run: by the chance of being the first failure
+            per millisecond of cpu time, which for independent cases is the order with the least expected time.
+            Cases without history count as failing once, at the average cpu time; ties keep the given order.
+        """
+        with self._lock:
+            stats = self._problems.get(str(problem), {"submissions": 0, "cases": []})
+            cases = stats["cases"][:case_count]
+            times = [case["cpu_time"] for case in cases if case["cpu_time"] is not None]
+            default_time = sum(times) / len(times) if times else 1
+            cases += [{"first_failures": 0, "cpu_time": None}] * (case_count - len(cases))
+
+            def score(index):
+                case = cases[index]
+                chance = (case["first_failures"] + 1.0) / (stats["submissions"] + 2)
+                cpu_time = default_time if case["cpu_time"] is None else case["cpu_time"]
+                return -chance / max(cpu_time, 1), index
+
+            return sorted(range(case_count), key=score)
+
+    def record(self, problem, results):
+        """Adds a submission judged in the given order, results being the ones of a stop_on_failure batch."""
+        with self._lock:
+            stats = self._problems.setdefault(str(problem), {"submissions": 0, "cases": []})
+            cases = stats["cases"]
+            cases += [{"first_failures": 0, "cpu_time": None} for _ in range(len(results) - len(cases))]
+            stats["submissions"] += 1
+            for case, result in zip(cases, results):
+                if case["cpu_time"] is None:
+                    case["cpu_time"] = result["cpu_time"]
+                else:
+                    case["cpu_time"] += (result["cpu_time"] - case["cpu_time"]) * self.TIME_WEIGHT
+            if judger._failed(results[-1]):
+                cases[len(results) - 1]["first_failures"] += 1
+            if self.path is not None:
+                self._save()
+
+    def run_batch(self, problem, cases, run_batch=judger.run_batch, **kwargs):
+        """
+            Same results as run_batch(cases, stop_on_failure=True, **kwargs), run in the order of order() and
+            recorded. Once a case fails, only the cases before it that did not run yet still run, in a batch
+            of their own; results of the cases after it are dropped. run_batch can be the one of a Session.
+        """
+        if not isinstance(cases, list) or not cases:
+            raise ValueError("cases must be a non-empty list")
+        results = {}
+        first_failure = len(cases)
+        pending = self.order(problem, len(cases))
+        while pending:
+            batch_results = run_batch([cases[index] for index in pending], stop_on_failure=True, **kwargs)
+            if not batch_results:
+                raise ValueError("run_batch returned no result")
+            for index, result in zip(pending, batch_results):
+                results[index] = result
+                if judger._failed(result):
+                    first_failure = index
+            pending = [index for index in pending[len(batch_results):] if index < first_failure]
+
+        results = [results[index] for index in range(min(first_failure + 1, len(cases)))]
+        self.record(problem, results)
+        return results
+
+    def _save(self):
+        # renamed into place, a crash never leaves half a file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=".stats-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._problems, f)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
@@ -0,0 +1,139 @@
+# coding=utf-8
+from __future__ import print_function, absolute_import
+import timeit
+import asyncio
+import threading
+import os
+
+from .. import base, judger
+from ..compiler import CompileCache, CompileError, CompilePool
+
+
+class CompileCacheTest(base.BaseTestCase):
+    def setUp(self):
+        print("Running", self._testMethodName)
+        self.workspace = self.init_workspace("cache")
+        self.root = os.path.join(self.workspace, "cache")
+        self.startTime = timeit.default_timer()
+
+    def tearDown(self):
+        print("Time: ", timeit.default_timer() - self.startTime)
+
+    def source(self, name):
+        return self.get_file_absolute_path("../test_src/integration/" + name)
+
+    def test_hit(self):
+        cache = CompileCache(self.root)
+        exe_path = cache.compile(self.source("normal.c"))
+        mtime = os.stat(exe_path).st_mtime_ns
+        self.assertEqual(cache.compile(self.source("normal.c")), exe_path)
+        # the same executable, not a new one
+        self.assertEqual(os.stat(exe_path).st_ino, os.stat(cache.compile(self.source("normal.c"))).st_ino)
+        self.assertGreaterEqual(os.stat(exe_path).st_mtime_ns, mtime)
+        self.assertEqual(len(cache.entries()), 1)
+
+    def test_flags(self):
+        cache = CompileCache(self.root)
+        exe_path = cache.compile(self.source("normal.c"), flags=["-O0"])
+        self.assertNotEqual(cache.compile(self.source("normal.c"), flags=["-O2"]), exe_path)
+        self.assertNotEqual(cache.compile(self.source("normal.c"), compiler="g++", flags=["-O0", "-x", "c"]),
+                            exe_path)
+        self.assertEqual(len(cache.entries()), 3)
+
+    def test_chroot_path(self):
+        cache = CompileCache(self.root, chroot_path=self.workspace)
+        exe_path = cache.compile(self.source("normal.c"))
+        self.assertTrue(exe_path.startswith("/cache/"))
+        self.assertTrue(os.path.exists(os.path.join(self.workspace, exe_path[1:])))
+
+    def test_compile_error(self):
+        cache = CompileCache(self.root)
+        with self.assertRaises(CompileError) as context:
+            cache.compile(self.get_file_absolute_path("../test_src/python/ok.py"), flags=["-x", "c"])
+        self.assertNotEqual(context.exception.returncode, 0)
+        self.assertEqual(cache.entries(), [])
+
+    def test_evict(self):
+        cache = CompileCache(self.root, max_size=1)
+        first = cache.compile(self.source("normal.c"))
+        second = cache.compile(self.source("args.c"))
+        # the newest one stays even when it alone is over max_size
+        self.assertFalse(os.path.exists(first))
+        self.assertTrue(os.path.exists(second))
+        self.assertEqual(len(cache.entries()), 1)
+
+        cache.max_size = 1 << 30
+        normal = cache.compile(self.source("normal.c"))
+        os.utime(second, (1, 1))
+        cache.max_size = os.stat(second).st_size + os.stat(normal).st_size
+        third = cache.compile(self.source("env.c"))
+        # the least recently used one goes first
+        self.assertFalse(os.path.exists(second))
+        self.assertTrue(os.path.exists(third))
+
+    def test_concurrent(self):
+        results = []
+
+        def compile_normal():
+            results.append(CompileCache(self.root).compile(self.source("normal.c")))
+
+        threads = [threading.Thread(target=compile_normal) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(CompileCache(self.root).entries()), 1)
+
+    def test_pool(self):
+        with open(os.path.join(self.workspace, "error.c"), "w") as f:
+            f.write("int main( {")
+        submissions = [{"source_path": self.source("normal.c"), "flags": ["-static"]},
+                       {"source_path": os.path.join(self.workspace, "error.c")},
+                       {"source_path": self.source("args.c"), "flags": ["-static"]}]
+        pool = CompilePool(CompileCache(self.root, chroot_path=self.CHROOT_DIR), workers=2)
+        started = []
+
+        async def run(index, exe_path):
+            started.append(index)
+            config = self.base_config
+            config["exe_path"] = exe_path
+            return await judger.run_async(**config)
+
+        async def collect():
+            return dict([item async for item in pool.pipeline(submissions, run)])
+
+        loop = asyncio.new_event_loop()
+        results = loop.run_until_complete(collect())
+        self.assertEqual(sorted(started), [0, 2])
+        self.assertEqual(results[0]["result"], judger.RESULT_SUCCESS)
+        self.assertEqual(results[2]["result"], judger.RESULT_SUCCESS)
+        self.assertIsInstance(results[1], CompileError)
+        self.assertIn("error", results[1].output)
+        # compiled as uid 65534, cached as ours
+        exe_stat = os.stat(pool.cache.path(self.source("normal.c"), flags=["-static"]))
+        self.assertEqual((exe_stat.st_uid, exe_stat.st_gid), (os.getuid(), os.getgid()))
+        self.assertEqual(exe_stat.st_mode & 0o777, 0o755)
+
+        # the pool shares the cache, so this one is not compiled again
+        exe_path = loop.run_until_complete(pool.compile(self.source("normal.c"), flags=["-static"]))
+        self.assertEqual(exe_path, pool.cache.compile(self.source("normal.c"), flags=["-static"]))
+        loop.close()
+
+    def test_pool_limits(self):
+        # expands to 10 ** 12 declarations
+        with open(os.path.join(self.workspace, "bomb.c"), "w") as f:
+            f.write("#define A(x) x x x x x x x x x x\n"
+                    "#define B(x) A(A(A(A(A(A(x))))))\n"
+                    "int main() {B(B(int a;))}\n")
+        pool = CompilePool(CompileCache(self.root, chroot_path=self.CHROOT_DIR), max_cpu_time=1000,
+                           max_memory=256 * 1024 * 1024)
+        loop = asyncio.new_event_loop()
+        start = timeit.default_timer()
+        with self.assertRaises(CompileError) as context:
+            loop.run_until_complete(pool.compile(os.path.join(self.workspace, "bomb.c")))
+        self.assertTrue(timeit.default_timer() - start < 3)
+        self.assertIsNotNone(context.exception.result)
+        self.assertEqual(pool.cache.entries(), [])
+        loop.close()
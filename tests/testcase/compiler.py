@@ -0,0 +1,250 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+
+from . import judger
+
+
+class CompileError(Exception):
+    def __init__(self, returncode, output, result=None):
+        super(CompileError, self).__init__("compiler exited with {}: {}".format(returncode, output))
+        self.returncode = returncode
+        self.output = output
+        # the judger result of a sandboxed compile, it tells a limit that was exceeded
+        self.result = result
+
+
+class CompileCache(object):
+    """
+        Executables stored under root by the hash of their source, compiler and flags, so identical
+        submissions and rejudges are compiled once. Using or adding an entry makes it the most recent one,
+        the least recently used ones are removed once the cache is over max_size bytes.
+        Several threads or processes may share root, a key is compiled by one of them while the others wait.
+        Keep root inside chroot_path and compile() returns paths relative to it, ready for judger.run().
+    """
+
+    def __init__(self, root, max_size=512 * 1024 * 1024, chroot_path=None):
+        self.root = os.path.abspath(root)
+        self.max_size = max_size
+        self.chroot_path = chroot_path and os.path.abspath(chroot_path)
+        os.makedirs(self.root, mode=0o755, exist_ok=True)
+
+    def key(self, source, compiler, flags):
+        """The hash of an entry, the compiler binary itself is part of it so an upgrade invalidates the cache."""
+        digest = hashlib.sha256()
+        compiler_path = _which(compiler)
+        if compiler_path is not None:
+            stat = os.stat(compiler_path)
+            compiler = "{} {} {}".format(compiler_path, stat.st_size, stat.st_mtime_ns)
+        for item in [compiler] + list(flags):
+            digest.update(item.encode("utf-8"))
+            digest.update(b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def path(self, source_path, compiler="gcc", flags=None):
+        """Where the executable of source_path is (or will be) stored."""
+        with open(source_path, "rb") as f:
+            key = self.key(f.read(), compiler, list(flags or []))
+        return os.path.join(self.root, key[:2], key)
+
+    def compile(self, source_path, compiler="gcc", flags=None):
+        """Returns the executable of source_path, compiled with "<compiler> <source_path> <flags> -o <exe>"."""
+        flags = list(flags or [])
+        exe_path = self.path(source_path, compiler, flags)
+        if not self._touch(exe_path):
+            with self._lock(exe_path):
+                # whoever held the lock may have compiled it meanwhile
+                if not self._touch(exe_path):
+                    self._build(source_path, compiler, flags, exe_path)
+                    self.evict(keep=exe_path)
+        return self._result_path(exe_path)
+
+    def _lock(self, exe_path):
+        """The open lock file of an entry, held until it is closed."""
+        os.makedirs(os.path.dirname(exe_path), mode=0o755, exist_ok=True)
+        lock = open(exe_path + ".lock", "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        except BaseException:
+            lock.close()
+            raise
+        return lock
+
+    def _build(self, source_path, compiler, flags, exe_path):
+        # renamed into place once complete, a reader never sees half an executable
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(exe_path), prefix=".build-")
+        os.close(fd)
+        try:
+            proc = subprocess.run([compiler, source_path] + flags + ["-o", temp_path],
+                                  stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            if proc.returncode != 0:
+                raise CompileError(proc.returncode, proc.stdout.decode("utf-8", "replace"))
+            os.chmod(temp_path, 0o755)
+            os.rename(temp_path, exe_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def _touch(self, exe_path):
+        """Marks an entry as used, False when it is not cached."""
+        try:
+            os.utime(exe_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _result_path(self, exe_path):
+        if self.chroot_path is None:
+            return exe_path
+        return "/" + os.path.relpath(exe_path, self.chroot_path)
+
+    def entries(self):
+        """(mtime, size, path) of every cached executable."""
+        entries = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".lock") or name.startswith(".build-"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self, keep=None):
+        """Removes the least recently used executables until the cache fits in max_size."""
+        entries = sorted(self.entries())
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            if path == keep:
+                continue
+            # the empty lock file stays, a compile of the same key may be holding it
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+
+class CompilePool(object):
+    """
+        Compiles through the judger, under the "compile" seccomp rule and the limits given here, with at most
+        `workers` (default: one per cpu) compilers at once. Executables go to the cache like CompileCache.compile(),
+        whose root must be inside its chroot_path, and the compiler must be at the same path inside the chroot.
+        pipeline() hands every executable to the runs as soon as it is ready, so compiling the next submissions
+        overlaps running the previous ones.
+    """
+
+    def __init__(self, cache, workers=None, max_cpu_time=10000, max_real_time=30000, max_memory=1024 * 1024 * 1024,
+                 max_stack=64 * 1024 * 1024, max_output_size=128 * 1024 * 1024, max_process_number=judger.UNLIMITED,
+                 uid=65534, gid=65534, log_path="/dev/null", **kwargs):
+        if cache.chroot_path is None:
+            raise ValueError("the cache of a CompilePool needs a chroot_path")
+        self.cache = cache
+        self.workers = workers or os.cpu_count() or 1
+        # anything else judger.run() takes, cgroup_path for example
+        self.config = dict(kwargs, max_cpu_time=max_cpu_time, max_real_time=max_real_time, max_memory=max_memory,
+                           max_stack=max_stack, max_output_size=max_output_size,
+                           max_process_number=max_process_number, uid=uid, gid=gid, log_path=log_path,
+                           chroot_path=cache.chroot_path, seccomp_rule_name="compile")
+        self._semaphore = None
+
+    async def compile(self, source_path, compiler="gcc", flags=None):
+        """Coroutine version of CompileCache.compile(), raises CompileError when the compile fails or is killed."""
+        flags = list(flags or [])
+        exe_path = self.cache.path(source_path, compiler, flags)
+        if self.cache._touch(exe_path):
+            return self.cache._result_path(exe_path)
+        # created here, an asyncio.Semaphore must belong to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            with await loop.run_in_executor(None, self.cache._lock, exe_path):
+                if not self.cache._touch(exe_path):
+                    await self._build(source_path, compiler, flags, exe_path)
+                    self.cache.evict(keep=exe_path)
+        return self.cache._result_path(exe_path)
+
+    async def _build(self, source_path, compiler, flags, exe_path):
+        # the compiler only writes to a directory of its own, the executable is moved into place afterwards
+        build_path = tempfile.mkdtemp(dir=os.path.dirname(exe_path), prefix=".build-")
+        try:
+            os.chown(build_path, self.config["uid"], self.config["gid"])
+            # the extension tells the compiler the language
+            build_source_path = os.path.join(build_path, "source" + os.path.splitext(source_path)[1])
+            build_exe_path = os.path.join(build_path, "exe")
+            output_path = os.path.join(build_path, "output")
+            shutil.copyfile(source_path, build_source_path)
+
+            compiler_path = _which(compiler) or compiler
+            config = dict(self.config, exe_path=compiler_path,
+                          args=[self.cache._result_path(build_source_path)] + flags +
+                               ["-o", self.cache._result_path(build_exe_path)],
+                          env=["PATH=" + os.defpath, "TMPDIR=" + self.cache._result_path(build_path)],
+                          input_path="/dev/null",
+                          output_path=self.cache._result_path(output_path),
+                          error_path=self.cache._result_path(output_path))
+            result = await judger.run_async(**config)
+            output = ""
+            if os.path.exists(output_path):
+                with open(output_path, "rb") as f:
+                    output = f.read(64 * 1024).decode("utf-8", "replace")
+            if result["result"] != judger.RESULT_SUCCESS or result["exit_code"] != 0:
+                raise CompileError(result["exit_code"], output, result)
+            self._commit(build_exe_path, exe_path)
+        finally:
+            shutil.rmtree(build_path, ignore_errors=True)
+
+    def _commit(self, build_exe_path, exe_path):
+        # copied into a file of our own, the compile uid keeps no way to change the executables of the cache.
+        # build_exe_path was written by that uid, it is not followed if it is a symlink
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(exe_path), prefix=".exe-")
+        try:
+            with os.fdopen(fd, "wb") as target, \
+                    open(build_exe_path, "rb", opener=lambda path, flags: os.open(path, flags | os.O_NOFOLLOW)) as source:
+                shutil.copyfileobj(source, target)
+            os.chmod(temp_path, 0o755)
+            os.rename(temp_path, exe_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    async def pipeline(self, submissions, run):
+        """
+            Compiles every submission, a {"source_path", "compiler", "flags"} dict, and awaits run(index, exe_path)
+            for each one as soon as it is compiled. Yields (index, result) pairs in the order they complete, the
+            result being what run returned or the CompileError of the submission.
+            Closing or cancelling the generator cancels the compiles and runs that are still in flight.
+        """
+        async def judge_one(index, submission):
+            try:
+                exe_path = await self.compile(**submission)
+            except CompileError as e:
+                return index, e
+            return index, await run(index, exe_path)
+
+        async for item in judger._as_completed([judge_one(index, submission)
+                                                for index, submission in enumerate(submissions)]):
+            yield item
+
+
+def _which(command):
+    if os.sep in command:
+        return command if os.path.exists(command) else None
+    for directory in os.environ.get("PATH", os.defpath).split(os.pathsep):
+        path = os.path.join(directory, command)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return os.path.realpath(path)
+    return None
@@ -0,0 +1,81 @@
+# coding=utf-8
+from __future__ import print_function, absolute_import
+import timeit
+import os
+import stat
+
+from .. import base, judger
+from ..datastore import DataStore
+
+
+class DataStoreTest(base.BaseTestCase):
+    def setUp(self):
+        print("Running", self._testMethodName)
+        # not "data_store", that is where make_input() keeps its data
+        self.workspace = self.init_workspace("store")
+        self.store = DataStore(os.path.join(self.workspace, "data"), chroot_path=self.CHROOT_DIR)
+        self.startTime = timeit.default_timer()
+
+    def tearDown(self):
+        print("Time: ", timeit.default_timer() - self.startTime)
+
+    def test_add(self):
+        key = self.store.add("judger_test")
+        self.assertEqual(self.store.add(b"judger_test"), key)
+        self.assertNotEqual(self.store.add("judger_test\n"), key)
+        self.assertIn(key, self.store)
+
+        path = os.path.join(self.workspace, "input")
+        with open(path, "w") as f:
+            f.write("judger_test")
+        self.assertEqual(self.store.add_file(path), key)
+
+        self.assertEqual(self.get_file_contents(self.store.path(key)), "judger_test")
+        self.assertEqual(stat.S_IMODE(os.stat(self.store.path(key)).st_mode), 0o444)
+        self.assertEqual(self.store.relative_path(key), self.get_path_relative_to_chroot(self.store.path(key)))
+        # nothing left behind by the adds
+        self.assertEqual(len(os.listdir(self.store.root)), 2)
+
+    def test_link(self):
+        key = self.store.add("judger_test")
+        target = self.store.link(key, os.path.join(self.workspace, "input"))
+        self.assertEqual(os.stat(target).st_ino, os.stat(self.store.path(key)).st_ino)
+
+        config = self.base_config
+        config["exe_path"] = self._compile_c("../test_src/integration/normal.c")
+        config["input_path"] = self.get_path_relative_to_chroot(target)
+        config["output_path"] = config["error_path"] = self.get_path_relative_to_chroot(
+            os.path.join(self.workspace, "output"))
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+        self.assertEqual(self.get_file_contents(os.path.join(self.workspace, "output")), "judger_test\nHello world")
+
+    def test_input_fd(self):
+        key = self.store.add("judger_test")
+        config = self.base_config
+        config["exe_path"] = self._compile_c("../test_src/integration/normal.c")
+        # not opened when there is an input_fd
+        config["input_path"] = "/not/a/file"
+        for i in range(2):
+            # every run reads from the start of an fd of its own
+            output_path = os.path.join(self.workspace, "output{}".format(i))
+            config["output_path"] = config["error_path"] = self.get_path_relative_to_chroot(output_path)
+            config["input_fd"] = self.store.open(key)
+            try:
+                result = judger.run(**config)
+            finally:
+                os.close(config["input_fd"])
+            self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+            self.assertEqual(self.get_file_contents(output_path), "judger_test\nHello world")
+
+    def test_input_fd_batch(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("../test_src/integration/normal.c")
+        config["input_fd"] = self.store.open(self.store.add("judger_test"))
+        output_path = self.get_path_relative_to_chroot(os.path.join(self.workspace, "output"))
+        try:
+            # the cases have inputs of their own
+            results = judger.run_batch([{"input_path": config["input_path"], "output_path": output_path}], **config)
+        finally:
+            os.close(config["input_fd"])
+        self.assertEqual(results[0]["error"], judger.ERROR_INVALID_CONFIG)
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import tempfile
+
+
+class DataStore(object):
+    """
+        Test data stored once under root by the hash of its content, however many problems or runs use it.
+        Entries are read-only and never change, so concurrent runs share them instead of copying:
+        give a run relative_path(key) as its input_path or answer_path, link() it into a workspace,
+        or hand the judger an open() fd as input_fd, which also works for data outside the chroot.
+        Several threads or processes may add to the same root.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root, chroot_path=None):
+        self.root = os.path.abspath(root)
+        self.chroot_path = chroot_path and os.path.abspath(chroot_path)
+        os.makedirs(self.root, mode=0o755, exist_ok=True)
+
+    def add(self, data):
+        """Stores data, bytes or str, and returns its key."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        key = hashlib.sha256(data).hexdigest()
+        if key not in self:
+            self._store(key, data)
+        return key
+
+    def add_file(self, path):
+        """Stores the content of the file at path and returns its key, the file is read once."""
+        digest = hashlib.sha256()
+        temp_path = self._temp_path()
+        try:
+            with open(path, "rb") as source, open(temp_path, "wb") as target:
+                for chunk in iter(lambda: source.read(self.CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    target.write(chunk)
+            key = digest.hexdigest()
+            self._commit(temp_path, key)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return key
+
+    def path(self, key):
+        """Where the content of key is stored."""
+        return os.path.join(self.root, key[:2], key)
+
+    def relative_path(self, key):
+        """The path of key as a run jailed in chroot_path sees it."""
+        if self.chroot_path is None:
+            return self.path(key)
+        return "/" + os.path.relpath(self.path(key), self.chroot_path)
+
+    def link(self, key, target):
+        """Hardlinks key to target, which must be on the same filesystem as root."""
+        os.link(self.path(key), target)
+        return target
+
+    def open(self, key):
+        """
+            A new read-only fd of key, for the input_fd of a single run: the run reads from the offset of the fd,
+            so runs must not share one. The caller closes it.
+        """
+        return os.open(self.path(key), os.O_RDONLY | os.O_CLOEXEC)
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def _temp_path(self):
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".add-")
+        os.close(fd)
+        return temp_path
+
+    def _store(self, key, data):
+        temp_path = self._temp_path()
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            self._commit(temp_path, key)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def _commit(self, temp_path, key):
+        # renamed into place once complete, a run never sees half an entry. The same content added twice
+        # at once is renamed twice, which is harmless
+        if key in self:
+            os.unlink(temp_path)
+            return
+        os.chmod(temp_path, 0o444)
+        os.makedirs(os.path.dirname(self.path(key)), mode=0o755, exist_ok=True)
+        os.rename(temp_path, self.path(key))
@@ -1,10 +1,14 @@
 # coding=utf-8
 from __future__ import print_function, absolute_import
 import timeit
+import asyncio
 import sys
 import signal
 import os
 import resource
+import threading
+import unittest
+import json
 
 from .. import base, judger
 
@@ -200,6 +204,402 @@ class IntegrationTest(base.BaseTestCase):
         self.assertEqual(result["result"], judger.RESULT_SUCCESS)
         self.assertEqual("abs 1024", self.get_file_contents(output_path))
 
+    def test_session(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("normal.c")
+        with judger.Session(chroot_path=self.CHROOT_DIR) as session:
+            for content in ["judger_test", "session"]:
+                config["input_path"] = self.get_path_relative_to_chroot(
+                    self.make_input(content))
+                output_path = self.output_path()
+                config["output_path"] = config["error_path"] = self.get_path_relative_to_chroot(
+                    output_path)
+                result = session.run(**config)
+                self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+                self.assertEqual(content + "\nHello world", self.get_file_contents(output_path))
+
+            # a session is jailed once, other chroot paths are rejected
+            config["chroot_path"] = "/"
+            result = session.run(**config)
+            self.assertEqual(result["error"], judger.ERROR_INVALID_CONFIG)
+
+    def test_session_stderr(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("normal.c")
+        config["input_path"] = self.get_path_relative_to_chroot(self.make_input("session"))
+        # each request writes to the stderr of the judger, far more than a pipe holds over all of them
+        config["log_path"] = "/nonexistent/" + "x" * 2000
+        with judger.Session(chroot_path=self.CHROOT_DIR) as session:
+            for _ in range(100):
+                result = session.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+
+    def test_supervisor(self):
+        sleep_config = self.base_config
+        sleep_config["exe_path"] = self._compile_c("sleep.c")
+        sleep_config["max_real_time"] = 500
+        while1_config = self.base_config
+        while1_config["exe_path"] = self._compile_c("while1.c")
+        while1_config["max_cpu_time"] = 300
+        normal_config = self.base_config
+        normal_config["exe_path"] = self._compile_c("normal.c")
+        normal_config["input_path"] = self.get_path_relative_to_chroot(self.make_input("supervisor"))
+        output_path = self.output_path()
+        normal_config["output_path"] = self.get_path_relative_to_chroot(output_path)
+        # the output of the run would be read by the supervisor itself
+        pipe_config = self.base_config
+        pipe_config["answer_path"] = normal_config["input_path"]
+        pipe_config["output_pipe"] = 1
+
+        configs = [sleep_config] * 4 + [while1_config, normal_config, pipe_config]
+        start = timeit.default_timer()
+        with judger.Supervisor(max_runs=8, chroot_path=self.CHROOT_DIR) as supervisor:
+            results = list(supervisor.run_many(configs))
+        # the runs overlap
+        self.assertTrue(timeit.default_timer() - start < 4 * 0.5)
+        self.assertEqual(sorted(index for index, _ in results), list(range(len(configs))))
+        # in the order they complete, the sleeps take longest
+        self.assertEqual(sorted(index for index, _ in results[-4:]), [0, 1, 2, 3])
+        results = dict(results)
+        for index in range(4):
+            self.assertEqual(results[index]["result"], judger.RESULT_REAL_TIME_LIMIT_EXCEEDED)
+        self.assertEqual(results[4]["result"], judger.RESULT_CPU_TIME_LIMIT_EXCEEDED)
+        self.assertEqual(results[5]["result"], judger.RESULT_SUCCESS)
+        self.assertEqual(self.get_file_contents(output_path), "supervisor\nHello world")
+        self.assertEqual(results[6]["error"], judger.ERROR_INVALID_CONFIG)
+
+    def test_supervisor_stderr(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("normal.c")
+        config["input_path"] = self.get_path_relative_to_chroot(self.make_input("supervisor"))
+        # each request writes to the stderr of the judger, far more than a pipe holds over all of them
+        config["log_path"] = "/nonexistent/" + "x" * 2000
+        with judger.Supervisor(max_runs=8, chroot_path=self.CHROOT_DIR) as supervisor:
+            results = list(supervisor.run_many([config] * 100))
+        self.assertEqual(len(results), 100)
+        for _, result in results:
+            self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+
+    def test_supervisor_real_time(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("sleep_second.c")
+        config["max_real_time"] = 3000
+        # counted from the execve of each run, however late the supervisor gets to it among the others
+        with judger.Supervisor(max_runs=32, chroot_path=self.CHROOT_DIR) as supervisor:
+            results = list(supervisor.run_many([config] * 32))
+        for _, result in results:
+            self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+            self.assertGreaterEqual(result["real_time"], 1000)
+
+    def test_supervisor_stop(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("normal.c")
+        config["input_path"] = self.get_path_relative_to_chroot(self.make_input("supervisor"))
+        # far more requests and results than a pipe holds, most of them left when the results stop being read
+        config["args"] = ["x" * 2000]
+        start = timeit.default_timer()
+        with judger.Supervisor(max_runs=8, chroot_path=self.CHROOT_DIR) as supervisor:
+            for index, result in supervisor.run_many([config] * 500):
+                self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+                break
+        self.assertTrue(timeit.default_timer() - start < 10)
+
+    @unittest.skipIf(judger._judger is None, "_judger extension is not built")
+    def test_extension_threads(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("sleep.c")
+        config["max_real_time"] = 500
+        results = []
+
+        def target():
+            results.append(judger.run(**config))
+
+        threads = [threading.Thread(target=target) for _ in range(4)]
+        start = timeit.default_timer()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # the GIL is released while waiting, so the runs overlap
+        self.assertTrue(timeit.default_timer() - start < 4 * 0.5)
+        for result in results:
+            self.assertEqual(result["result"], judger.RESULT_REAL_TIME_LIMIT_EXCEEDED)
+
+    def test_run_many(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("sleep.c")
+        config["max_real_time"] = 500
+        loop = asyncio.new_event_loop()
+
+        async def collect():
+            return [item async for item in judger.run_many([config] * 4, concurrency=4)]
+
+        start = timeit.default_timer()
+        results = loop.run_until_complete(collect())
+        self.assertTrue(timeit.default_timer() - start < 4 * 0.5)
+        self.assertEqual(sorted(index for index, _ in results), [0, 1, 2, 3])
+        for _, result in results:
+            self.assertEqual(result["result"], judger.RESULT_REAL_TIME_LIMIT_EXCEEDED)
+
+        # cancelling kills the run long before its real time limit
+        config["max_real_time"] = 5000
+        task = loop.create_task(judger.run_async(**config))
+        loop.run_until_complete(asyncio.sleep(0.2))
+        task.cancel()
+        start = timeit.default_timer()
+        with self.assertRaises(asyncio.CancelledError):
+            loop.run_until_complete(task)
+        self.assertTrue(timeit.default_timer() - start < 1)
+        loop.close()
+
+    def test_core_scheduler(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("sleep.c")
+        config["max_real_time"] = 300
+        scheduler = judger.CoreScheduler(cores=[0])
+        loop = asyncio.new_event_loop()
+
+        async def collect():
+            return [item async for item in scheduler.run_many([config] * 2)]
+
+        start = timeit.default_timer()
+        results = loop.run_until_complete(collect())
+        # a single core, so the runs took turns
+        self.assertTrue(timeit.default_timer() - start >= 2 * 0.3)
+        for _, result in results:
+            self.assertEqual(result["result"], judger.RESULT_REAL_TIME_LIMIT_EXCEEDED)
+            self.assertEqual(result["cpu_core"], 0)
+
+    def test_batch(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("normal.c")
+        del config["input_path"], config["output_path"]
+        contents = ["first", "second", "third"]
+        output_paths = [self.output_path() for _ in contents]
+        cases = [{"input_path": self.get_path_relative_to_chroot(self.make_input(content)),
+                  "output_path": self.get_path_relative_to_chroot(output_path)}
+                 for content, output_path in zip(contents, output_paths)]
+
+        results = judger.run_batch(cases, **config)
+        self.assertEqual(len(results), 3)
+        for content, output_path, result in zip(contents, output_paths, results):
+            self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+            self.assertEqual(content + "\nHello world", self.get_file_contents(output_path))
+
+        # the second case can not open its input, the third one is skipped
+        cases[1]["input_path"] = "/nonexistent"
+        results = judger.run_batch(cases, stop_on_failure=True, **config)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["result"], judger.RESULT_SUCCESS)
+        self.assertEqual(results[1]["result"], judger.RESULT_SYSTEM_ERROR)
+
+        # only the cases with an answer are compared
+        cases[1]["input_path"] = self.get_path_relative_to_chroot(self.make_input("second"))
+        cases[0]["answer_path"] = self.get_path_relative_to_chroot(self.make_input("first\nHello world"))
+        cases[2]["answer_path"] = self.get_path_relative_to_chroot(self.make_input("wrong"))
+        results = judger.run_batch(cases, **config)
+        self.assertEqual([result["result"] for result in results],
+                         [judger.RESULT_SUCCESS, judger.RESULT_SUCCESS, judger.RESULT_WRONG_ANSWER])
+
+    def test_run_suite(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("normal.c")
+        del config["input_path"], config["output_path"]
+        contents = [str(i) for i in range(8)]
+        output_paths = [self.output_path() for _ in contents]
+        cases = [{"input_path": self.get_path_relative_to_chroot(self.make_input(content)),
+                  "output_path": self.get_path_relative_to_chroot(output_path)}
+                 for content, output_path in zip(contents, output_paths)]
+
+        results = judger.run_suite(cases, workers=4, **config)
+        self.assertEqual(len(results), 8)
+        for content, output_path, result in zip(contents, output_paths, results):
+            self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+            self.assertEqual(content + "\nHello world", self.get_file_contents(output_path))
+
+        # the first failure decides, whichever failure ends first
+        cases[2]["input_path"] = cases[5]["input_path"] = "/nonexistent"
+        expected = judger.run_batch(cases, stop_on_failure=True, **config)
+        results = judger.run_suite(cases, workers=4, **config)
+        self.assertEqual(len(results), 3)
+        self.assertEqual([(result["result"], result["error"]) for result in results],
+                         [(result["result"], result["error"]) for result in expected])
+
+        # the runs after a failure are killed long before their real time limit
+        config["exe_path"] = self._compile_c("sleep.c")
+        config["max_real_time"] = 5000
+        start = timeit.default_timer()
+        results = judger.run_suite([{"input_path": "/nonexistent", "output_path": cases[0]["output_path"]}] +
+                                   cases[:3], workers=4, **config)
+        self.assertTrue(timeit.default_timer() - start < 2)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["result"], judger.RESULT_SYSTEM_ERROR)
+
+    def test_compare(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("normal.c")
+        config["input_path"] = self.get_path_relative_to_chroot(self.make_input("judger_test"))
+        config["output_path"] = self.get_path_relative_to_chroot(self.output_path())
+
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("judger_test\nHello world"))
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+
+        # trailing blanks only matter in the exact mode
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("judger_test  \nHello world\n\n"))
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_WRONG_ANSWER)
+        config["compare_mode"] = "lines"
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+
+        config["compare_mode"] = "tokens"
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("judger_test Hello  world"))
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("judger_test Hello"))
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_WRONG_ANSWER)
+
+        config["answer_path"] = "/nonexistent"
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SYSTEM_ERROR)
+        self.assertEqual(result["error"], judger.ERROR_COMPARE_FAILED)
+
+    def test_compare_floats(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("normal.c")
+        config["input_path"] = self.get_path_relative_to_chroot(self.make_input("0.3333333"))
+        config["output_path"] = self.get_path_relative_to_chroot(self.output_path())
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("0.33333333333 Hello world"))
+        config["compare_mode"] = "floats"
+
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+        config["float_tolerance"] = 1e-9
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_WRONG_ANSWER)
+
+    def test_checker(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("normal.c")
+        config["checker_path"] = self._compile_c("checker.c")
+        config["input_path"] = self.get_path_relative_to_chroot(self.make_input("judger_test"))
+        config["output_path"] = self.get_path_relative_to_chroot(self.output_path())
+
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("judger_test\nHello world"))
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+        self.assertGreater(result["phases"]["compare"], 0)
+
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("judger_test\nHello"))
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_WRONG_ANSWER)
+
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("fail"))
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SYSTEM_ERROR)
+        self.assertEqual(result["error"], judger.ERROR_SPJ_ERROR)
+
+        config["checker_path"] = "/nonexistent"
+        result = judger.run(**config)
+        self.assertEqual(result["error"], judger.ERROR_SPJ_ERROR)
+
+    def test_checker_persistent(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("normal.c")
+        config["checker_path"] = self._compile_c("checker.c")
+        answers = ["first\nHello world", "second\nHello", "fail", "fourth\nHello world"]
+        cases = [{"input_path": self.get_path_relative_to_chroot(self.make_input(answer.split("\n")[0])),
+                  "output_path": self.get_path_relative_to_chroot(self.output_path()),
+                  "answer_path": self.get_path_relative_to_chroot(self.make_input(answer))}
+                 for answer in answers]
+        expected = [(judger.RESULT_SUCCESS, 0), (judger.RESULT_WRONG_ANSWER, 0),
+                    (judger.RESULT_SYSTEM_ERROR, judger.ERROR_SPJ_ERROR), (judger.RESULT_SUCCESS, 0)]
+
+        # one checker per case, or one for all of them
+        for checker_persistent in [0, 1]:
+            results = judger.run_batch(cases, checker_persistent=checker_persistent, **config)
+            self.assertEqual([(result["result"], result["error"]) for result in results], expected)
+
+        # a checker that exits at once fails every case, it does not hang the batch
+        config["checker_path"] = self._compile_c("normal.c")
+        results = judger.run_batch(cases, checker_persistent=1, **config)
+        self.assertEqual([result["error"] for result in results], [judger.ERROR_SPJ_ERROR] * 4)
+
+    def test_interactor(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("guess.c")
+        config["interactor_path"] = self._compile_c("interactor.c")
+        config["args"] = []
+        config["input_path"] = self.get_path_relative_to_chroot(self.make_input("777777"))
+        output_path = self.output_path()
+        config["output_path"] = config["error_path"] = self.get_path_relative_to_chroot(output_path)
+
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+        self.assertEqual(result["interactor"]["exit_code"], 0)
+        self.assertLessEqual(result["interactor"]["real_time"], config["max_real_time"])
+        # the number of tries, written by the interactor and not by the program
+        self.assertLessEqual(int(self.get_file_contents(output_path)), 20)
+
+        # the interactor is trusted, the seccomp rule of the program does not keep it from writing output_path
+        config["seccomp_rule_name"] = "c_cpp"
+        result = judger.run(**config)
+        self.assertEqual(result["interactor"]["signal"], 0)
+        self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+        self.assertLessEqual(int(self.get_file_contents(output_path)), 20)
+        config["seccomp_rule_name"] = None
+
+        # the interactor gives up after 20 tries
+        config["args"] = ["always_1"]
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_WRONG_ANSWER)
+        self.assertEqual(result["interactor"]["exit_code"], 1)
+
+        # a program that never answers runs out of time, whatever the interactor did meanwhile
+        config["exe_path"] = self._compile_c("while1.c")
+        config["args"] = []
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_CPU_TIME_LIMIT_EXCEEDED)
+
+        config["exe_path"] = self._compile_c("guess.c")
+        config["input_path"] = "/nonexistent"
+        result = judger.run(**config)
+        self.assertEqual(result["error"], judger.ERROR_SPJ_ERROR)
+        self.assertEqual(result["interactor"]["exit_code"], 3)
+
+    def test_output_pipe(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("normal.c")
+        config["input_path"] = self.get_path_relative_to_chroot(self.make_input("judger_test"))
+        config["output_pipe"] = 1
+
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("judger_test\nHello world"))
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("judger_test\nHello"))
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_WRONG_ANSWER)
+
+    def test_output_pipe_early_kill(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("output_forever.c")
+        config["max_real_time"] = 3000
+        config["output_pipe"] = 1
+
+        # stopped at the first wrong line, long before the time limit
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("A\nB\n"))
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_WRONG_ANSWER)
+        self.assertLess(result["real_time"], 1000)
+
+        config["answer_path"] = self.get_path_relative_to_chroot(self.make_input("A\n" * 10000))
+        config["max_output_size"] = 1000
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_RUNTIME_ERROR)
+        self.assertLess(result["real_time"], 1000)
+
     def test_args(self):
         config = self.base_config
         config["exe_path"] = self._compile_c("args.c")
@@ -208,7 +608,7 @@ class IntegrationTest(base.BaseTestCase):
         config["output_path"] = config["error_path"] = self.get_path_relative_to_chroot(
             output_path)
         result = judger.run(**config)
-        output = "argv[0]: /tmp/integration/args\nargv[1]: test\nargv[2]: hehe\nargv[3]: 000\n"
+        output = "argv[0]: {0}\nargv[1]: test\nargv[2]: hehe\nargv[3]: 000\n".format(config["exe_path"])
         self.assertEqual(result["result"], judger.RESULT_SUCCESS)
         self.assertEqual(output, self.get_file_contents(output_path))
 
@@ -234,6 +634,59 @@ class IntegrationTest(base.BaseTestCase):
         self.assertEqual(result["signal"], signal.SIGKILL)
         self.assertTrue(result["real_time"] >= config["max_real_time"])
 
+    def test_real_time_precision(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("sleep.c")
+        config["max_real_time"] = 150
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_REAL_TIME_LIMIT_EXCEEDED)
+        self.assertEqual(result["signal"], signal.SIGKILL)
+        # killed at the limit, not at the next whole second
+        self.assertTrue(150 <= result["real_time"] < 500)
+
+    def test_phases(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("sleep.c")
+        config["max_real_time"] = 150
+        result = judger.run(**config)
+        phases = result["phases"]
+        self.assertEqual(sorted(phases), sorted(["setup", "fork", "jail", "setrlimit", "open_files", "setuid",
+                                                 "execve", "run", "teardown", "compare"]))
+        self.assertTrue(phases["execve"] > 0)
+        # real_time counts from the time the child sent just before its execve, the execve and the run
+        self.assertEqual(result["real_time"], (phases["execve"] + phases["run"]) // 1000000)
+
+    def test_samples(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("while1.c")
+        config["max_cpu_time"] = 400
+        config["sample_interval"] = 10
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_CPU_TIME_LIMIT_EXCEEDED)
+        self.assertTrue(result["rusage"]["utime"] + result["rusage"]["stime"] >= 400 * 1000)
+        # [time, cpu_time, memory] from the execve on, both times keep growing
+        self.assertTrue(len(result["samples"]) >= 10)
+        times = [sample[0] for sample in result["samples"]]
+        self.assertEqual(times, sorted(times))
+        self.assertTrue(result["samples"][-1][1] > result["samples"][0][1])
+
+    def test_log(self):
+        log_path = os.path.join(self.workspace, "judger.log")
+        config = self.base_config
+        config["input_path"] = "/not/there"
+        config["log_path"] = self.get_path_relative_to_chroot(log_path)
+        config["log_level"] = "debug"
+        config["log_format"] = "json"
+        config["log_max_size"] = 1
+        for _ in range(2):
+            result = judger.run(**config)
+            self.assertEqual(result["result"], judger.RESULT_SYSTEM_ERROR)
+        # every run is over log_max_size, its lines are rotated away once it is done
+        self.assertEqual(self.get_file_contents(log_path), "")
+        for path in [log_path + ".1", log_path + ".2"]:
+            lines = [json.loads(line) for line in self.get_file_contents(path).splitlines()]
+            self.assertTrue(any(line["level"] == "FATAL" and "DUP2_FAILED" in line["message"] for line in lines))
+
     def test_cpu_time(self):
         config = self.base_config
         config["exe_path"] = self._compile_c("while1.c")
@@ -244,6 +697,28 @@ class IntegrationTest(base.BaseTestCase):
         self.assertEqual(result["signal"], signal.SIGKILL)
         self.assertTrue(result["cpu_time"] >= config["max_cpu_time"])
 
+    def test_cpu_time_precision(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("while1.c")
+        config["max_cpu_time"] = 400
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_CPU_TIME_LIMIT_EXCEEDED)
+        self.assertEqual(result["signal"], signal.SIGKILL)
+        # killed at the limit, not at the next whole second
+        self.assertTrue(400 <= result["cpu_time"] < 800)
+
+    @unittest.skipIf("JUDGER_CGROUP_PATH" not in os.environ, "needs a delegated cgroup v2 in JUDGER_CGROUP_PATH")
+    def test_cgroup(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("child_proc_cpu_time_limit.c")
+        config["max_cpu_time"] = 400
+        config["cgroup_path"] = os.environ["JUDGER_CGROUP_PATH"]
+        result = judger.run(**config)
+        # the forked child burns the cpu time, the cgroup counts it right away
+        self.assertEqual(result["result"], judger.RESULT_CPU_TIME_LIMIT_EXCEEDED)
+        self.assertTrue(400 <= result["cpu_time"] < 800)
+        self.assertEqual([name for name in os.listdir(config["cgroup_path"]) if name.startswith("judger-")], [])
+
     def test_memory1(self):
         config = self.base_config
         config["max_memory"] = 64 * 1024 * 1024
@@ -1,6 +1,15 @@
+import asyncio
+import fcntl
 import json
 import subprocess
 import os
+import threading
+
+try:
+    # the native extension runs the sandbox in-process, see src/python/_judger.c
+    import _judger
+except ImportError:
+    _judger = None
 
 UNLIMITED = -1
 VERSION = 0x020101
@@ -24,6 +33,240 @@ ERROR_DUP2_FAILED = -8
 ERROR_SETUID_FAILED = -9
 ERROR_EXECVE_FAILED = -10
 ERROR_SPJ_ERROR = -11
+ERROR_CHROOT_FAILED = -12
+ERROR_COMPARE_FAILED = -13
+ERROR_CGROUP_FAILED = -14
+ERROR_SETAFFINITY_FAILED = -15
+
+COMPARE_MODES = ["exact", "lines", "tokens", "floats"]
+LOG_LEVELS = ["fatal", "warning", "info", "debug"]
+LOG_FORMATS = ["text", "json"]
+
+
+STR_LIST_VARS = ["args", "env"]
+INT_VARS = ["max_cpu_time", "max_real_time",
+            "max_memory", "max_stack", "max_output_size",
+            "max_process_number", "uid", "gid", "memory_limit_check_only",
+            "output_pipe", "cpu_core", "zygote", "source_fd", "sample_interval", "log_max_size", "input_fd",
+            "checker_persistent", "interactor_max_cpu_time", "interactor_max_memory"]
+STR_VARS = ["exe_path", "input_path", "output_path", "error_path", "log_path", "chroot_path"]
+# left to the judger defaults when None
+OPTIONAL_VARS = ["answer_path", "compare_mode", "float_tolerance", "cgroup_path", "log_level", "log_format",
+                 "checker_path", "interactor_path"]
+
+# rule files registered with load_seccomp_rule_file(), passed to every judger process
+SECCOMP_RULE_FILES = []
+
+JUDGER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "src", "bazel-bin", "judger"))
+
+
+def _check_config(max_cpu_time,
+                  max_real_time,
+                  max_memory,
+                  max_stack,
+                  max_output_size,
+                  max_process_number,
+                  exe_path,
+                  input_path,
+                  output_path,
+                  error_path,
+                  args,
+                  env,
+                  log_path,
+                  chroot_path,
+                  seccomp_rule_name,
+                  uid,
+                  gid,
+                  memory_limit_check_only=0,
+                  answer_path=None,
+                  compare_mode=None,
+                  float_tolerance=None,
+                  output_pipe=0,
+                  cgroup_path=None,
+                  cpu_core=UNLIMITED,
+                  zygote=0,
+                  source_fd=UNLIMITED,
+                  sample_interval=0,
+                  log_level=None,
+                  log_format=None,
+                  log_max_size=UNLIMITED,
+                  input_fd=UNLIMITED,
+                  checker_path=None,
+                  checker_persistent=0,
+                  interactor_path=None,
+                  interactor_max_cpu_time=UNLIMITED,
+                  interactor_max_memory=UNLIMITED):
+    config = dict(locals())
+
+    for var in STR_LIST_VARS:
+        value = config[var]
+        if not isinstance(value, list):
+            raise ValueError("{} must be a list".format(var))
+        for item in value:
+            if not isinstance(item, str):
+                raise ValueError("{} item must be a string".format(var))
+
+    for var in INT_VARS:
+        if not isinstance(config[var], int):
+            raise ValueError("{} must be a int".format(var))
+
+    for var in STR_VARS:
+        if not isinstance(config[var], str):
+            raise ValueError("{} must be a string".format(var))
+
+    if not isinstance(seccomp_rule_name, str) and seccomp_rule_name is not None:
+        raise ValueError("seccomp_rule_name must be a string or None")
+
+    if not isinstance(answer_path, str) and answer_path is not None:
+        raise ValueError("answer_path must be a string or None")
+    if compare_mode not in COMPARE_MODES and compare_mode is not None:
+        raise ValueError("compare_mode must be one of {} or None".format(", ".join(COMPARE_MODES)))
+    if not isinstance(float_tolerance, (int, float)) and float_tolerance is not None:
+        raise ValueError("float_tolerance must be a number or None")
+    if not isinstance(cgroup_path, str) and cgroup_path is not None:
+        raise ValueError("cgroup_path must be a string or None")
+    if log_level not in LOG_LEVELS and log_level is not None:
+        raise ValueError("log_level must be one of {} or None".format(", ".join(LOG_LEVELS)))
+    if log_format not in LOG_FORMATS and log_format is not None:
+        raise ValueError("log_format must be one of {} or None".format(", ".join(LOG_FORMATS)))
+    if not isinstance(checker_path, str) and checker_path is not None:
+        raise ValueError("checker_path must be a string or None")
+    if not isinstance(interactor_path, str) and interactor_path is not None:
+        raise ValueError("interactor_path must be a string or None")
+    return config
+
+
+def _proc_args(config):
+    proc_args = [JUDGER_PATH]
+
+    for var in STR_LIST_VARS:
+        for item in config[var]:
+            proc_args.append("--{}={}".format(var, item))
+
+    for var in INT_VARS:
+        value = config[var]
+        if value != UNLIMITED:
+            proc_args.append("--{}={}".format(var, value))
+
+    for var in STR_VARS:
+        proc_args.append("--{}={}".format(var, config[var]))
+
+    if config["seccomp_rule_name"]:
+        proc_args.append("--seccomp_rule_name={}".format(config["seccomp_rule_name"]))
+    for path in SECCOMP_RULE_FILES:
+        proc_args.append("--seccomp_rule_file={}".format(path))
+
+    for var in OPTIONAL_VARS:
+        if config[var] is not None:
+            proc_args.append("--{}={}".format(var, config[var]))
+    return proc_args
+
+
+def _pass_fds(config):
+    """The fds the judger process inherits, the source and the input are read from the same fd numbers."""
+    return tuple(config[var] for var in ["source_fd", "input_fd"] if config[var] != UNLIMITED)
+
+
+def _read_source(fd):
+    chunks = []
+    offset = 0
+    while True:
+        chunk = os.pread(fd, 65536, offset)
+        if not chunk:
+            return b"".join(chunks).decode("utf-8")
+        chunks.append(chunk)
+        offset += len(chunk)
+
+
+def _check_cases(cases):
+    if not isinstance(cases, list) or not cases:
+        raise ValueError("cases must be a non-empty list")
+    for case in cases:
+        if not isinstance(case, dict):
+            raise ValueError("cases item must be a dict")
+        for var in ["input_path", "output_path"]:
+            if not isinstance(case.get(var), str):
+                raise ValueError("case {} must be a string".format(var))
+        if not isinstance(case.get("answer_path", "-"), str):
+            raise ValueError("case answer_path must be a string")
+    return cases
+
+
+def _batch_proc_args(config, cases, stop_on_failure):
+    proc_args = _proc_args(config)
+    has_answer = any("answer_path" in case for case in cases)
+    for case in cases:
+        proc_args.append("--case_input={}".format(case["input_path"]))
+        proc_args.append("--case_output={}".format(case["output_path"]))
+        if has_answer:
+            # "-" skips the comparison of a case without an answer
+            proc_args.append("--case_answer={}".format(case.get("answer_path", "-")))
+    if stop_on_failure:
+        proc_args.append("--stop_on_failure=1")
+    return proc_args
+
+
+def _request(config):
+    """The JSON form of a config, with the same defaults as the command line."""
+    request = {}
+    for var in STR_LIST_VARS + STR_VARS:
+        request[var] = config[var]
+    for var in INT_VARS:
+        if config[var] != UNLIMITED:
+            request[var] = config[var]
+    # a fd of the client means nothing to the server, the source goes in args instead
+    if config["source_fd"] != UNLIMITED:
+        del request["source_fd"]
+        request["args"] = ["-c", _read_source(config["source_fd"])] + request["args"]
+    if config["input_fd"] != UNLIMITED:
+        raise ValueError("input_fd can not be sent to a server, use input_path")
+    if config["seccomp_rule_name"]:
+        request["seccomp_rule_name"] = config["seccomp_rule_name"]
+    for var in OPTIONAL_VARS:
+        if config[var] is not None:
+            request[var] = config[var]
+    return request
+
+
+def load_seccomp_rule_file(path):
+    """
+        Registers the seccomp rule of a file, it is used by naming the file without its extension
+        as seccomp_rule_name. See src/rules/seccomp_rules.h for the format.
+    """
+    if not isinstance(path, str):
+        raise ValueError("path must be a string")
+    path = os.path.abspath(path)
+    if _judger is not None:
+        _judger.load_seccomp_rule_file(path)
+    elif not os.path.isfile(path):
+        raise ValueError("seccomp rule file {} does not exist".format(path))
+    SECCOMP_RULE_FILES.append(path)
+
+
+def open_source(source):
+    """
+        Returns a sealed memfd holding source, for the source_fd of interpreted submissions.
+        The same fd can be used by every run of the submission, the caller closes it.
+    """
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    fd = os.memfd_create("source", os.MFD_CLOEXEC | os.MFD_ALLOW_SEALING)
+    try:
+        view = memoryview(source)
+        while view:
+            view = view[os.write(fd, view):]
+        fcntl.fcntl(fd, fcntl.F_ADD_SEALS,
+                    fcntl.F_SEAL_SEAL | fcntl.F_SEAL_SHRINK | fcntl.F_SEAL_GROW | fcntl.F_SEAL_WRITE)
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+def _load_result(out, err):
+    if err:
+        raise ValueError("Error occurred while calling judger: {}".format(err))
+    return json.loads(out.decode("utf-8"))
 
 
 def run(max_cpu_time,
@@ -43,47 +286,359 @@ def run(max_cpu_time,
         seccomp_rule_name,
         uid,
         gid,
-        memory_limit_check_only=0):
-    str_list_vars = ["args", "env"]
-    int_vars = ["max_cpu_time", "max_real_time",
-                "max_memory", "max_stack", "max_output_size",
-                "max_process_number", "uid", "gid", "memory_limit_check_only"]
-    str_vars = ["exe_path", "input_path", "output_path", "error_path", "log_path", "chroot_path"]
+        memory_limit_check_only=0,
+        answer_path=None,
+        compare_mode=None,
+        float_tolerance=None,
+        output_pipe=0,
+        cgroup_path=None,
+        cpu_core=UNLIMITED,
+        zygote=0,
+        source_fd=UNLIMITED,
+        sample_interval=0,
+        log_level=None,
+        log_format=None,
+        log_max_size=UNLIMITED,
+        input_fd=UNLIMITED,
+        checker_path=None,
+        checker_persistent=0,
+        interactor_path=None,
+        interactor_max_cpu_time=UNLIMITED,
+        interactor_max_memory=UNLIMITED):
+    config = _check_config(**locals())
+    if _judger is not None:
+        return _judger.run(**config)
 
-    judger_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), "..", "..", "src", "bazel-bin", "judger"))
+    proc = subprocess.Popen(_proc_args(config), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            pass_fds=_pass_fds(config))
+    out, err = proc.communicate()
+    return _load_result(out, err)
 
-    proc_args = [judger_path]
 
-    for var in str_list_vars:
-        value = vars()[var]
-        if not isinstance(value, list):
-            raise ValueError("{} must be a list".format(var))
-        for item in value:
-            if not isinstance(item, str):
-                raise ValueError("{} item must be a string".format(var))
-            proc_args.append("--{}={}".format(var, item))
+def run_batch(cases, stop_on_failure=False, **kwargs):
+    """
+        Runs one executable against many cases in a single judger invocation.
+        cases is a list of {"input_path", "output_path", "answer_path"} dicts, the input_path and
+        output_path of the config itself are not used. Returns one result per case that ran,
+        with stop_on_failure the cases after the first failed one are skipped.
+        With a checker_path, checker_persistent=1 checks every case with the same checker process.
+    """
+    kwargs.setdefault("input_path", "/dev/null")
+    kwargs.setdefault("output_path", "/dev/null")
+    config = _check_config(**kwargs)
+    proc_args = _batch_proc_args(config, _check_cases(cases), stop_on_failure)
 
-    for var in int_vars:
-        value = vars()[var]
-        if not isinstance(value, int):
-            raise ValueError("{} must be a int".format(var))
-        if value != UNLIMITED:
-            proc_args.append("--{}={}".format(var, value))
+    proc = subprocess.Popen(proc_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            pass_fds=_pass_fds(config))
+    out, err = proc.communicate()
+    return _load_result(out, err)
 
-    for var in str_vars:
-        value = vars()[var]
-        if not isinstance(value, str):
-            raise ValueError("{} must be a string".format(var))
-        proc_args.append("--{}={}".format(var, value))
 
-    if not isinstance(seccomp_rule_name, str) and seccomp_rule_name is not None:
-        raise ValueError("seccomp_rule_name must be a string or None")
-    if seccomp_rule_name:
-        proc_args.append("--seccomp_rule={}".format(seccomp_rule_name))
+async def run_async(**kwargs):
+    """
+        Coroutine version of run(), it takes the same arguments.
+        Cancelling it kills the judger, which takes the sandboxed child down with it.
+    """
+    config = _check_config(**kwargs)
 
-    proc = subprocess.Popen(proc_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    out, err = proc.communicate()
-    print(out)
-    if err:
-        raise ValueError("Error occurred while calling judger: {}".format(err))
-    return json.loads(out.decode("utf-8"))
+    proc = await asyncio.create_subprocess_exec(*_proc_args(config), stdout=subprocess.PIPE,
+                                                stderr=subprocess.PIPE, pass_fds=_pass_fds(config))
+    try:
+        out, err = await proc.communicate()
+    except asyncio.CancelledError:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        raise
+    return _load_result(out, err)
+
+
+async def run_many(configs, concurrency=None):
+    """
+        Runs every config with at most `concurrency` (default: one per cpu) judgers at once,
+        and yields (index, result) pairs in the order they complete.
+        Closing or cancelling the generator kills the runs that are still in flight.
+    """
+    semaphore = asyncio.Semaphore(concurrency or os.cpu_count() or 1)
+
+    async def run_one(index, config):
+        async with semaphore:
+            return index, await run_async(**config)
+
+    async for item in _as_completed([run_one(index, config) for index, config in enumerate(configs)]):
+        yield item
+
+
+def run_suite(cases, workers=None, **kwargs):
+    """
+        Runs one executable against many cases with at most `workers` (default: one per cpu) judgers at once.
+        cases are the ones of run_batch(), and so are the results: one per case up to the first failed one,
+        as if they ran one after the other. Cases start in order, and once one fails the runs of the cases
+        after it are killed.
+    """
+    return asyncio.run(run_suite_async(cases, workers, **kwargs))
+
+
+async def run_suite_async(cases, workers=None, **kwargs):
+    """Coroutine version of run_suite()."""
+    configs = [dict(kwargs, **case) for case in _check_cases(cases)]
+    results = [None] * len(configs)
+    indexes = iter(range(len(configs)))
+    running = {}
+    first_failure = len(configs)
+
+    async def worker():
+        nonlocal first_failure
+        # shared by every worker, the next case to start is always the first one that did not
+        for index in indexes:
+            if index > first_failure:
+                return
+            running[index] = asyncio.ensure_future(run_async(**configs[index]))
+            try:
+                results[index] = await running[index]
+            except asyncio.CancelledError:
+                # killed because of an earlier failure, or the whole suite is cancelled
+                if index > first_failure:
+                    continue
+                raise
+            finally:
+                del running[index]
+            if _failed(results[index]) and index < first_failure:
+                first_failure = index
+                for later, task in list(running.items()):
+                    if later > index:
+                        task.cancel()
+
+    tasks = [asyncio.ensure_future(worker()) for _ in range(min(workers or os.cpu_count() or 1, len(configs)))]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results[:first_failure + 1]
+
+
+def _failed(result):
+    return result["error"] != 0 or result["result"] != RESULT_SUCCESS
+
+
+async def _as_completed(coroutines):
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        for future in asyncio.as_completed(tasks):
+            yield await future
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class CoreScheduler(object):
+    """
+        Runs every sandboxed program pinned to a CPU core of its own, so concurrent runs
+        do not disturb each other's timing. A run waits until one of the cores is free,
+        results tell the core in "cpu_core". cores defaults to every core we may run on.
+    """
+
+    def __init__(self, cores=None):
+        self.cores = sorted(os.sched_getaffinity(0)) if cores is None else list(cores)
+        if not self.cores:
+            raise ValueError("cores must not be empty")
+        self._free = None
+
+    async def run(self, **kwargs):
+        # created here, an asyncio.Queue must belong to the running loop
+        if self._free is None:
+            self._free = asyncio.Queue()
+            for core in self.cores:
+                self._free.put_nowait(core)
+        core = await self._free.get()
+        try:
+            kwargs["cpu_core"] = core
+            return await run_async(**kwargs)
+        finally:
+            self._free.put_nowait(core)
+
+    async def run_many(self, configs):
+        """Like run_many(), with one concurrent run per core."""
+        async def run_one(index, config):
+            return index, await self.run(**config)
+
+        async for item in _as_completed([run_one(index, config) for index, config in enumerate(configs)]):
+            yield item
+
+
+class _StderrTail(object):
+    """
+        Reads the stderr of a long-lived judger from a thread, so messages it writes per request never fill the
+        pipe and block it, and keeps the last SIZE bytes of it to report when the judger dies.
+    """
+
+    SIZE = 4096
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._tail = b""
+        self._thread = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        while True:
+            chunk = os.read(self._stream.fileno(), 65536)
+            if not chunk:
+                break
+            self._tail = (self._tail + chunk)[-self.SIZE:]
+
+    def read(self):
+        """The tail of stderr, once the judger is gone."""
+        self._thread.join()
+        return self._tail
+
+    def close(self):
+        self._thread.join()
+        self._stream.close()
+
+
+class Session(object):
+    """
+        Keeps one `judger --serve` process alive and sends it one run config per line,
+        so judging many test cases costs a single judger startup.
+        Every config must use the chroot_path (and cgroup_path) the session was started with.
+    """
+
+    def __init__(self, chroot_path=None, judger_path=JUDGER_PATH, cgroup_path=None):
+        proc_args = [judger_path, "--serve"]
+        if chroot_path is not None:
+            proc_args.append("--chroot_path={}".format(chroot_path))
+        if cgroup_path is not None:
+            proc_args.append("--cgroup_path={}".format(cgroup_path))
+        for path in SECCOMP_RULE_FILES:
+            proc_args.append("--seccomp_rule_file={}".format(path))
+        self.chroot_path = chroot_path
+        self.cgroup_path = cgroup_path
+        self._proc = subprocess.Popen(proc_args, stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._stderr = _StderrTail(self._proc.stderr)
+
+    def run(self, **kwargs):
+        return self._send(_request(_check_config(**kwargs)))
+
+    def _send(self, request):
+        if self._proc is None:
+            raise ValueError("Session is closed")
+        line = json.dumps(request) + "\n"
+        self._proc.stdin.write(line.encode("utf-8"))
+        self._proc.stdin.flush()
+        out = self._proc.stdout.readline()
+        if not out:
+            err = self._stderr.read()
+            self.close()
+            raise ValueError("Error occurred while calling judger: {}".format(err))
+        return json.loads(out.decode("utf-8"))
+
+    def run_batch(self, cases, stop_on_failure=False, **kwargs):
+        kwargs.setdefault("input_path", "/dev/null")
+        kwargs.setdefault("output_path", "/dev/null")
+        config = _check_config(**kwargs)
+        request = _request(config)
+        request["cases"] = _check_cases(cases)
+        request["stop_on_failure"] = bool(stop_on_failure)
+        return self._send(request)
+
+    def close(self):
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.wait()
+            self._proc.stdout.close()
+            self._stderr.close()
+            self._proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Supervisor(object):
+    """
+        Keeps one `judger --supervise=<max_runs>` process that runs up to max_runs configs at once, all of them
+        from that one process, and answers every run as soon as it is over. The configs of a supervisor can not
+        use output_pipe and run without zygote, batches go to a Session instead.
+    """
+
+    def __init__(self, max_runs=64, chroot_path=None, judger_path=JUDGER_PATH, cgroup_path=None):
+        proc_args = [judger_path, "--supervise={}".format(max_runs)]
+        if chroot_path is not None:
+            proc_args.append("--chroot_path={}".format(chroot_path))
+        if cgroup_path is not None:
+            proc_args.append("--cgroup_path={}".format(cgroup_path))
+        for path in SECCOMP_RULE_FILES:
+            proc_args.append("--seccomp_rule_file={}".format(path))
+        self.chroot_path = chroot_path
+        self.cgroup_path = cgroup_path
+        self._proc = subprocess.Popen(proc_args, stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._stderr = _StderrTail(self._proc.stderr)
+
+    def run_many(self, configs):
+        """Yields (index, result) pairs in the order the runs complete."""
+        if self._proc is None:
+            raise ValueError("Supervisor is closed")
+        requests = []
+        for index, config in enumerate(configs):
+            request = _request(_check_config(**config))
+            request["id"] = index
+            requests.append(request)
+
+        # written from a thread, the supervisor stops reading while its results are not read
+        def send():
+            try:
+                for request in requests:
+                    self._proc.stdin.write((json.dumps(request) + "\n").encode("utf-8"))
+                self._proc.stdin.flush()
+            except (BrokenPipeError, ValueError):
+                pass
+
+        sender = threading.Thread(target=send, daemon=True)
+        sender.start()
+        done = False
+        try:
+            for _ in requests:
+                out = self._proc.stdout.readline()
+                if not out:
+                    err = self._stderr.read()
+                    self.close()
+                    raise ValueError("Error occurred while calling judger: {}".format(err))
+                result = json.loads(out.decode("utf-8"))
+                yield result.pop("id"), result
+            done = True
+        finally:
+            if not done and self._proc is not None:
+                # stopped early, the supervisor waits for its results to be read and the sender for the supervisor
+                # to read the requests, so neither would ever go on
+                self._proc.kill()
+                sender.join()
+                self.close()
+            sender.join()
+
+    def close(self):
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except BrokenPipeError:
+                # requests left unsent by a run_many() that stopped early
+                pass
+            self._proc.wait()
+            self._proc.stdout.close()
+            self._stderr.close()
+            self._proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
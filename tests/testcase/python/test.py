@@ -41,17 +41,21 @@ class PythonTest(base.BaseTestCase):
                 "gid": 65534}
         return config
 
-    def populate_args(self, config, src_name):
+    def populate_args(self, config, src_name, source_fd=False):
         path = self.get_file_absolute_path("../test_src/python/" + src_name)
         content = self.get_file_contents(path)
-        config["args"] = ["-c", content]
+        if source_fd:
+            config["source_fd"] = judger.open_source(content)
+            self.addCleanup(os.close, config["source_fd"])
+        else:
+            config["args"] = ["-c", content]
 
     def helper(self, test_file, expected_result, expected_signal,
-               input_val=None, expected_output=None, override_config=None):
+               input_val=None, expected_output=None, override_config=None, source_fd=False):
         config = self.get_config()
         if override_config is not None:
             config.update(override_config)
-        self.populate_args(config, test_file)
+        self.populate_args(config, test_file, source_fd)
         absolute_output_path = self.output_path()
         if input_val is not None:
             config["input_path"] = self.get_path_relative_to_chroot(
@@ -171,3 +175,68 @@ class PythonTest(base.BaseTestCase):
 
         # delete the dummy path
         shutil.rmtree(root_path, ignore_errors=True)
+
+    def test_zygote(self):
+        # forked from a warm interpreter, the results must not change
+        zygote = {"zygote": 1}
+        for _ in range(2):
+            self.helper(
+                test_file="ok.py", expected_result=judger.RESULT_SUCCESS,
+                expected_signal=0, input_val="wtf",
+                expected_output="2\n3\n4\n5\n6\ntest\ntest 2\n", override_config=zygote)
+        self.helper(
+            test_file="tle_cpu.py",
+            expected_result=judger.RESULT_CPU_TIME_LIMIT_EXCEEDED,
+            expected_signal=9, override_config=zygote)
+        self.helper(
+            test_file="subprocess.py",
+            expected_result=judger.RESULT_RUNTIME_ERROR, expected_signal=31,
+            override_config=zygote)
+        self.helper(
+            test_file="opencreate.py",
+            expected_result=judger.RESULT_RUNTIME_ERROR, expected_signal=31,
+            override_config=zygote)
+
+    def test_zygote_isolation(self):
+        # a run must not find the sources of the submissions before it, not even in freed memory
+        config = self.get_config()
+        config["zygote"] = 1
+        config["input_path"] = self.get_path_relative_to_chroot(self.make_input("wtf"))
+        outputs = []
+        for test_files in [["peek.py"], ["ok.py", "peek.py"]]:
+            with judger.Session(chroot_path=self.CHROOT_DIR) as session:
+                for test_file in test_files:
+                    self.populate_args(config, test_file)
+                    output_path = self.output_path()
+                    config["output_path"] = config["error_path"] = self.get_path_relative_to_chroot(output_path)
+                    result = session.run(**config)
+                    self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+            outputs.append(self.get_file_contents(output_path))
+        # as many copies as in a session that never ran ok.py
+        self.assertTrue(outputs[0].startswith("0 "))
+        self.assertEqual(outputs[1], outputs[0])
+
+    def test_source_fd(self):
+        # "-c" and the source are added by the judger, read from a sealed memfd
+        for zygote in [{"zygote": 0}, {"zygote": 1}, {"zygote": 1}]:
+            self.helper(
+                test_file="ok.py", expected_result=judger.RESULT_SUCCESS,
+                expected_signal=0, input_val="wtf",
+                expected_output="2\n3\n4\n5\n6\ntest\ntest 2\n", override_config=zygote, source_fd=True)
+            self.helper(
+                test_file="syntax_error.py", expected_result=judger.RESULT_RUNTIME_ERROR,
+                expected_signal=0, override_config=zygote, source_fd=True)
+
+    def test_source_fd_size(self):
+        # far over what argv can carry, the source is not passed through it
+        config = self.get_config()
+        config["source_fd"] = judger.open_source("x = 0\n" * 50000 + "print(len(__import__('sys').argv))\n")
+        self.addCleanup(os.close, config["source_fd"])
+        config["args"] = ["a", "b"]
+        for zygote in [0, 1]:
+            config["zygote"] = zygote
+            output_path = self.output_path()
+            config["output_path"] = config["error_path"] = self.get_path_relative_to_chroot(output_path)
+            result = judger.run(**config)
+            self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+            self.assertEqual(self.get_file_contents(output_path), "3\n")
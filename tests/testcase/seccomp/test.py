@@ -155,3 +155,25 @@ class SeccompTest(base.BaseTestCase):
         result = judger.run(**config)
         self.assertEqual(result["result"], judger.RESULT_RUNTIME_ERROR)
         self.assertEqual(result["signal"], self.BAD_SYSTEM_CALL)
+
+    def test_rule_file(self):
+        judger.load_seccomp_rule_file(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                   "..", "..", "test_src", "seccomp", "no_fork.rules"))
+        config = self.base_config
+        config["seccomp_rule_name"] = "no_fork"
+
+        config["exe_path"] = self._compile_c("sysinfo.c")
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+
+        config["exe_path"] = self._compile_c("fork.c")
+        result = judger.run(**config)
+        self.assertEqual(result["result"], judger.RESULT_RUNTIME_ERROR)
+        self.assertEqual(result["signal"], self.BAD_SYSTEM_CALL)
+
+    def test_unknown_rule(self):
+        config = self.base_config
+        config["exe_path"] = self._compile_c("sysinfo.c")
+        config["seccomp_rule_name"] = "no_such_rule"
+        result = judger.run(**config)
+        self.assertEqual(result["error"], judger.ERROR_LOAD_SECCOMP_FAILED)
@@ -0,0 +1,117 @@
+import contextlib
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+
+class WorkspacePool(object):
+    """
+        Per-run directories under root, created up front and handed out by acquire(). release() gives one back,
+        a background thread empties it and it is handed out again, so a run never waits for a rmtree.
+        With tmpfs_size (bytes) a tmpfs of that size is mounted on root (root is required) and unmounted by close(),
+        the files of the runs then never touch the disk.
+        Keep root inside chroot_path and the paths are relative to it, ready for judger.run().
+    """
+
+    def __init__(self, root, size=8, chroot_path=None, tmpfs_size=None, mode=0o755):
+        self.root = os.path.abspath(root)
+        self.chroot_path = chroot_path and os.path.abspath(chroot_path)
+        self.mode = mode
+        self._mounted = False
+        os.makedirs(self.root, exist_ok=True)
+        if tmpfs_size is not None:
+            subprocess.check_call(["mount", "-t", "tmpfs", "-o", "size={}".format(tmpfs_size), "tmpfs", self.root])
+            self._mounted = True
+        self._count = 0
+        self._count_lock = threading.Lock()
+        self._free = queue.Queue()
+        self._dirty = queue.Queue()
+        for _ in range(size):
+            self._free.put(self._create())
+        self._cleaner = threading.Thread(target=self._clean, daemon=True)
+        self._cleaner.start()
+
+    def _create(self):
+        with self._count_lock:
+            self._count += 1
+            path = os.path.join(self.root, str(self._count))
+        shutil.rmtree(path, ignore_errors=True)
+        os.mkdir(path, self.mode)
+        os.chmod(path, self.mode)
+        return path
+
+    def acquire(self):
+        """An empty directory, a new one when every workspace is in use or being cleaned."""
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            return self._create()
+
+    def release(self, path):
+        self._dirty.put(path)
+
+    @contextlib.contextmanager
+    def workspace(self):
+        path = self.acquire()
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def relative_path(self, path):
+        if self.chroot_path is None:
+            return path
+        return "/" + os.path.relpath(path, self.chroot_path)
+
+    def _clean(self):
+        while True:
+            path = self._dirty.get()
+            if path is None:
+                self._dirty.task_done()
+                return
+            try:
+                _empty(path, self.mode)
+                self._free.put(path)
+            except OSError:
+                # not reused, the pool creates another one when it runs out
+                shutil.rmtree(path, ignore_errors=True)
+            self._dirty.task_done()
+
+    def join(self):
+        """Waits until every released workspace is clean."""
+        self._dirty.join()
+
+    def close(self):
+        if self._cleaner is None:
+            return
+        self._dirty.put(None)
+        self._cleaner.join()
+        self._cleaner = None
+        if self._mounted:
+            subprocess.check_call(["umount", self.root])
+            self._mounted = False
+        else:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _empty(path, mode):
+    # the run may have removed it or left it unreadable
+    if not os.path.isdir(path) or os.path.islink(path):
+        if os.path.lexists(path):
+            os.unlink(path)
+        os.mkdir(path, mode)
+    os.chmod(path, mode)
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
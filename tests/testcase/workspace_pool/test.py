@@ -0,0 +1,81 @@
+# coding=utf-8
+from __future__ import print_function, absolute_import
+import timeit
+import os
+
+from .. import base, judger
+from ..workspace import WorkspacePool
+
+
+class WorkspacePoolTest(base.BaseTestCase):
+    def setUp(self):
+        print("Running", self._testMethodName)
+        self.workspace = self.init_workspace("workspace")
+        self.root = os.path.join(self.workspace, "pool")
+        self.startTime = timeit.default_timer()
+
+    def tearDown(self):
+        print("Time: ", timeit.default_timer() - self.startTime)
+
+    def test_reuse(self):
+        with WorkspacePool(self.root, size=2) as pool:
+            first = pool.acquire()
+            self.assertEqual(os.listdir(first), [])
+            os.makedirs(os.path.join(first, "a", "b"))
+            with open(os.path.join(first, "a", "b", "c"), "w") as f:
+                f.write("c")
+            os.symlink("/", os.path.join(first, "root"))
+            os.chmod(os.path.join(first, "a"), 0o500)
+            pool.release(first)
+            pool.join()
+
+            # the other one first, then the cleaned one
+            second = pool.acquire()
+            self.assertNotEqual(second, first)
+            self.assertEqual(pool.acquire(), first)
+            self.assertEqual(os.listdir(first), [])
+            # every workspace is in use, so a new one is made
+            third = pool.acquire()
+            self.assertNotIn(third, [first, second])
+            self.assertEqual(os.listdir(third), [])
+        self.assertFalse(os.path.exists(self.root))
+
+    def test_removed(self):
+        with WorkspacePool(self.root, size=1) as pool:
+            with pool.workspace() as path:
+                os.rmdir(path)
+                with open(path, "w") as f:
+                    f.write("not a directory")
+            pool.join()
+            self.assertEqual(pool.acquire(), path)
+            self.assertTrue(os.path.isdir(path))
+
+    def test_run(self):
+        pool = WorkspacePool(self.root, size=1, chroot_path=self.CHROOT_DIR)
+        with pool.workspace() as path:
+            config = self.base_config
+            config["exe_path"] = self._compile_c("../test_src/integration/normal.c")
+            with open(os.path.join(path, "input"), "w") as f:
+                f.write("judger_test")
+            config["input_path"] = pool.relative_path(os.path.join(path, "input"))
+            config["output_path"] = config["error_path"] = pool.relative_path(os.path.join(path, "output"))
+            result = judger.run(**config)
+            self.assertEqual(result["result"], judger.RESULT_SUCCESS)
+            self.assertEqual(self.get_file_contents(os.path.join(path, "output")), "judger_test\nHello world")
+        pool.close()
+
+    def test_tmpfs(self):
+        pool = WorkspacePool(self.root, size=1, tmpfs_size=1024 * 1024)
+        try:
+            with pool.workspace() as path:
+                with open("/proc/self/mountinfo") as f:
+                    self.assertIn(" {} ".format(self.root), f.read())
+                # the size of the tmpfs is the limit
+                with self.assertRaises(OSError):
+                    with open(os.path.join(path, "large"), "wb") as f:
+                        f.write(b"\0" * 2 * 1024 * 1024)
+        finally:
+            pool.close()
+        with open("/proc/self/mountinfo") as f:
+            self.assertNotIn(" {} ".format(self.root), f.read())
+